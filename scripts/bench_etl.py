@@ -0,0 +1,222 @@
+"""
+Offline replay benchmark for the gov tax ETL.
+
+Serves the recorded dumps (rules_dump.json, anexos_dump.json,
+indoper_dump.json) through scripts/gov_api_stub.py, optionally scaled
+synthetically, and loads them into a SQLite stand-in (scripts/sqlite_store.py)
+with the ETL's own functions. No SEFAZ certificate or Supabase project needed.
+
+Each scale runs in a fresh child process so peak RSS is measured per scale:
+  - end_to_end: one etl_tax_gov run_once over every endpoint
+  - fetch / parse / load: the same work timed phase by phase
+    (HTTP download, JSON decode + flattening, Bronze insert + staging sync)
+
+Usage:
+    python scripts/bench_etl.py                       # scales 1, 10, 100
+    python scripts/bench_etl.py --scales 1,10 --stream --json bench.json
+
+Replaying without the benchmark is just the ETL pointed at the stub:
+    python scripts/gov_api_stub.py &
+    python scripts/etl_tax_gov.py --base-url http://127.0.0.1:8000 --sqlite replay.db
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import resource
+import tempfile
+import threading
+import subprocess
+from typing import Any, Callable, Dict, List
+
+from gov_api_stub import DEFAULT_PAYLOADS, create_server
+from gov_tax_data import STAGING_SPECS, load_dump
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def scale_anexo(item: Dict[str, Any], copy: int) -> Dict[str, Any]:
+    # Annex numbers are small integers, so an offset keeps the natural key unique
+    return {**item, "nroAnexo": int(item["nroAnexo"]) + 100 * copy}
+
+
+def scale_ind_oper(item: Dict[str, Any], copy: int) -> Dict[str, Any]:
+    return {**item, "codOperacao": f"{item['codOperacao']}-{copy}"}
+
+
+def scale_class_trib(item: Dict[str, Any], copy: int) -> Dict[str, Any]:
+    if isinstance(item.get("rule"), dict):
+        return {**item, "rule": scale_class_trib(item["rule"], copy)}
+    if isinstance(item.get("classificacoesTributarias"), list):
+        return {**item, "classificacoesTributarias": [
+            scale_class_trib(rule, copy) for rule in item["classificacoesTributarias"]
+        ]}
+    return {**item, "cClassTrib": f"{item['cClassTrib']}-{copy}"}
+
+
+SCALERS: Dict[str, Callable[[Dict[str, Any], int], Dict[str, Any]]] = {
+    "anexos": scale_anexo,
+    "indOper": scale_ind_oper,
+    "classTrib": scale_class_trib,
+}
+
+
+def write_scaled_payloads(scale: int, directory: str) -> Dict[str, str]:
+    """Writes each dump repeated `scale` times (with unique keys) as compact JSON."""
+    payloads = {}
+    for endpoint, source in DEFAULT_PAYLOADS.items():
+        if not os.path.exists(source):
+            continue
+        items = load_dump(source)
+        scaled = list(items)
+        for copy in range(1, scale):
+            scaled.extend(SCALERS[endpoint](item, copy) for item in items)
+        path = os.path.join(directory, f"{endpoint}_x{scale}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(scaled, f, ensure_ascii=False, separators=(",", ":"))
+        payloads[endpoint] = path
+    return payloads
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(base_url: str, endpoints: List[str], workdir: str, stream: bool) -> Dict[str, Any]:
+    """Runs inside the per-scale child process; returns the measurements."""
+    import etl_tax_gov as etl
+    from sqlite_store import SqliteClient
+
+    logging.getLogger().setLevel(logging.WARNING)
+    etl.ENDPOINTS = endpoints
+    args = etl.parse_args(["--base-url", base_url, "--sequential", "--force"] + (["--stream"] if stream else []))
+
+    session = etl.create_session(etl.create_ssl_context(None), len(endpoints))
+    ctx = etl.FetchContext(
+        session=session,
+        limiter=etl.EndpointLimiter(1),
+        policy=etl.RetryPolicy(1),
+        breaker=etl.CircuitBreaker(),
+        metrics=etl.EndpointMetrics(),
+        stream=stream,
+        base_url=base_url,
+    )
+
+    started = time.perf_counter()
+    etl.run_once(SqliteClient(os.path.join(workdir, "e2e.db")), ctx, args, etl.LoadStats())
+    end_to_end = time.perf_counter() - started
+
+    supabase = SqliteClient(os.path.join(workdir, "phases.db"))
+    stats = etl.LoadStats()
+    phases = {name: {"seconds": 0.0, "rows": 0} for name in ("fetch", "parse", "load")}
+    nbytes = 0
+    for endpoint in endpoints:
+        spec = STAGING_SPECS[endpoint]
+
+        started = time.perf_counter()
+        response = session.get(f"{base_url}/{endpoint}", timeout=etl.REQUEST_TIMEOUT)
+        response.raise_for_status()
+        body = response.content
+        phases["fetch"]["seconds"] += time.perf_counter() - started
+        nbytes += len(body)
+
+        started = time.perf_counter()
+        data = json.loads(body)
+        rows = sum(1 for _ in spec.rows(data))
+        phases["parse"]["seconds"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        etl.load_payload(supabase, endpoint, data, stats, force=True)
+        etl.sync_staging(supabase, endpoint, data)
+        phases["load"]["seconds"] += time.perf_counter() - started
+
+        for phase in phases.values():
+            phase["rows"] += rows
+    session.close()
+
+    total_rows = phases["load"]["rows"]
+    for phase in phases.values():
+        phase["rows_per_s"] = phase["rows"] / phase["seconds"] if phase["seconds"] else None
+    return {
+        "rows": total_rows,
+        "bytes": nbytes,
+        "end_to_end_s": end_to_end,
+        "end_to_end_rows_per_s": total_rows / end_to_end if end_to_end else None,
+        "phases": phases,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_scale(scale: int, stream: bool, workdir: str) -> Dict[str, Any]:
+    payloads = write_scaled_payloads(scale, workdir)
+    server = create_server(payloads, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        command = [sys.executable, os.path.abspath(__file__), "--child", base_url,
+                   "--workdir", workdir, "--endpoints", ",".join(sorted(payloads))]
+        if stream:
+            command.append("--stream")
+        completed = subprocess.run(command, capture_output=True, text=True, check=False)
+        if completed.returncode != 0:
+            raise RuntimeError(f"scale {scale} failed:\n{completed.stderr[-2000:]}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+    finally:
+        server.shutdown()
+        server.server_close()
+    result["scale"] = scale
+    return result
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"{'scale':>6} {'rows':>9} {'MB':>7} {'e2e s':>7} {'e2e r/s':>9} "
+          f"{'fetch r/s':>10} {'parse r/s':>10} {'load r/s':>9} {'RSS MB':>7}")
+    for r in results:
+        phases = r["phases"]
+        print(f"{r['scale']:>6} {r['rows']:>9} {r['bytes'] / 1e6:>7.1f} {r['end_to_end_s']:>7.2f} "
+              f"{r['end_to_end_rows_per_s']:>9.0f} {phases['fetch']['rows_per_s']:>10.0f} "
+              f"{phases['parse']['rows_per_s']:>10.0f} {phases['load']['rows_per_s']:>9.0f} "
+              f"{r['peak_rss_mb']:>7.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded gov payloads through the ETL and time it")
+    parser.add_argument("--scales", default="1,10,100",
+                        help="comma-separated synthetic scale factors (default: %(default)s)")
+    parser.add_argument("--stream", action="store_true", help="benchmark the --stream fetch path")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    parser.add_argument("--child", metavar="BASE_URL", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--endpoints", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(run_child(args.child, args.endpoints.split(","), args.workdir, args.stream)))
+        return
+
+    results = []
+    for scale in (int(s) for s in args.scales.split(",") if s.strip()):
+        with tempfile.TemporaryDirectory(prefix=f"bench_etl_x{scale}_") as workdir:
+            logger.info(f"Benchmarking scale x{scale}...")
+            results.append(bench_scale(scale, args.stream, workdir))
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+"""
+Compact binary snapshot of the gov tax dumps, loaded by memory-mapping.
+
+The JSON dumps are re-parsed by every batch job at startup. This format keeps
+the staging rows of each source as contiguous little-endian columns:
+  - codes (NCM/NBS, cClassTrib, codOperacao) as fixed-width ASCII
+  - every other string interned once in a shared string table, columns
+    holding 4-byte ids
+  - dates as int32 days since 1970-01-01
+  - the classTrib indicator flags packed into one uint32 per rule
+so opening a snapshot only parses a small JSON header. Columns are
+memoryviews over the mapping, decoded on access; worker processes opening the
+same file share its pages through the page cache instead of each holding a
+parsed copy.
+
+Layout: b"GTSNAP01", uint32 header length, JSON header (per table: row count
+and the offset/length/kind of each column), then the 8-byte aligned blocks.
+
+Usage:
+    python scripts/binary_snapshot.py --dump anexos=anexos_dump.json --dump indOper=indoper_dump.json \\
+        --dump classTrib=rules_dump.json --out gov_snapshot.bin
+    python scripts/binary_snapshot.py --info gov_snapshot.bin
+    python scripts/binary_snapshot.py --compare --scale 50 --workers 4
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import argparse
+import tempfile
+import subprocess
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from gov_tax_data import CLASS_TRIB_FLAGS, STAGING_SPECS, load_dump
+
+MAGIC = b"GTSNAP01"
+VERSION = 1
+ALIGN = 8
+NULL_ID = 0xFFFFFFFF
+NULL_INT = -2 ** 31
+EPOCH = date(1970, 1, 1)
+
+# kind -> struct format of one element
+KIND_FORMATS = {"str": "I", "json": "I", "date": "i", "int": "i", "float": "d", "flags": "I"}
+
+# source_api -> [(staging column, kind)]; kind "code" is fixed-width ASCII
+SNAPSHOT_SCHEMAS: Dict[str, List[Tuple[str, str]]] = {
+    "anexos": [
+        ("nro_anexo", "int"), ("cod_ncm_nbs", "code"), ("tipo_anexo", "str"),
+        ("dth_ini_vig", "date"), ("dth_fim_vig", "date"),
+    ],
+    "classTrib": [
+        ("c_class_trib", "code"), ("descricao", "str"), ("tipo_aliquota", "str"), ("anexo", "int"),
+        ("p_red_ibs", "float"), ("p_red_cbs", "float"), ("inicio_vigencia", "date"),
+        ("fim_vigencia", "date"), ("publicacao", "date"), ("link", "str"), ("flags", "flags"),
+    ],
+    "indOper": [
+        ("cod_operacao", "code"), ("nome_operacao", "str"), ("tex_disp_legal", "str"),
+        ("tex_local_fornec", "str"), ("tex_caract_fornec", "str"), ("tex_local_operacao", "str"),
+        ("dth_publicacao", "date"), ("dth_ini_vig", "date"), ("dth_fim_vig", "date"),
+    ],
+    "credPresumido": [("c_cred_pres", "code"), ("descricao", "str"), ("dados", "json")],
+}
+FLAG_COLUMNS = list(CLASS_TRIB_FLAGS.values())
+
+
+def to_epoch_day(value: Optional[str], column: str) -> int:
+    if value is None:
+        return NULL_INT
+    moment = datetime.fromisoformat(value)
+    if moment.time() != datetime.min.time():
+        raise ValueError(f"{column}={value!r} has a time of day; the snapshot stores whole days")
+    return (moment.date() - EPOCH).days
+
+
+def from_epoch_day(days: int) -> Optional[str]:
+    if days == NULL_INT:
+        return None
+    return datetime.combine(EPOCH + timedelta(days=days), datetime.min.time()).isoformat()
+
+
+class StringTable:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[bytes] = []
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return NULL_ID
+        if value not in self.ids:
+            self.ids[value] = len(self.values)
+            self.values.append(value.encode("utf-8"))
+        return self.ids[value]
+
+
+def encode_column(rows: List[Dict[str, Any]], column: str, kind: str, strings: StringTable) -> Tuple[bytes, Dict]:
+    meta: Dict[str, Any] = {"kind": kind}
+    if kind == "code":
+        encoded = [str(row[column]).encode("ascii") for row in rows]
+        width = max((len(code) for code in encoded), default=0)
+        meta["width"] = width
+        return b"".join(code.ljust(width, b"\0") for code in encoded), meta
+    if kind == "flags":
+        values = [sum(1 << bit for bit, flag in enumerate(FLAG_COLUMNS) if row[flag]) for row in rows]
+    elif kind == "str":
+        values = [strings.intern(row[column]) for row in rows]
+    elif kind == "json":
+        values = [strings.intern(json.dumps(row[column], ensure_ascii=False, sort_keys=True)
+                                 if row[column] is not None else None) for row in rows]
+    elif kind == "date":
+        values = [to_epoch_day(row[column], column) for row in rows]
+    elif kind == "int":
+        values = [row[column] if row[column] is not None else NULL_INT for row in rows]
+    else:
+        values = [row[column] if row[column] is not None else float("nan") for row in rows]
+    return struct.pack(f"<{len(values)}{KIND_FORMATS[kind]}", *values), meta
+
+
+def write_snapshot(path: str, sources: Dict[str, Any], origins: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Writes {source_api: raw items} as a binary snapshot; returns the header."""
+    strings = StringTable()
+    blocks: List[bytes] = []
+    header: Dict[str, Any] = {"version": VERSION, "created_at": datetime.now().isoformat(timespec="seconds"),
+                              "tables": {}}
+    position = 0
+
+    def add_block(data: bytes) -> Tuple[int, int]:
+        nonlocal position
+        padding = -len(data) % ALIGN
+        blocks.append(data + b"\0" * padding)
+        offset = position
+        position += len(data) + padding
+        return offset, len(data)
+
+    for source_api, items in sources.items():
+        rows = list(STAGING_SPECS[source_api].rows(items))
+        columns = {}
+        for column, kind in SNAPSHOT_SCHEMAS[source_api]:
+            data, meta = encode_column(rows, column, kind, strings)
+            meta["offset"], meta["length"] = add_block(data)
+            columns[column] = meta
+        header["tables"][source_api] = {"rows": len(rows), "columns": columns,
+                                        **({"origin": origins[source_api]} if origins else {})}
+
+    offsets = [0]
+    for value in strings.values:
+        offsets.append(offsets[-1] + len(value))
+    string_offsets = add_block(struct.pack(f"<{len(offsets)}I", *offsets))
+    string_data = add_block(b"".join(strings.values))
+    header["strings"] = {"count": len(strings.values), "offsets": string_offsets, "data": string_data}
+
+    encoded_header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    prefix = MAGIC + struct.pack("<I", len(encoded_header)) + encoded_header
+    prefix += b"\0" * (-len(prefix) % ALIGN)
+    with open(path, "wb") as f:
+        f.write(prefix)
+        for block in blocks:
+            f.write(block)
+    return header
+
+
+class SnapshotColumn:
+    """Read-only sequence over one column of the mapping, decoded per element."""
+
+    def __init__(self, snapshot: "BinarySnapshot", view: memoryview, kind: str, rows: int, width: int = 0):
+        self.snapshot = snapshot
+        self.view = view
+        self.kind = kind
+        self.rows = rows
+        self.width = width
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += self.rows
+        if not 0 <= i < self.rows:
+            raise IndexError(i)
+        if self.kind == "code":
+            return bytes(self.view[i * self.width:(i + 1) * self.width]).rstrip(b"\0").decode("ascii")
+        value = self.view[i]
+        if self.kind in ("str", "json"):
+            text = self.snapshot.string(value)
+            return json.loads(text) if self.kind == "json" and text is not None else text
+        if self.kind == "date":
+            return from_epoch_day(value)
+        if self.kind == "int":
+            return None if value == NULL_INT else value
+        if self.kind == "float":
+            return None if value != value else value
+        return value
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(self.rows):
+            yield self[i]
+
+
+class SnapshotTable:
+    def __init__(self, snapshot: "BinarySnapshot", source_api: str, meta: Dict[str, Any]):
+        self.source_api = source_api
+        self.rows = meta["rows"]
+        self.columns: Dict[str, SnapshotColumn] = {}
+        for column, info in meta["columns"].items():
+            view = snapshot.block(info["offset"], info["length"])
+            if info["kind"] != "code":
+                view = view.cast(KIND_FORMATS[info["kind"]])
+            self.columns[column] = SnapshotColumn(snapshot, view, info["kind"], self.rows, info.get("width", 0))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def column(self, name: str) -> SnapshotColumn:
+        return self.columns[name]
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """Row i in the staging row format (flags expanded back into bool columns)."""
+        row = {}
+        for name, column in self.columns.items():
+            if column.kind == "flags":
+                value = column[i]
+                row.update({flag: bool(value & (1 << bit)) for bit, flag in enumerate(FLAG_COLUMNS)})
+            else:
+                row[name] = column[i]
+        return row
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self.rows):
+            yield self.row(i)
+
+
+class BinarySnapshot:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if bytes(self._view[:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a gov tax binary snapshot")
+        (header_length,) = struct.unpack_from("<I", self._map, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(bytes(self._view[start:start + header_length]))
+        self._data_start = start + header_length + (-(start + header_length) % ALIGN)
+        strings = self.header["strings"]
+        self._string_offsets = self.block(*strings["offsets"]).cast("I")
+        self._string_data = self.block(*strings["data"])
+        self._strings: Dict[int, str] = {}
+        self.tables = {name: SnapshotTable(self, name, meta) for name, meta in self.header["tables"].items()}
+
+    def block(self, offset: int, length: int) -> memoryview:
+        start = self._data_start + offset
+        return self._view[start:start + length]
+
+    def string(self, ident: int) -> Optional[str]:
+        if ident == NULL_ID:
+            return None
+        value = self._strings.get(ident)
+        if value is None:
+            start, end = self._string_offsets[ident], self._string_offsets[ident + 1]
+            value = self._strings[ident] = bytes(self._string_data[start:end]).decode("utf-8")
+        return value
+
+    def table(self, source_api: str) -> SnapshotTable:
+        return self.tables[source_api]
+
+    def close(self) -> None:
+        # Every view over the mapping has to be released before it can close
+        for table in getattr(self, "tables", {}).values():
+            for column in table.columns.values():
+                column.view.release()
+        for name in ("_string_offsets", "_string_data"):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "BinarySnapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process image. ru_maxrss survives exec, so it would include the parent's peak."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    from bench_etl import peak_rss_mb as maxrss_mb
+    return maxrss_mb()
+
+
+def measure_child(mode: str, target: str) -> Dict[str, Any]:
+    """Runs in a fresh process: load one way, then read the key of every row, as an index build would."""
+    started = time.perf_counter()
+    if mode == "json":
+        dumps = json.loads(target)
+        tables = {source: list(STAGING_SPECS[source].rows(load_dump(path))) for source, path in dumps.items()}
+        loaded = time.perf_counter() - started
+        keys = [row[SNAPSHOT_SCHEMAS[source][0][0]] for source, rows in tables.items() for row in rows]
+    else:
+        snapshot = BinarySnapshot(target)
+        loaded = time.perf_counter() - started
+        keys = [code for source, table in snapshot.tables.items()
+                for code in table.column(SNAPSHOT_SCHEMAS[source][0][0])]
+    return {"mode": mode, "rows": len(keys), "load_ms": round(loaded * 1000, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2), "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+
+def run_comparison(dumps: Dict[str, str], scale: int, workers: int) -> None:
+    with tempfile.TemporaryDirectory() as workdir:
+        if scale > 1:
+            from bench_etl import write_scaled_payloads
+            scaled = write_scaled_payloads(scale, workdir)
+            dumps = {source: scaled[source] for source in dumps if source in scaled}
+        snapshot_path = os.path.join(workdir, "gov_snapshot.bin")
+        write_snapshot(snapshot_path, {source: load_dump(path) for source, path in dumps.items()})
+        json_bytes = sum(os.path.getsize(path) for path in dumps.values())
+        print(f"JSON dumps: {json_bytes / 1e6:.2f} MB, binary snapshot: "
+              f"{os.path.getsize(snapshot_path) / 1e6:.2f} MB (scale {scale})")
+
+        for mode, target in (("json", json.dumps(dumps)), ("binary", snapshot_path)):
+            command = [sys.executable, os.path.abspath(__file__), "--child", mode, target]
+            procs = [subprocess.Popen(command, stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+            results = []
+            for proc in procs:
+                out, _ = proc.communicate()
+                if proc.returncode != 0:
+                    raise RuntimeError(f"{mode} worker failed")
+                results.append(json.loads(out.strip().splitlines()[-1]))
+            median = lambda key: sorted(r[key] for r in results)[len(results) // 2]
+            print(f"{mode:>7}: {results[0]['rows']} rows, load {median('load_ms'):.1f} ms, "
+                  f"load + key scan {median('total_ms'):.1f} ms, peak RSS {median('peak_rss_mb'):.1f} MB "
+                  f"(median of {workers} workers)")
+
+
+def print_info(path: str) -> None:
+    with BinarySnapshot(path) as snapshot:
+        print(f"{path}: {os.path.getsize(path)} B, created {snapshot.header['created_at']}, "
+              f"{snapshot.header['strings']['count']} interned strings")
+        for name, table in snapshot.tables.items():
+            print(f"  {name}: {len(table)} rows")
+            for column, meta in snapshot.header["tables"][name]["columns"].items():
+                width = f", width {meta['width']}" if "width" in meta else ""
+                print(f"    {column:<22} {meta['kind']:<6} {meta['length']:>10} B{width}")
+
+
+def round_trip_mismatch(actual: List[Dict[str, Any]], expected: List[Dict[str, Any]]) -> Optional[str]:
+    """None when the rows read back match, else where they first differ."""
+    if actual == expected:
+        return None
+    for index, (got, want) in enumerate(zip(actual, expected)):
+        if got != want:
+            columns = sorted(k for k in set(got) | set(want) if got.get(k) != want.get(k))
+            return f"row {index} differs in {', '.join(columns)}"
+    return f"{len(actual)} rows read back, {len(expected)} expected"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert gov tax dumps to a memory-mapped binary snapshot")
+    parser.add_argument("--dump", action="append", metavar="SOURCE=PATH",
+                        help="JSON/NDJSON dump to include (repeatable; default: the dumps in the repo root)")
+    parser.add_argument("--out", default="gov_snapshot.bin", help="snapshot file to write (default: %(default)s)")
+    parser.add_argument("--info", metavar="PATH", help="describe an existing snapshot")
+    parser.add_argument("--compare", action="store_true", help="compare load time and RSS against the JSON dumps")
+    parser.add_argument("--scale", type=int, default=1, help="--compare on dumps repeated this many times")
+    parser.add_argument("--workers", type=int, default=3, help="processes loading at once in --compare")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "TARGET"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(measure_child(*args.child)))
+        return
+    if args.info:
+        print_info(args.info)
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    dumps = {"anexos": os.path.join(root, "anexos_dump.json"), "indOper": os.path.join(root, "indoper_dump.json"),
+             "classTrib": os.path.join(root, "rules_dump.json")}
+    if args.dump:
+        dumps = {}
+        for value in args.dump:
+            source_api, sep, path = value.partition("=")
+            if not sep or source_api not in SNAPSHOT_SCHEMAS:
+                print(f"Invalid --dump {value!r}, expected <source_api>=<path> with one of {sorted(SNAPSHOT_SCHEMAS)}")
+                sys.exit(1)
+            dumps[source_api] = path
+    dumps = {source: path for source, path in dumps.items() if os.path.exists(path)}
+
+    if args.compare:
+        run_comparison(dumps, args.scale, args.workers)
+        return
+
+    sources = {source: load_dump(path) for source, path in dumps.items()}
+    write_snapshot(args.out, sources, {source: path for source, path in dumps.items()})
+    # Round-trip check: every row reads back exactly as the row builders produced it.
+    # Not an assert: it has to run under python -O too.
+    with BinarySnapshot(args.out) as snapshot:
+        mismatches = [(source, round_trip_mismatch(list(snapshot.table(source)),
+                                                   list(STAGING_SPECS[source].rows(items))))
+                      for source, items in sources.items()]
+    mismatches = [(source, problem) for source, problem in mismatches if problem]
+    if mismatches:
+        for source, problem in mismatches:
+            print(f"{source} did not round-trip: {problem}")
+        os.remove(args.out)
+        print(f"Removed {args.out}")
+        sys.exit(1)
+    print(f"Wrote {args.out} ({os.path.getsize(args.out)} B, {sum(os.path.getsize(p) for p in dumps.values())} B "
+          f"of JSON)")
+    print_info(args.out)
+
+
+if __name__ == "__main__":
+    main()
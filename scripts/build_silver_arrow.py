@@ -0,0 +1,215 @@
+"""
+Local columnar Silver Layer built from the latest Bronze snapshots.
+
+Flattens the newest raw_gov_tax_data snapshot of each source_api with the
+same row builders as the staging tables and writes, per table:
+  - <table>.parquet  compressed, for storage and exchange
+  - <table>.arrow    uncompressed Arrow IPC file, readable memory-mapped
+plus a manifest.json with the snapshot each file came from.
+
+Low-cardinality string columns (annex type, rate type, NCM codes...) are
+dictionary-encoded in both formats. Batch jobs load the whole layer with
+read_silver() without any database round-trip.
+
+Usage:
+    python scripts/build_silver_arrow.py                            # from Supabase
+    python scripts/build_silver_arrow.py --sqlite replay.db --out silver
+    python scripts/build_silver_arrow.py --dump anexos=anexos_dump.json --dump classTrib=rules_dump.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from gov_tax_data import STAGING_SPECS, CLASS_TRIB_FLAGS, StagingSpec, create_supabase_client, list_snapshots, load_dump
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT_DIR = "silver"
+
+_dict_string = pa.dictionary(pa.int32(), pa.string())
+_timestamp = pa.timestamp("s")
+
+# One Arrow schema per staging table; columns mirror the gov_* tables
+SILVER_SCHEMAS = {
+    "gov_class_trib": pa.schema(
+        [
+            ("c_class_trib", pa.string()),
+            ("descricao", pa.string()),
+            ("tipo_aliquota", _dict_string),
+            ("anexo", pa.int32()),
+            ("p_red_ibs", pa.float64()),
+            ("p_red_cbs", pa.float64()),
+            ("inicio_vigencia", _timestamp),
+            ("fim_vigencia", _timestamp),
+            ("publicacao", _timestamp),
+            ("link", _dict_string),
+        ]
+        + [(column, pa.bool_()) for column in CLASS_TRIB_FLAGS.values()]
+    ),
+    "gov_anexo_ncm": pa.schema([
+        ("nro_anexo", pa.int32()),
+        ("cod_ncm_nbs", _dict_string),
+        ("tipo_anexo", _dict_string),
+        ("dth_ini_vig", _timestamp),
+        ("dth_fim_vig", _timestamp),
+    ]),
+    "gov_ind_oper": pa.schema([
+        ("cod_operacao", pa.string()),
+        ("nome_operacao", pa.string()),
+        ("tex_disp_legal", _dict_string),
+        ("tex_local_fornec", _dict_string),
+        ("tex_caract_fornec", _dict_string),
+        ("tex_local_operacao", _dict_string),
+        ("dth_publicacao", _timestamp),
+        ("dth_ini_vig", _timestamp),
+        ("dth_fim_vig", _timestamp),
+    ]),
+    "gov_cred_presumido": pa.schema([
+        ("c_cred_pres", pa.string()),
+        ("descricao", pa.string()),
+        # Fields not mapped yet: the item is kept as JSON text
+        ("dados", pa.string()),
+    ]),
+}
+
+
+def to_arrow_value(value, field: pa.Field):
+    if value is None:
+        return None
+    if pa.types.is_timestamp(field.type):
+        return datetime.fromisoformat(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return value
+
+
+def build_table(spec: StagingSpec, items: Iterable[Any]) -> pa.Table:
+    """Typed rows -> Arrow table, keeping the last item per natural key like the staging sync."""
+    schema = SILVER_SCHEMAS[spec.table]
+    latest = {}
+    for row in spec.rows(items):
+        latest[spec.key(row)] = row
+    columns = {
+        field.name: pa.array([to_arrow_value(row.get(field.name), field) for row in latest.values()],
+                             type=field.type)
+        for field in schema
+    }
+    return pa.table(columns, schema=schema)
+
+
+def write_table(table: pa.Table, name: str, out_dir: str) -> Dict[str, Any]:
+    parquet_path = os.path.join(out_dir, f"{name}.parquet")
+    arrow_path = os.path.join(out_dir, f"{name}.arrow")
+    pq.write_table(table, parquet_path, compression="zstd", use_dictionary=True)
+    # Uncompressed IPC so readers can memory-map the buffers as they are
+    with pa.OSFile(arrow_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return {
+        "rows": table.num_rows,
+        "parquet_bytes": os.path.getsize(parquet_path),
+        "arrow_bytes": os.path.getsize(arrow_path),
+    }
+
+
+def read_silver(out_dir: str = DEFAULT_OUTPUT_DIR, tables: Optional[Iterable[str]] = None,
+                memory_map: bool = True) -> Dict[str, pa.Table]:
+    """
+    Loads Silver Layer tables from the Arrow IPC files. With memory_map the
+    buffers stay in the page cache and the load itself copies nothing.
+    """
+    result = {}
+    for name in tables or SILVER_SCHEMAS:
+        path = os.path.join(out_dir, f"{name}.arrow")
+        if not os.path.exists(path):
+            continue
+        source = pa.memory_map(path, "r") if memory_map else pa.OSFile(path, "rb")
+        result[name] = pa.ipc.open_file(source).read_all()
+    return result
+
+
+def iter_latest_snapshots(supabase, sources):
+    for source_api in sources:
+        snapshots = list_snapshots(supabase, source_api, count=1)
+        if not snapshots:
+            logger.info(f"{source_api}: no snapshot stored, skipping")
+            continue
+        snapshot = snapshots[0]
+        yield source_api, snapshot.iter_items(supabase), {
+            "snapshot_id": snapshot.snapshot_id,
+            "fetched_at": snapshot.fetched_at,
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the columnar Silver Layer (Parquet + Arrow IPC)")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_DIR, help="output directory (default: %(default)s)")
+    parser.add_argument("--source-api", action="append", choices=sorted(STAGING_SPECS),
+                        help="source(s) to build (default: all)")
+    parser.add_argument("--sqlite", metavar="PATH", help="read Bronze from a SQLite replay database")
+    parser.add_argument("--dump", action="append", metavar="SOURCE=PATH",
+                        help="build from a local JSON dump instead of Bronze (repeatable)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sources = args.source_api or sorted(STAGING_SPECS)
+    os.makedirs(args.out, exist_ok=True)
+
+    if args.dump:
+        inputs = []
+        for value in args.dump:
+            source_api, sep, path = value.partition("=")
+            if not sep or source_api not in STAGING_SPECS:
+                logger.error(f"Invalid --dump {value!r}, expected <source_api>=<path>")
+                sys.exit(1)
+            inputs.append((source_api, load_dump(path), {"dump": path}))
+    else:
+        if args.sqlite:
+            from sqlite_store import SqliteClient
+            supabase = SqliteClient(args.sqlite)
+        else:
+            supabase = create_supabase_client()
+        inputs = iter_latest_snapshots(supabase, sources)
+
+    manifest_path = os.path.join(args.out, "manifest.json")
+    manifest = {"tables": {}}
+    if os.path.exists(manifest_path):
+        # Partial rebuilds (--source-api) keep the entries of the other tables
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    manifest["built_at"] = datetime.now(timezone.utc).isoformat()
+    for source_api, items, origin in inputs:
+        spec = STAGING_SPECS[source_api]
+        started = time.perf_counter()
+        table = build_table(spec, items)
+        info = write_table(table, spec.table, args.out)
+        manifest["tables"][spec.table] = {"source_api": source_api, **origin, **info}
+        logger.info(f"{spec.table}: {info['rows']} rows, parquet {info['parquet_bytes']} B, "
+                    f"arrow {info['arrow_bytes']} B ({time.perf_counter() - started:.2f}s)")
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    started = time.perf_counter()
+    loaded = read_silver(args.out)
+    logger.info(f"Memory-mapped {sum(t.num_rows for t in loaded.values())} rows from "
+                f"{len(loaded)} tables in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resultados completos do relatorio tributario para um lote de empresas
+
+Junta, numa unica passada vetorizada, o que cada secao do relatorio consome:
+os regimes e economias do motor_regimes, a serie ano a ano da transicao
+(simulador_transicao, secao 6) e a sensibilidade aos fornecedores do Simples
+(sensibilidade, secao 5). Fica acima dos tres modulos para que o motor nao
+dependa de quem o importa. As mesmas regras valem para todos os calculos.
+"""
+
+from motor_regimes import (NOMES_REGIMES, REGIMES_ATUAIS, PerfisEmpresas, carregar_regras, comparar_regimes,
+                           resultados_relatorio)
+from sensibilidade import perda_creditos_simples, sensibilidade_fornecedores
+from simulador_transicao import simular_transicao
+
+
+def calcular_resultados(lista_dados, regras=None, comparacao=None):
+    """
+    DADOS_EMPRESA de varias empresas -> RESULTADOS de cada uma, numa chamada
+    vetorizada. comparacao: regimes ja calculados para lista_dados com as mesmas regras.
+    """
+    regras = regras or carregar_regras()
+    comparacao = comparacao or comparar_regimes(PerfisEmpresas.de_dados(lista_dados), regras)
+    resultados = resultados_relatorio(comparacao)
+    serie = simular_transicao(comparacao.perfis, comparacao=comparacao, regras=regras)
+    perda = perda_creditos_simples(comparacao.perfis)
+    fornecedores = sensibilidade_fornecedores(comparacao, regras=regras)
+    for i, resultado in enumerate(resultados):
+        resultado["transicao"] = {
+            "regime": NOMES_REGIMES[REGIMES_ATUAIS[serie.regime[i]]],
+            "anos": serie.linhas(i),
+        }
+        resultado["perda_creditos_simples"] = round(float(perda[i]), 2)
+        resultado["sensibilidade_fornecedores"] = fornecedores[i]
+    return resultados
@@ -0,0 +1,268 @@
+"""
+Integrity checks across the gov tax snapshots (classTrib, anexos, indOper,
+credPresumido).
+
+Each snapshot is read once, streaming, through the staging row builders:
+  - anexos is the build side of a hash join on the annex number; every
+    classTrib rule with an Anexo is probed against it (orphan rules), and
+    annexes no rule references are reported afterwards (orphan annexes)
+  - validity windows are grouped by entity (cClassTrib, annex + NCM/NBS,
+    codOperacao) to find inverted windows (end before start) and versions
+    of one entity whose windows overlap; in anexos that is the same NCM
+    listed twice in one annex
+  - credPresumido codes are checked for duplicates, and items the row
+    builders reject (no code, no start date) are counted for every source
+
+NDJSON dumps (.ndjson, .jsonl, optionally .zst) are read one line at a time;
+a JSON-array dump is parsed whole by json.load before its items are checked.
+
+Only counts and the first --max-examples occurrences of each problem are
+kept, so the report stays small whatever the snapshot size. Errors make the
+exit code 1 (warnings too with --strict), so the check can gate the ETL.
+
+Usage:
+    python scripts/check_integrity.py                                   # latest Supabase snapshots
+    python scripts/check_integrity.py --sqlite replay.db --json integrity_report.json
+    python scripts/check_integrity.py --dump anexos=anexos_dump.json --dump classTrib=rules_dump.json
+    python scripts/check_integrity.py --dump anexos=dumps/anexos.ndjson.zst
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+
+from gov_tax_data import STAGING_SPECS, create_supabase_client, iter_dump, list_snapshots
+from temporal_index import OPEN_END, exclusive_end
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_EXAMPLES = 20
+# Read order: anexos builds the join side before classTrib probes it
+SOURCE_ORDER = ("anexos", "classTrib", "indOper", "credPresumido")
+
+# source_api -> (entity columns, window start column, window end column)
+WINDOW_FIELDS = {
+    "anexos": (("nro_anexo", "cod_ncm_nbs"), "dth_ini_vig", "dth_fim_vig"),
+    "classTrib": (("c_class_trib",), "inicio_vigencia", "fim_vigencia"),
+    "indOper": (("cod_operacao",), "dth_ini_vig", "dth_fim_vig"),
+}
+
+# check -> (severity, description)
+CHECKS = {
+    "orphan_rule": ("error", "classTrib rule references an annex missing from anexos"),
+    "orphan_annex": ("warning", "annex not referenced by any classTrib rule"),
+    "inverted_window": ("error", "validity window ends before it starts"),
+    "overlapping_window": ("error", "versions of one entity with overlapping validity windows"),
+    "duplicate_ncm": ("error", "NCM/NBS listed more than once in the same annex at the same time"),
+    "duplicate_code": ("error", "code repeated within one snapshot"),
+    "invalid_item": ("warning", "item rejected by the staging row builder"),
+}
+
+
+class IntegrityReport:
+    """Problem counts plus a bounded sample of each kind."""
+
+    def __init__(self, max_examples: int = DEFAULT_MAX_EXAMPLES):
+        self.max_examples = max_examples
+        self.counts: Dict[str, int] = {check: 0 for check in CHECKS}
+        self.examples: Dict[str, List[Dict[str, Any]]] = {check: [] for check in CHECKS}
+        self.sources: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, check: str, **example) -> None:
+        self.counts[check] += 1
+        if len(self.examples[check]) < self.max_examples:
+            self.examples[check].append(example)
+
+    def count(self, severity: str) -> int:
+        return sum(n for check, n in self.counts.items() if CHECKS[check][0] == severity)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sources": self.sources,
+            "errors": self.count("error"),
+            "warnings": self.count("warning"),
+            "checks": {
+                check: {"severity": CHECKS[check][0], "count": self.counts[check],
+                        "examples": self.examples[check]}
+                for check in CHECKS
+            },
+        }
+
+
+class IntegrityChecker:
+    def __init__(self, report: IntegrityReport):
+        self.report = report
+        self.annexes: Dict[int, int] = {}  # hash-join build side: annex -> NCM/NBS entries
+        self.referenced: set = set()
+        self.has_anexos = False
+        self.has_rules = False
+
+    def check_source(self, source_api: str, items: Iterable[Any], origin: Dict[str, Any]) -> None:
+        spec = STAGING_SPECS[source_api]
+        fields = WINDOW_FIELDS.get(source_api)
+        # entity -> [(start, exclusive end)]; only the windows, never the rows
+        windows: Dict[Tuple, List[Tuple[str, str]]] = {}
+        codes: set = set()
+        started = time.perf_counter()
+        items_seen = rows = 0
+
+        for item in spec.iter_items(items):
+            items_seen += 1
+            row = spec.build_row(item)
+            if row is None:
+                self.report.add("invalid_item", source_api=source_api, item=truncate(item))
+                continue
+            rows += 1
+
+            if source_api == "anexos":
+                self.has_anexos = True
+                self.annexes[row["nro_anexo"]] = self.annexes.get(row["nro_anexo"], 0) + 1
+            elif source_api == "classTrib":
+                self.has_rules = True
+                if row["anexo"] is not None:
+                    self.referenced.add(row["anexo"])
+                    if self.has_anexos and row["anexo"] not in self.annexes:
+                        self.report.add("orphan_rule", c_class_trib=row["c_class_trib"], anexo=row["anexo"])
+            elif source_api == "credPresumido":
+                if row["c_cred_pres"] in codes:
+                    self.report.add("duplicate_code", source_api=source_api, code=row["c_cred_pres"])
+                codes.add(row["c_cred_pres"])
+
+            if fields:
+                key_columns, start_column, end_column = fields
+                start, end = row[start_column], row[end_column]
+                entity = tuple(row[column] for column in key_columns)
+                if start and end and end < start:
+                    self.report.add("inverted_window", source_api=source_api, entity=list(entity),
+                                    start=start, end=end)
+                    continue
+                windows.setdefault(entity, []).append((start or "", exclusive_end(end)))
+
+        overlap_check = "duplicate_ncm" if source_api == "anexos" else "overlapping_window"
+        for entity, spans in windows.items():
+            if len(spans) < 2:
+                continue
+            spans.sort()
+            reach = spans[0]
+            for span in spans[1:]:
+                if span[0] < reach[1]:
+                    self.report.add(overlap_check, source_api=source_api, entity=list(entity),
+                                    first=window_text(reach), second=window_text(span))
+                if span[1] > reach[1]:
+                    reach = span
+
+        self.report.sources[source_api] = {
+            **origin,
+            "items": items_seen,
+            "rows": rows,
+            "entities": len(windows) or len(codes) or None,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def finish(self) -> None:
+        """Checks that need both sides of the join."""
+        if not (self.has_anexos and self.has_rules):
+            return
+        for annex in sorted(self.annexes):
+            if annex not in self.referenced:
+                self.report.add("orphan_annex", anexo=annex, entries=self.annexes[annex])
+
+
+def window_text(span: Tuple[str, str]) -> str:
+    start, end = span
+    return f"[{start or '-inf'}, {'open' if end == OPEN_END else end})"
+
+
+def truncate(item: Any, limit: int = 200) -> str:
+    text = json.dumps(item, ensure_ascii=False, default=str)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def iter_inputs(args, sources: List[str]):
+    if args.dump:
+        dumps = {}
+        for value in args.dump:
+            source_api, sep, path = value.partition("=")
+            if not sep or source_api not in STAGING_SPECS:
+                logger.error(f"Invalid --dump {value!r}, expected <source_api>=<path>")
+                sys.exit(1)
+            dumps[source_api] = path
+        for source_api in sources:
+            if source_api in dumps:
+                yield source_api, iter_dump(dumps[source_api]), {"dump": dumps[source_api]}
+        return
+
+    if args.sqlite:
+        from sqlite_store import SqliteClient
+        supabase = SqliteClient(args.sqlite)
+    else:
+        supabase = create_supabase_client()
+    for source_api in sources:
+        snapshots = list_snapshots(supabase, source_api, count=1)
+        if not snapshots:
+            logger.info(f"{source_api}: no snapshot stored, skipping")
+            continue
+        snapshot = snapshots[0]
+        yield source_api, snapshot.iter_items(supabase), {
+            "snapshot_id": snapshot.snapshot_id,
+            "fetched_at": snapshot.fetched_at,
+        }
+
+
+def print_report(report: IntegrityReport, examples: int) -> None:
+    for source_api, info in report.sources.items():
+        print(f"{source_api}: {info['rows']} rows from {info['items']} items ({info['seconds']}s)")
+    for check, (severity, description) in CHECKS.items():
+        count = report.counts[check]
+        if not count:
+            continue
+        print(f"[{severity.upper()}] {check}: {count} - {description}")
+        for example in report.examples[check][:examples]:
+            print(f"    {json.dumps(example, ensure_ascii=False)}")
+        if count > examples:
+            print(f"    ... {count - examples} more")
+    print(f"{report.count('error')} error(s), {report.count('warning')} warning(s)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check the gov tax snapshots for integrity problems")
+    parser.add_argument("--source-api", action="append", choices=SOURCE_ORDER,
+                        help="source(s) to check (default: all)")
+    parser.add_argument("--sqlite", metavar="PATH", help="read snapshots from a SQLite replay database")
+    parser.add_argument("--dump", action="append", metavar="SOURCE=PATH",
+                        help="check a local JSON dump instead of the stored snapshot (repeatable)")
+    parser.add_argument("--max-examples", type=int, default=DEFAULT_MAX_EXAMPLES,
+                        help="occurrences kept per problem (default: %(default)s)")
+    parser.add_argument("--print-examples", type=int, default=5, help="occurrences printed per problem")
+    parser.add_argument("--json", metavar="PATH", help="write the full report as JSON")
+    parser.add_argument("--strict", action="store_true", help="fail on warnings too")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sources = [s for s in SOURCE_ORDER if not args.source_api or s in args.source_api]
+
+    report = IntegrityReport(args.max_examples)
+    checker = IntegrityChecker(report)
+    for source_api, items, origin in iter_inputs(args, sources):
+        checker.check_source(source_api, items, origin)
+    checker.finish()
+
+    print_report(report, args.print_examples)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, indent=2, ensure_ascii=False)
+    if report.count("error") or (args.strict and report.count("warning")):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Columnar classTrib rule table with the boolean flags packed into bitmasks.
+
+Each rule's 22 indicator flags (IndNFe, IndNFCe, IndEstornoCred, Monofasia*...)
+become one bit of a uint32, next to NumPy arrays for pRedIBS/pRedCBS, the
+annex number, the rate type and the validity window. A filter such as
+"valid for NFC-e, with credit reversal and an IBS reduction" is then a couple
+of vectorized mask operations over the whole table.
+
+Usage:
+    python scripts/class_trib_bitset.py --flags ind_nfce,ind_estorno_cred --min-red-ibs 0
+    python scripts/class_trib_bitset.py --valid-on 2027-03-01 --without monofasia_padrao
+    python scripts/class_trib_bitset.py --memory --synthetic 100000
+"""
+
+import sys
+import time
+import random
+import argparse
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from gov_tax_data import CLASS_TRIB_FLAGS, class_trib_row, iter_class_trib_rules, load_dump
+
+# staging column name -> bit
+FLAG_BITS: Dict[str, int] = {column: 1 << bit for bit, column in enumerate(CLASS_TRIB_FLAGS.values())}
+_NO_DATE = np.datetime64("NaT", "s")
+
+
+def flag_mask(columns: Iterable[str]) -> int:
+    mask = 0
+    for column in columns:
+        if column not in FLAG_BITS:
+            raise KeyError(f"Unknown flag {column!r}; expected one of {sorted(FLAG_BITS)}")
+        mask |= FLAG_BITS[column]
+    return mask
+
+
+class ClassTribTable:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        size = len(rows)
+        self.codes = np.array([row["c_class_trib"] for row in rows], dtype="U8")
+        self.flags = np.zeros(size, dtype=np.uint32)
+        self.p_red_ibs = np.array([row["p_red_ibs"] if row["p_red_ibs"] is not None else np.nan for row in rows],
+                                  dtype=np.float64)
+        self.p_red_cbs = np.array([row["p_red_cbs"] if row["p_red_cbs"] is not None else np.nan for row in rows],
+                                  dtype=np.float64)
+        self.anexo = np.array([row["anexo"] if row["anexo"] is not None else -1 for row in rows], dtype=np.int16)
+        # Rate types ("Padrão", "Uniforme Setorial"...) as codes into a small category list
+        self.tipo_categories: List[str] = sorted({row["tipo_aliquota"] or "" for row in rows})
+        lookup = {name: i for i, name in enumerate(self.tipo_categories)}
+        self.tipo = np.array([lookup[row["tipo_aliquota"] or ""] for row in rows], dtype=np.uint8)
+        self.inicio = np.array([row["inicio_vigencia"] or _NO_DATE for row in rows], dtype="datetime64[s]")
+        self.fim = np.array([row["fim_vigencia"] or _NO_DATE for row in rows], dtype="datetime64[s]")
+        for column, bit in FLAG_BITS.items():
+            self.flags[[i for i, row in enumerate(rows) if row[column]]] |= bit
+
+    @classmethod
+    def from_items(cls, items: Iterable[Any]) -> "ClassTribTable":
+        """Builds from any classTrib payload shape (API, {"rule": ...} dump, flat rules)."""
+        latest = {}
+        for rule in iter_class_trib_rules(items):
+            row = class_trib_row(rule)
+            if row is not None:
+                latest[row["c_class_trib"]] = row
+        return cls(list(latest.values()))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def select(self, all_of: Sequence[str] = (), none_of: Sequence[str] = (), any_of: Sequence[str] = (),
+               min_red_ibs: Optional[float] = None, min_red_cbs: Optional[float] = None,
+               anexo: Optional[int] = None, tipo: Optional[str] = None, valid_on=None) -> np.ndarray:
+        """
+        Boolean mask of the rules matching every given condition. Reductions
+        are strict lower bounds (min_red_ibs=0 means "has an IBS reduction").
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if all_of:
+            required = flag_mask(all_of)
+            mask &= (self.flags & required) == required
+        if none_of:
+            mask &= (self.flags & flag_mask(none_of)) == 0
+        if any_of:
+            mask &= (self.flags & flag_mask(any_of)) != 0
+        if min_red_ibs is not None:
+            mask &= self.p_red_ibs > min_red_ibs
+        if min_red_cbs is not None:
+            mask &= self.p_red_cbs > min_red_cbs
+        if anexo is not None:
+            mask &= self.anexo == anexo
+        if tipo is not None:
+            if tipo not in self.tipo_categories:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.tipo == self.tipo_categories.index(tipo)
+        if valid_on is not None:
+            day = np.datetime64(valid_on, "s")
+            # FimVigencia is the last day in force; NaT means open-ended
+            mask &= (self.inicio <= day) & (np.isnat(self.fim) | (day < self.fim + np.timedelta64(1, "D")))
+        return mask
+
+    def codes_where(self, **conditions) -> List[str]:
+        return self.codes[self.select(**conditions)].tolist()
+
+    def flags_of(self, code: str) -> List[str]:
+        hits = np.flatnonzero(self.codes == code)
+        if not len(hits):
+            return []
+        value = int(self.flags[hits[0]])
+        return [column for column, bit in FLAG_BITS.items() if value & bit]
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.codes, self.flags, self.p_red_ibs, self.p_red_cbs,
+                                              self.anexo, self.tipo, self.inicio, self.fim))
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    """Approximate memory of nested dicts/lists/strings, counting shared objects once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    return size
+
+
+def synthetic_rules(count: int, seed: int = 13) -> List[Dict[str, Any]]:
+    """Random classTrib rules in the dump shape, to size the table beyond the handful published."""
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        rule = {flag: rng.random() < 0.5 for flag in CLASS_TRIB_FLAGS}
+        rule.update({
+            "cClassTrib": f"{i:06d}",
+            "DescricaoClassTrib": f"Regra sintética {i}",
+            "TipoAliquota": rng.choice(["Padrão", "Uniforme Setorial", "Fixa", "Sem Alíquota"]),
+            "Anexo": rng.choice([None, None, 1, 2, 3, 7, 11]),
+            "pRedIBS": rng.choice([0.0, 0.0, 30.0, 60.0, 100.0]),
+            "pRedCBS": rng.choice([0.0, 0.0, 30.0, 60.0, 100.0]),
+            "InicioVigencia": f"{rng.randint(2025, 2030)}-01-01T00:00:00",
+            "FimVigencia": None,
+        })
+        rules.append({"rule": rule})
+    return rules
+
+
+def memory_report(items: List[Any], table: ClassTribTable) -> None:
+    rules = {rule["cClassTrib"]: rule for rule in iter_class_trib_rules(items)}
+    dict_bytes = deep_sizeof(rules)
+    print(f"Rules: {len(table)}")
+    print(f"dict-of-dicts: {dict_bytes / 1024:10.1f} KiB ({dict_bytes / max(len(table), 1):.0f} B/rule)")
+    print(f"bitset table:  {table.nbytes() / 1024:10.1f} KiB ({table.nbytes() / max(len(table), 1):.0f} B/rule)")
+    print(f"ratio:         {dict_bytes / max(table.nbytes(), 1):10.1f}x")
+
+    conditions = {"all_of": ["ind_nfce", "ind_estorno_cred"], "min_red_ibs": 0.0}
+    started = time.perf_counter()
+    expected = [code for code, rule in rules.items()
+                if rule.get("IndNFCe") and rule.get("IndEstornoCred") and (rule.get("pRedIBS") or 0) > 0]
+    scan = time.perf_counter() - started
+    started = time.perf_counter()
+    selected = table.codes_where(**conditions)
+    vectorized = time.perf_counter() - started
+    assert sorted(selected) == sorted(expected)
+    print(f"NFC-e + estorno + pRedIBS > 0: {len(selected)} rules; "
+          f"dict scan {scan * 1000:.2f} ms, bitmask {vectorized * 1000:.2f} ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Filter classTrib rules with packed flag bitmasks")
+    parser.add_argument("--dump", default="rules_dump.json", help="classTrib JSON dump (default: %(default)s)")
+    parser.add_argument("--synthetic", type=int, help="use this many random rules instead of the dump")
+    parser.add_argument("--flags", default="", help="comma-separated flags that must all be set")
+    parser.add_argument("--without", default="", help="comma-separated flags that must be unset")
+    parser.add_argument("--any", default="", help="comma-separated flags of which at least one is set")
+    parser.add_argument("--min-red-ibs", type=float, help="pRedIBS strictly greater than this")
+    parser.add_argument("--min-red-cbs", type=float, help="pRedCBS strictly greater than this")
+    parser.add_argument("--anexo", type=int)
+    parser.add_argument("--tipo", help="TipoAliquota, e.g. 'Uniforme Setorial'")
+    parser.add_argument("--valid-on", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="only rules in force on this date")
+    parser.add_argument("--memory", action="store_true", help="compare memory with the dict-of-dicts form")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    items = synthetic_rules(args.synthetic) if args.synthetic else load_dump(args.dump)
+    table = ClassTribTable.from_items(items)
+
+    if args.memory:
+        memory_report(items, table)
+        return
+
+    split = lambda value: [v.strip() for v in value.split(",") if v.strip()]
+    try:
+        mask = table.select(all_of=split(args.flags), none_of=split(args.without), any_of=split(args.any),
+                            min_red_ibs=args.min_red_ibs, min_red_cbs=args.min_red_cbs,
+                            anexo=args.anexo, tipo=args.tipo, valid_on=args.valid_on)
+    except KeyError as e:
+        print(e.args[0])
+        sys.exit(1)
+    codes = table.codes[mask]
+    print(f"{len(codes)} of {len(table)} rules match")
+    for code in codes[:50].tolist():
+        print(f"  {code}: {', '.join(table.flags_of(code))}")
+
+
+if __name__ == "__main__":
+    main()
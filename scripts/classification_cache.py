@@ -0,0 +1,225 @@
+"""
+On-disk cache of tax-classifier answers, keyed by NCM + normalized description.
+
+"Arroz Branco Tipo 1 - 5 kg" and "ARROZ BRANCO TIPO 1 5KG" with NCM
+1006.30.21 share one entry, so a product seen under ten suppliers costs one
+model call. Entries expire after a TTL, the table is capped at max_entries
+with least-recently-used eviction, and the whole cache is dropped when the
+gov data snapshot it was built against changes (the function validates NCMs
+against that data, so old answers may no longer hold).
+
+Usage:
+    python scripts/classification_cache.py --cache classifier_cache.db            # stats
+    python scripts/classification_cache.py --cache classifier_cache.db --purge    # drop expired
+    python scripts/classification_cache.py --cache classifier_cache.db --clear
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from gov_tax_data import payload_hash
+from ncm_index import normalize_code
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = "classifier_cache.db"
+DEFAULT_TTL_DAYS = 30.0
+DEFAULT_MAX_ENTRIES = 200000
+# Gov data the classifier answers depend on; its hash versions the cache
+DEFAULT_SNAPSHOT_DUMPS = (os.path.join(REPO_ROOT, "anexos_dump.json"), os.path.join(REPO_ROOT, "rules_dump.json"))
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+_NUMBER_UNIT = re.compile(r"(\d) (?=[A-Z])")
+_SQLITE_MAX_VARS = 900
+
+
+def normalize_description(text: Optional[str]) -> str:
+    """'Arroz Branco, tipo 1 - 5 kg' -> 'ARROZ BRANCO TIPO 1 5KG'."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).upper()
+    text = _NON_ALNUM.sub(" ", text).strip()
+    return _NUMBER_UNIT.sub(r"\1", text)
+
+
+def cache_key(produto: Dict[str, Any]) -> str:
+    return f"{normalize_code(produto.get('ncm'))}|{normalize_description(produto.get('descricao'))}"
+
+
+def snapshot_fingerprint(paths: Iterable[str] = DEFAULT_SNAPSHOT_DUMPS) -> Optional[str]:
+    """Hash of the gov data dumps that exist; None when there are none."""
+    parts = []
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                parts.append(payload_hash(f.read()))
+    return payload_hash("|".join(parts).encode()) if parts else None
+
+
+class ClassificationCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_days: float = DEFAULT_TTL_DAYS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, snapshot: Optional[str] = None):
+        self.path = path
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "stored": 0, "evicted": 0, "invalidated": 0}
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("pragma synchronous=normal")
+        self.conn.executescript("""
+            create table if not exists classification_cache (
+                key text primary key,
+                classificacao text not null,
+                motivo text,
+                source text,
+                created_at real not null,
+                last_used real not null
+            );
+            create index if not exists classification_cache_last_used_idx on classification_cache (last_used);
+            create table if not exists cache_meta (name text primary key, value text);
+        """)
+        if snapshot is not None:
+            self._check_snapshot(snapshot)
+
+    def _meta(self, name: str) -> Optional[str]:
+        row = self.conn.execute("select value from cache_meta where name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name: str, value) -> None:
+        self.conn.execute("insert or replace into cache_meta (name, value) values (?, ?)", (name, str(value)))
+
+    def _check_snapshot(self, snapshot: str) -> None:
+        stored = self._meta("snapshot")
+        if stored is not None and stored != snapshot:
+            self.stats["invalidated"] = self.conn.execute("select count(*) from classification_cache").fetchone()[0]
+            self.conn.execute("delete from classification_cache")
+        with self.conn:
+            self._set_meta("snapshot", snapshot)
+
+    def get_many(self, produtos: Sequence[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Cached answers for the products that have one, by cache key."""
+        keys = list({cache_key(p) for p in produtos})
+        now = time.time()
+        found: Dict[str, Dict[str, Any]] = {}
+        expired: List[str] = []
+        for start in range(0, len(keys), _SQLITE_MAX_VARS):
+            chunk = keys[start:start + _SQLITE_MAX_VARS]
+            rows = self.conn.execute(
+                f"select key, classificacao, motivo, source, created_at from classification_cache "
+                f"where key in ({','.join('?' * len(chunk))})", chunk).fetchall()
+            for key, classificacao, motivo, source, created_at in rows:
+                if self.ttl is not None and now - created_at > self.ttl:
+                    expired.append(key)
+                    continue
+                found[key] = {"classificacao": json.loads(classificacao), "motivo": motivo, "source": source}
+        with self.conn:
+            if found:
+                self.conn.executemany("update classification_cache set last_used = ? where key = ?",
+                                      [(now, key) for key in found])
+            if expired:
+                self.conn.executemany("delete from classification_cache where key = ?", [(k,) for k in expired])
+        for produto in produtos:
+            if cache_key(produto) in found:
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+        self.stats["expired"] += len(expired)
+        return found
+
+    def put_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Stores classified records ({descricao, ncm, classificacao, motivo, source})."""
+        now = time.time()
+        rows = [(cache_key(r), json.dumps(r["classificacao"], ensure_ascii=False), r.get("motivo"),
+                 r.get("source"), now, now) for r in records if r.get("classificacao")]
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "insert or replace into classification_cache "
+                "(key, classificacao, motivo, source, created_at, last_used) values (?, ?, ?, ?, ?, ?)", rows)
+        self.stats["stored"] += len(rows)
+        self.evict()
+
+    def evict(self) -> int:
+        """Drops the least recently used entries beyond max_entries."""
+        excess = len(self) - self.max_entries
+        if excess <= 0:
+            return 0
+        with self.conn:
+            self.conn.execute(
+                "delete from classification_cache where key in "
+                "(select key from classification_cache order by last_used limit ?)", (excess,))
+        self.stats["evicted"] += excess
+        return excess
+
+    def purge_expired(self) -> int:
+        if self.ttl is None:
+            return 0
+        with self.conn:
+            cursor = self.conn.execute("delete from classification_cache where created_at < ?",
+                                       (time.time() - self.ttl,))
+        self.stats["expired"] += cursor.rowcount
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        with self.conn:
+            self.conn.execute("delete from classification_cache")
+
+    def __len__(self) -> int:
+        return self.conn.execute("select count(*) from classification_cache").fetchone()[0]
+
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else None
+
+    def lifetime_stats(self) -> Dict[str, int]:
+        return {name: int(self._meta(f"total_{name}") or 0) for name in ("hits", "misses")}
+
+    def summary(self) -> Dict[str, Any]:
+        hit_rate = self.hit_rate()
+        return {
+            **self.stats,
+            "hit_rate": round(hit_rate, 4) if hit_rate is not None else None,
+            "entries": len(self),
+            "lifetime": {name: count + self.stats[name] for name, count in self.lifetime_stats().items()},
+        }
+
+    def close(self) -> None:
+        lifetime = self.lifetime_stats()
+        with self.conn:
+            for name in ("hits", "misses"):
+                self._set_meta(f"total_{name}", lifetime[name] + self.stats[name])
+        self.conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or maintain the classification cache")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="cache database (default: %(default)s)")
+    parser.add_argument("--ttl-days", type=float, default=DEFAULT_TTL_DAYS)
+    parser.add_argument("--purge", action="store_true", help="delete expired entries")
+    parser.add_argument("--clear", action="store_true", help="delete every entry")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache = ClassificationCache(args.cache, ttl_days=args.ttl_days)
+    if args.clear:
+        cache.clear()
+    elif args.purge:
+        print(f"Purged {cache.purge_expired()} expired entries")
+    print(f"Entries: {len(cache)}")
+    print(f"Snapshot: {cache._meta('snapshot') or 'n/a'}")
+    lifetime = cache.lifetime_stats()
+    lookups = lifetime["hits"] + lifetime["misses"]
+    print(f"Lifetime: {lifetime['hits']} hits / {lifetime['misses']} misses"
+          + (f" ({lifetime['hits'] / lookups:.1%} hit rate)" if lookups else ""))
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
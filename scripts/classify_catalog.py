@@ -0,0 +1,503 @@
+"""
+Bulk product catalog classification through the tax-classifier edge function.
+
+The function handles at most 50 products per call, so the catalog (CSV or
+NDJSON) is streamed in 50-item batches and a bounded number of batches is
+kept in flight at once. Results are appended to an NDJSON file as each batch
+returns; that file is also the checkpoint: a rerun skips every product id
+already written, so an interrupted run picks up where it stopped. Products
+that could not be classified go to <output>.errors.ndjson and are retried on
+the next run.
+
+Products whose NCM is listed in one of the LC 214/2025 annexes are classified
+locally from the gov dumps first (see pre_classifier.py; --no-local disables
+it). Answers are also kept in a local classification cache (see
+classification_cache.py) keyed by NCM + normalized description, so products
+repeated across suppliers or runs are only sent once; --no-cache disables it.
+
+CSV columns are matched case-insensitively: id/codigo/sku, descricao/
+descrição/produto/description and ncm. Products without an id get their
+line number.
+
+Usage:
+    python scripts/classify_catalog.py catalog.csv --concurrency 4
+    python scripts/classify_catalog.py catalog.ndjson --output results.ndjson --restart
+    python scripts/classify_catalog.py catalog.csv --url http://127.0.0.1:8010   # tax_classifier_stub.py
+    python scripts/classify_catalog.py catalog.csv --cache-ttl-days 7 --cache-max-entries 50000
+"""
+
+import os
+import csv
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from classification_cache import (DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES, DEFAULT_TTL_DAYS,
+                                  ClassificationCache, cache_key, snapshot_fingerprint)
+from pre_classifier import DEFAULT_ANEXOS_DUMP, DEFAULT_BATCH_LATENCY, DEFAULT_CLASS_TRIB_DUMP, PreClassifier
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 50  # produtos.slice(0, 50) in the edge function
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 120
+DEFAULT_MAX_ATTEMPTS = 3
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+PROGRESS_EVERY = 20  # batches between progress lines
+LOOKUP_CHUNK = 500  # products resolved locally / looked up in the cache at a time
+
+ID_COLUMNS = ("id", "codigo", "código", "sku", "cod_produto")
+DESCRIPTION_COLUMNS = ("descricao", "descrição", "produto", "description", "nome")
+NCM_COLUMNS = ("ncm", "cod_ncm", "ncm_sh")
+
+
+class ClassifierError(Exception):
+    pass
+
+
+def pick(row: Dict[str, Any], names: Tuple[str, ...]) -> Optional[str]:
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ""):
+            return str(value).strip()
+    return None
+
+
+def to_product(row: Dict[str, Any], line: int) -> Dict[str, Any]:
+    row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    return {
+        "id": pick(row, ID_COLUMNS) or str(line),
+        "descricao": pick(row, DESCRIPTION_COLUMNS) or "",
+        "ncm": pick(row, NCM_COLUMNS) or "",
+    }
+
+
+def read_products(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Streams {id, descricao, ncm} products from a CSV or NDJSON catalog."""
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+            except csv.Error:
+                dialect = csv.excel
+            for line, row in enumerate(csv.DictReader(f, dialect=dialect), start=2):
+                yield to_product(row, line)
+        else:
+            for line, text in enumerate(f, start=1):
+                text = text.strip()
+                if not text:
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError:
+                    logger.warning(f"{path}:{line}: invalid JSON, skipping")
+                    continue
+                yield to_product(row, line)
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty sample."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class ClassifierClient:
+    """Posts batches to tax-classifier, retrying throttling, 5xx and connection errors."""
+
+    def __init__(self, url: str, api_key: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, pool_size: int = DEFAULT_CONCURRENCY):
+        self.url = url
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def classify(self, produtos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if len(produtos) > MAX_BATCH_SIZE:
+            raise ValueError(f"tax-classifier accepts at most {MAX_BATCH_SIZE} products per call")
+        last_error = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = self.session.post(self.url, json={"produtos": produtos}, timeout=self.timeout)
+                if response.status_code in RETRYABLE_STATUS:
+                    raise requests.exceptions.RequestException(f"HTTP {response.status_code}")
+                if response.status_code != 200:
+                    # Other 4xx (bad key, wrong URL...) will not get better on retry; the
+                    # body may be an HTML error page, so it is only quoted, never parsed
+                    raise ClassifierError(f"HTTP {response.status_code}: {response.text[:200]}")
+                body = response.json()
+                if not body.get("success"):
+                    raise ClassifierError(body.get("error") or "tax-classifier reported failure")
+                return body.get("data") or []
+            except (requests.exceptions.RequestException, ValueError) as e:
+                last_error = e
+                if attempt < self.max_attempts:
+                    time.sleep(random.uniform(0, min(30.0, 2.0 ** attempt)))
+        raise ClassifierError(f"{last_error} after {self.max_attempts} attempts")
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class ResultWriter:
+    """Append-only NDJSON results file that doubles as the resume checkpoint."""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.errors_path = f"{path}.errors.ndjson"
+        self.done: Set[str] = set() if restart else self._load_done()
+        mode = "w" if restart else "a"
+        self._out = open(path, mode, encoding="utf-8")
+        self._errors = open(self.errors_path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def _load_done(self) -> Set[str]:
+        done: Set[str] = set()
+        if not os.path.exists(self.path):
+            return done
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                try:
+                    done.add(str(json.loads(raw)["id"]))
+                except (ValueError, KeyError):
+                    break  # a line cut short by a crash; everything after it is rewritten
+                valid_bytes += len(raw)
+        if valid_bytes < os.path.getsize(self.path):
+            logger.warning(f"{self.path}: dropping a truncated last record")
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_bytes)
+        return done
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for record in records:
+                self._out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self.done.add(str(record["id"]))
+            self._out.flush()
+
+    def write_errors(self, produtos: List[Dict[str, Any]], error: str) -> None:
+        with self._lock:
+            for produto in produtos:
+                self._errors.write(json.dumps({**produto, "error": error}, ensure_ascii=False) + "\n")
+            self._errors.flush()
+
+    def close(self) -> None:
+        self._out.close()
+        self._errors.close()
+
+
+class CatalogStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.skipped = 0
+        self.classified = 0
+        self.failed = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.local = 0
+        self.cached = 0
+        self.coalesced = 0
+        self.latencies: List[float] = []
+        self.sources: Dict[str, int] = {}
+
+    def record_batch(self, latency: float, records: List[Dict[str, Any]], failed: int) -> None:
+        self.batches += 1
+        self.latencies.append(latency)
+        self.classified += len(records)
+        self.failed += failed
+        for record in records:
+            source = record.get("source") or "?"
+            self.sources[source] = self.sources.get(source, 0) + 1
+
+    def record_local(self, records: List[Dict[str, Any]]) -> None:
+        self.local += len(records)
+        self.classified += len(records)
+        for record in records:
+            self.sources[record["source"]] = self.sources.get(record["source"], 0) + 1
+
+    def record_cached(self, records: List[Dict[str, Any]]) -> None:
+        self.cached += len(records)
+        self.classified += len(records)
+
+    def products_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.classified / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        ms = lambda value: round(value * 1000, 1) if value is not None else None
+        return {
+            "elapsed_s": round(time.perf_counter() - self.started, 3),
+            "classified": self.classified,
+            "failed": self.failed,
+            "skipped_from_checkpoint": self.skipped,
+            "resolved_locally": self.local,
+            "from_cache": self.cached,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "products_per_s": round(self.products_per_second(), 2),
+            "sources": self.sources,
+            "batch_latency_ms": {
+                "p50": ms(percentile(self.latencies, 50)),
+                "p90": ms(percentile(self.latencies, 90)),
+                "p99": ms(percentile(self.latencies, 99)),
+                "max": ms(max(self.latencies) if self.latencies else None),
+            },
+        }
+
+
+def to_records(batch: List[Dict[str, Any]], data: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Pairs the function's answers with the input products; returns (records, missing products)."""
+    answered = {str(item.get("id")): item for item in data if item.get("classificacao")}
+    records, missing = [], []
+    for produto in batch:
+        item = answered.get(str(produto["id"]))
+        if item is None:
+            missing.append(produto)
+            continue
+        records.append({
+            **produto,
+            "classificacao": item["classificacao"],
+            "motivo": item.get("motivo"),
+            "source": item.get("source"),
+        })
+    return records, missing
+
+
+def classify_batch(client: ClassifierClient, batch: List[Dict[str, Any]]) -> Tuple[float, List[Dict[str, Any]]]:
+    started = time.perf_counter()
+    data = client.classify(batch)
+    return time.perf_counter() - started, data
+
+
+def classify_catalog(products: Iterable[Dict[str, Any]], client: ClassifierClient, writer: ResultWriter,
+                     concurrency: int = DEFAULT_CONCURRENCY, batch_size: int = MAX_BATCH_SIZE,
+                     stats: Optional[CatalogStats] = None,
+                     cache: Optional[ClassificationCache] = None,
+                     pre_classifier: Optional[PreClassifier] = None) -> CatalogStats:
+    """
+    Classifies every product not already in the writer's checkpoint. At most
+    `concurrency` batches are in flight; the input is only read as fast as
+    batches complete, so memory stays bounded for any catalog size.
+
+    Products the pre-classifier resolves from the annexes never leave the
+    machine. With a cache, hits are written without a call, and repeats of a product
+    that is already in flight wait for its answer instead of being sent again.
+    """
+    stats = stats or CatalogStats()
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+    # cache key -> products waiting on the in-flight answer for that key
+    waiting: Dict[str, List[Dict[str, Any]]] = {}
+
+    def pending_products():
+        for produto in products:
+            if produto["id"] in writer.done:
+                stats.skipped += 1
+                continue
+            yield produto
+
+    def unresolved(produtos):
+        for chunk in batched(produtos, LOOKUP_CHUNK):
+            resolved, forward = pre_classifier.split(chunk)
+            if resolved:
+                writer.write(resolved)
+                stats.record_local(resolved)
+            yield from forward
+
+    def uncached(produtos):
+        for chunk in batched(produtos, LOOKUP_CHUNK):
+            found = cache.get_many(chunk)
+            hits = []
+            for produto in chunk:
+                key = cache_key(produto)
+                if key in found:
+                    hits.append({**produto, **found[key], "cached": True})
+                elif key in waiting:
+                    waiting[key].append(produto)
+                    stats.coalesced += 1
+                else:
+                    waiting[key] = []
+                    yield produto
+            if hits:
+                writer.write(hits)
+                stats.record_cached(hits)
+
+    def release(batch):
+        """Products that were waiting on this batch's keys."""
+        if cache is None:
+            return []
+        return [p for produto in batch for p in waiting.pop(cache_key(produto), [])]
+
+    def collect(done_futures):
+        for future in done_futures:
+            batch = in_flight.pop(future)
+            try:
+                latency, data = future.result()
+            except ClassifierError as e:
+                failed = batch + release(batch)
+                stats.failed_batches += 1
+                stats.failed += len(failed)
+                writer.write_errors(failed, str(e))
+                logger.warning(f"Batch of {len(batch)} failed: {e}")
+                continue
+            records, missing = to_records(batch, data)
+            if cache is not None:
+                cache.put_many(records)
+                answers = {cache_key(r): r for r in records}
+                for produto in release(batch):
+                    answer = answers.get(cache_key(produto))
+                    if answer is None:
+                        missing.append(produto)
+                    else:
+                        records.append({**produto, "classificacao": answer["classificacao"],
+                                        "motivo": answer["motivo"], "source": answer["source"]})
+            writer.write(records)
+            if missing:
+                writer.write_errors(missing, "missing from response")
+            stats.record_batch(latency, records, len(missing))
+            if stats.batches % PROGRESS_EVERY == 0:
+                logger.info(f"{stats.classified} products classified, "
+                            f"{stats.products_per_second():.1f} products/s")
+
+    to_send = pending_products()
+    if pre_classifier is not None:
+        to_send = unresolved(to_send)
+    if cache is not None:
+        to_send = uncached(to_send)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for batch in batched(to_send, batch_size):
+            if len(in_flight) >= concurrency:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[executor.submit(classify_batch, client, batch)] = batch
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a product catalog through tax-classifier")
+    parser.add_argument("input", help="catalog file (.csv or .ndjson/.jsonl)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="input format (default: from the extension)")
+    parser.add_argument("--output", help="NDJSON results / checkpoint (default: <input>.classified.ndjson)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="batches in flight at once (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE,
+                        help=f"products per call, at most {MAX_BATCH_SIZE} (default: %(default)s)")
+    parser.add_argument("--url", help="function URL (default: $VITE_SUPABASE_URL/functions/v1/tax-classifier)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds per call (default: %(default)s)")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="attempts per batch before it is recorded as failed (default: %(default)s)")
+    parser.add_argument("--no-local", action="store_true", help="send annex-listed NCMs to the function too")
+    parser.add_argument("--anexos", default=DEFAULT_ANEXOS_DUMP, help="anexos dump for local classification")
+    parser.add_argument("--class-trib", default=DEFAULT_CLASS_TRIB_DUMP, help="classTrib dump for local classification")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="classification cache (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="always call the function")
+    parser.add_argument("--cache-ttl-days", type=float, default=DEFAULT_TTL_DAYS,
+                        help="cached answers older than this are refreshed (default: %(default)s)")
+    parser.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="LRU bound on cached answers (default: %(default)s)")
+    parser.add_argument("--summary", metavar="PATH", help="also write the run summary as JSON here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+
+    url = args.url
+    if not url:
+        supabase_url = os.getenv("VITE_SUPABASE_URL")
+        if not supabase_url:
+            logger.error("Set VITE_SUPABASE_URL (or pass --url)")
+            sys.exit(1)
+        url = f"{supabase_url}/functions/v1/tax-classifier"
+    output = args.output or f"{os.path.splitext(args.input)[0]}.classified.ndjson"
+
+    client = ClassifierClient(url, os.getenv("VITE_SUPABASE_PUBLISHABLE_KEY"), args.timeout,
+                              args.max_attempts, args.concurrency)
+    writer = ResultWriter(output, restart=args.restart)
+    pre_classifier = None
+    if not args.no_local:
+        if os.path.exists(args.anexos):
+            pre_classifier = PreClassifier.from_dumps(args.anexos, args.class_trib)
+        else:
+            logger.warning(f"{args.anexos} not found, classifying every product through the function")
+    cache = None
+    if not args.no_cache:
+        cache = ClassificationCache(args.cache, args.cache_ttl_days, args.cache_max_entries,
+                                    snapshot=snapshot_fingerprint() or "")
+        if cache.stats["invalidated"]:
+            logger.info(f"Gov data snapshot changed: dropped {cache.stats['invalidated']} cached answers")
+    if writer.done:
+        logger.info(f"Resuming: {len(writer.done)} products already in {output}")
+    logger.info(f"Classifying {args.input} via {url} ({args.concurrency} concurrent batches)")
+    try:
+        stats = classify_catalog(read_products(args.input, args.format), client, writer,
+                                 args.concurrency, args.batch_size, cache=cache,
+                                 pre_classifier=pre_classifier)
+    finally:
+        writer.close()
+        client.close()
+        if cache is not None:
+            cache_summary = cache.summary()
+            cache.close()
+
+    summary = stats.summary()
+    if pre_classifier is not None:
+        mean_batch = sum(stats.latencies) / len(stats.latencies) if stats.latencies else DEFAULT_BATCH_LATENCY
+        summary["pre_classifier"] = pre_classifier.summary(mean_batch, args.batch_size)
+    if cache is not None:
+        summary["cache"] = cache_summary
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    if stats.failed:
+        logger.warning(f"{stats.failed} products failed; see {writer.errors_path} and rerun to retry them")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Change log between successive government tax data snapshots.
+
+Compares the newest and the previous snapshot of each source_api, matching
+items by natural key, and emits one NDJSON record per added, removed or
+modified item (with the field-level changes). Both snapshots are indexed in
+hash maps, so the diff runs in linear time.
+
+Usage:
+    python scripts/diff_gov_snapshots.py                          # every source, from Supabase
+    python scripts/diff_gov_snapshots.py --source-api anexos --output anexos_changes.ndjson
+    python scripts/diff_gov_snapshots.py --to-table               # also write gov_tax_change_log
+    python scripts/diff_gov_snapshots.py --source-api anexos --old old.json --new anexos_dump.json
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from gov_tax_data import STAGING_SPECS, StagingSpec, create_supabase_client, list_snapshots, load_dump
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+CHANGE_LOG_TABLE = "gov_tax_change_log"
+INSERT_BATCH_SIZE = 500
+
+
+def index_items(spec: StagingSpec, items: Iterable[Any]) -> Dict[tuple, Dict[str, Any]]:
+    """Maps natural key -> raw item. Duplicated keys keep the last item, like the staging load."""
+    index = {}
+    for item in spec.iter_items(items):
+        row = spec.build_row(item)
+        if row is not None:
+            index[spec.key(row)] = item
+    return index
+
+
+def field_changes(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    changes = {}
+    for field in old.keys() | new.keys():
+        if old.get(field) != new.get(field):
+            changes[field] = {"old": old.get(field), "new": new.get(field)}
+    return changes
+
+
+def diff_snapshots(spec: StagingSpec, old_items: Iterable[Any], new_items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """Yields added/removed/modified records between two snapshots of one source_api."""
+    old_index = index_items(spec, old_items)
+    new_index = index_items(spec, new_items)
+
+    for key, new_item in new_index.items():
+        old_item = old_index.pop(key, None)
+        if old_item is None:
+            yield {"change": "added", "key": dict(zip(spec.key_columns, key)), "item": new_item}
+            continue
+        changes = field_changes(old_item, new_item)
+        if changes:
+            yield {"change": "modified", "key": dict(zip(spec.key_columns, key)), "fields": changes}
+
+    for key, old_item in old_index.items():
+        yield {"change": "removed", "key": dict(zip(spec.key_columns, key)), "item": old_item}
+
+
+class ChangeLogWriter:
+    """Writes change records to an NDJSON stream and, optionally, to the change-log table."""
+
+    def __init__(self, stream, supabase=None):
+        self.stream = stream
+        self.supabase = supabase
+        self.pending = []
+        self.counts = {"added": 0, "removed": 0, "modified": 0}
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.counts[record["change"]] += 1
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if self.supabase is not None:
+            self.pending.append({
+                "source_api": record["source_api"],
+                "change_type": record["change"],
+                "natural_key": record["key"],
+                "changes": record.get("fields") or record.get("item"),
+                "old_snapshot": record.get("old_snapshot"),
+                "new_snapshot": record.get("new_snapshot"),
+            })
+            if len(self.pending) >= INSERT_BATCH_SIZE:
+                self.flush()
+
+    def flush(self) -> None:
+        if self.supabase is not None and self.pending:
+            self.supabase.table(CHANGE_LOG_TABLE).insert(self.pending).execute()
+            self.pending = []
+
+
+def run_diff(spec: StagingSpec, old_items, new_items, writer: ChangeLogWriter,
+             old_snapshot: Optional[str] = None, new_snapshot: Optional[str] = None) -> None:
+    started = time.perf_counter()
+    before = dict(writer.counts)
+    for record in diff_snapshots(spec, old_items, new_items):
+        record["source_api"] = spec.source_api
+        record["old_snapshot"] = old_snapshot
+        record["new_snapshot"] = new_snapshot
+        writer.write(record)
+    writer.flush()
+    summary = ", ".join(f"{kind}={writer.counts[kind] - before[kind]}" for kind in writer.counts)
+    logger.info(f"{spec.source_api}: {summary} ({time.perf_counter() - started:.2f}s)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Diff the two latest snapshots of the gov tax data")
+    parser.add_argument("--source-api", action="append", choices=sorted(STAGING_SPECS),
+                        help="source(s) to diff (default: all)")
+    parser.add_argument("--output", default="-", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--to-table", action="store_true",
+                        help=f"also insert the records into {CHANGE_LOG_TABLE}")
+    parser.add_argument("--old", help="previous snapshot as a local JSON dump (needs --new)")
+    parser.add_argument("--new", help="newest snapshot as a local JSON dump (needs --old)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sources = args.source_api or sorted(STAGING_SPECS)
+    local = bool(args.old or args.new)
+    if local and not (args.old and args.new and len(sources) == 1):
+        logger.error("--old/--new need each other and exactly one --source-api")
+        sys.exit(1)
+
+    supabase = None if local and not args.to_table else create_supabase_client()
+    stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    writer = ChangeLogWriter(stream, supabase if args.to_table else None)
+
+    try:
+        if local:
+            run_diff(STAGING_SPECS[sources[0]], load_dump(args.old), load_dump(args.new), writer,
+                     args.old, args.new)
+            return
+
+        for source_api in sources:
+            snapshots = list_snapshots(supabase, source_api, count=2)
+            if len(snapshots) < 2:
+                logger.info(f"{source_api}: fewer than two snapshots stored, nothing to diff")
+                continue
+            newest, previous = snapshots
+            run_diff(STAGING_SPECS[source_api], previous.iter_items(supabase), newest.iter_items(supabase),
+                     writer, previous.snapshot_id, newest.snapshot_id)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Dumps Supabase tables and gov source_api snapshots to local files.
+
+A target is either a source_api (classTrib, anexos, indOper, credPresumido),
+dumped as the items of its latest raw_gov_tax_data snapshot, or any table /
+view name, read page by page through .range() windows. Rows are written to
+the file as each page arrives, so memory stays at one page whatever the
+table size. Output is NDJSON (one row per line) by default, .zst-compressed
+with --zstd, or a JSON array with --format json (the layout of the old
+*_dump.json files, which load_dump() reads either way).
+
+Usage:
+    python scripts/dump_tables.py anexos indOper classTrib --out-dir dumps
+    python scripts/dump_tables.py debug_tax_rules gov_anexo_ncm --zstd --workers 2
+    python scripts/dump_tables.py anexos --format json --output anexos_dump.json
+    python scripts/dump_tables.py gov_class_trib --sqlite replay.db --page-size 500
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from gov_tax_data import STAGING_SPECS, create_supabase_client, list_snapshots, open_dump
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 1000  # PostgREST's default max-rows
+# Stable page order per table; others are paged in whatever order the database returns
+ORDER_COLUMNS = {
+    "raw_gov_tax_data": ["id"],
+    "gov_tax_change_log": ["id"],
+    "debug_tax_rules": ["raw_id", "item_index", "rule_index"],
+    **{spec.table: list(spec.key_columns) for spec in STAGING_SPECS.values()},
+}
+
+
+def iter_table(supabase, table: str, columns: str = "*", page_size: int = DEFAULT_PAGE_SIZE,
+               order: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Rows of a table or view, one .range() page at a time."""
+    order = ORDER_COLUMNS.get(table, []) if order is None else order
+    start = 0
+    while True:
+        query = supabase.table(table).select(columns)
+        for column in order:
+            query = query.order(column)
+        page = query.range(start, start + page_size - 1).execute().data
+        yield from page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def iter_source_api(supabase, source_api: str) -> Iterator[Any]:
+    """Items of the latest snapshot of a source_api, in the shape of the old *_dump.json files."""
+    snapshots = list_snapshots(supabase, source_api, count=1)
+    if not snapshots:
+        logger.warning(f"{source_api}: no snapshot stored")
+        return iter(())
+    return snapshots[0].iter_items(supabase)
+
+
+class DumpWriter:
+    """Streams rows to NDJSON or to a JSON array, one line per row."""
+
+    def __init__(self, path: str, fmt: str):
+        self.fmt = fmt
+        self.rows = 0
+        self._file = open_dump(path, "w")
+        if fmt == "json":
+            self._file.write("[")
+
+    def write(self, row: Any) -> None:
+        text = json.dumps(row, ensure_ascii=False)
+        if self.fmt == "json":
+            text = ("\n" if not self.rows else ",\n") + text
+        else:
+            text += "\n"
+        self._file.write(text)
+        self.rows += 1
+
+    def close(self) -> None:
+        if self.fmt == "json":
+            self._file.write("\n]\n")
+        self._file.close()
+
+
+def output_path(target: str, args) -> str:
+    if args.output:
+        return args.output + (".zst" if args.zstd and not args.output.endswith(".zst") else "")
+    extension = ".json" if args.format == "json" else ".ndjson"
+    return os.path.join(args.out_dir, f"{target}{extension}{'.zst' if args.zstd else ''}")
+
+
+def dump_target(target: str, args) -> Dict[str, Any]:
+    if args.sqlite:
+        from sqlite_store import SqliteClient
+        supabase = SqliteClient(args.sqlite)
+    else:
+        supabase = create_supabase_client()
+    if target in STAGING_SPECS:
+        rows = iter_source_api(supabase, target)
+    else:
+        order = args.order.split(",") if args.order else None
+        rows = iter_table(supabase, target, args.select, args.page_size, order)
+
+    path = output_path(target, args)
+    started = time.perf_counter()
+    writer = DumpWriter(path, args.format)
+    try:
+        for row in rows:
+            writer.write(row)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    rate = writer.rows / elapsed if elapsed > 0 else 0.0
+    logger.info(f"{target}: {writer.rows} rows -> {path} ({os.path.getsize(path)} B, "
+                f"{elapsed:.2f}s, {rate:,.0f} rows/s)")
+    return {"target": target, "path": path, "rows": writer.rows, "seconds": elapsed}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Dump Supabase tables or gov source_api snapshots")
+    parser.add_argument("targets", nargs="+",
+                        help=f"table/view names or source_api values ({', '.join(sorted(STAGING_SPECS))})")
+    parser.add_argument("--out-dir", default=".", help="output directory (default: %(default)s)")
+    parser.add_argument("--output", help="output file, for a single target")
+    parser.add_argument("--format", choices=["ndjson", "json"], default="ndjson")
+    parser.add_argument("--zstd", action="store_true", help="compress the output (.zst, needs zstandard)")
+    parser.add_argument("--select", default="*", help="columns to select from tables (default: all)")
+    parser.add_argument("--order", help="comma-separated columns to page tables by (default: per table)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help="rows per .range() request (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, help="targets dumped in parallel (default: %(default)s)")
+    parser.add_argument("--sqlite", metavar="PATH", help="read from a SQLite replay database")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+    if args.output and len(args.targets) > 1:
+        logger.error("--output takes a single target; use --out-dir for several")
+        sys.exit(1)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        results = list(executor.map(lambda target: dump_target(target, args), args.targets))
+    elapsed = time.perf_counter() - started
+    total = sum(result["rows"] for result in results)
+    if len(results) > 1:
+        logger.info(f"Total: {total} rows from {len(results)} targets in {elapsed:.2f}s "
+                    f"({total / elapsed if elapsed > 0 else 0:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,35 @@
 import os
+import ssl
+import math
 import sys
 import json
+import time
+import uuid
+import random
+import codecs
 import base64
+import hashlib
+import argparse
 import tempfile
+import signal
 import logging
-from datetime import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_CA_BUNDLE_PATH
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import pkcs12
 from supabase import create_client, Client
 
+from gov_tax_data import STAGING_SPECS, StagingSpec, canonical_json, payload_hash, row_hash
+from sqlite_store import SqliteClient
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,112 +45,1022 @@ ENDPOINTS = [
     "anexos",
     "indOper"
 ]
+REQUEST_TIMEOUT = 60
+
+# Streaming mode: read the body in chunks and load it in bounded batches
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_BATCH_BYTES = int(os.environ.get("ETL_BATCH_BYTES", 1024 * 1024))
+DEFAULT_BATCH_ROWS = int(os.environ.get("ETL_BATCH_ROWS", 5000))
+
+# Concurrency settings (can be overridden from the command line)
+DEFAULT_MAX_WORKERS = int(os.environ.get("ETL_MAX_WORKERS", len(ENDPOINTS)))
+DEFAULT_ENDPOINT_CONCURRENCY = int(os.environ.get("ETL_ENDPOINT_CONCURRENCY", 1))
+
+# Staging tables are read back and written in pages of this many rows
+STAGING_PAGE_SIZE = 1000
+
+# Retry / circuit breaker settings
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("ETL_MAX_ATTEMPTS", 4))
+DEFAULT_BACKOFF_BASE = float(os.environ.get("ETL_BACKOFF_BASE", 2.0))
+DEFAULT_BACKOFF_MAX = float(os.environ.get("ETL_BACKOFF_MAX", 60.0))
+DEFAULT_BREAKER_THRESHOLD = int(os.environ.get("ETL_BREAKER_THRESHOLD", 3))
+DEFAULT_BREAKER_COOLDOWN = float(os.environ.get("ETL_BREAKER_COOLDOWN", 300.0))
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# Daemon mode: seconds between polls of each endpoint
+DEFAULT_POLL_INTERVAL = float(os.environ.get("ETL_POLL_INTERVAL", 900))
+DEFAULT_POLL_SCHEDULE = os.environ.get("ETL_POLL_SCHEDULE", "")
+
+# Returned by the fetchers when a conditional request got a 304
+NOT_MODIFIED = object()
+
+
+@dataclass
+class FetchResult:
+    endpoint: str
+    data: Optional[Any]
+    latency: float
+    spool: Optional["PayloadSpool"] = None
+    error: Optional[str] = None
+    not_modified: bool = False
+    validators: Optional[Dict[str, str]] = None
+
+
+class RetryableError(Exception):
+    """Transient failure (throttling, 5xx) that may succeed on a later attempt."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    backoff_base: float = DEFAULT_BACKOFF_BASE
+    backoff_max: float = DEFAULT_BACKOFF_MAX
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Exponential backoff with full jitter. A Retry-After sent by the server
+        wins over the computed delay, capped at backoff_max.
+        """
+        if retry_after is not None:
+            return min(max(0.0, retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint breaker: after `threshold` consecutive failures the endpoint
+    is left alone for `cooldown` seconds, then a single probe is let through.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_BREAKER_THRESHOLD, cooldown: float = DEFAULT_BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+
+    def allow(self, endpoint: str) -> bool:
+        with self._lock:
+            opened_at = self._opened_at.get(endpoint)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.cooldown:
+                # Half-open: allow one probe; a failure re-opens immediately
+                del self._opened_at[endpoint]
+                self._failures[endpoint] = self.threshold - 1
+                return True
+            return False
+
+    def record_success(self, endpoint: str) -> None:
+        with self._lock:
+            self._failures.pop(endpoint, None)
+            self._opened_at.pop(endpoint, None)
+
+    def record_failure(self, endpoint: str) -> None:
+        with self._lock:
+            failures = self._failures.get(endpoint, 0) + 1
+            self._failures[endpoint] = failures
+            if failures >= self.threshold and endpoint not in self._opened_at:
+                self._opened_at[endpoint] = time.monotonic()
+                logger.warning(f"Circuit opened for {endpoint} after {failures} consecutive failures")
+
+    def state(self, endpoint: str) -> str:
+        with self._lock:
+            return "open" if endpoint in self._opened_at else "closed"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty sample."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class EndpointMetrics:
+    """Per-endpoint counters for the machine-readable run summary."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+
+    def _entry(self, endpoint: str) -> Dict[str, Any]:
+        return self._endpoints.setdefault(endpoint, {
+            "attempts": 0,
+            # Bounded so a long-running daemon does not grow without limit
+            "latencies": deque(maxlen=1024),
+            "bytes_received": 0,
+            "errors": deque(maxlen=5),
+            "outcome": None,
+        })
+
+    def record_attempt(self, endpoint: str, latency: float, nbytes: int = 0, error: Optional[str] = None) -> None:
+        with self._lock:
+            entry = self._entry(endpoint)
+            entry["attempts"] += 1
+            entry["latencies"].append(latency)
+            entry["bytes_received"] += nbytes
+            if error:
+                entry["errors"].append(error)
+
+    def set_outcome(self, endpoint: str, outcome: str) -> None:
+        with self._lock:
+            self._entry(endpoint)["outcome"] = outcome
+
+    def summary(self, breaker: Optional[CircuitBreaker] = None) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for endpoint, entry in self._endpoints.items():
+                latencies = entry["latencies"]
+                result[endpoint] = {
+                    "outcome": entry["outcome"],
+                    "attempts": entry["attempts"],
+                    "bytes_received": entry["bytes_received"],
+                    "latency_s": {
+                        "p50": percentile(latencies, 50),
+                        "p90": percentile(latencies, 90),
+                        "p99": percentile(latencies, 99),
+                        "max": max(latencies) if latencies else None,
+                        "total": sum(latencies),
+                    },
+                    "errors": list(entry["errors"]),
+                }
+                if breaker is not None:
+                    result[endpoint]["circuit"] = breaker.state(endpoint)
+            return result
+
+
+class EndpointLimiter:
+    """
+    Caps how many requests may be in flight against the same endpoint,
+    independently of the size of the worker pool.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+    def get(self, endpoint: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if endpoint not in self._semaphores:
+                self._semaphores[endpoint] = threading.BoundedSemaphore(self.limit)
+            return self._semaphores[endpoint]
+
+
+class LoadStats:
+    """Counts what was inserted and what was skipped as unchanged."""
+
+    def __init__(self):
+        self.inserted = {"payloads": 0, "bytes": 0, "rows": 0}
+        self.skipped = {"payloads": 0, "bytes": 0, "rows": 0}
+
+    def add(self, inserted: bool, nbytes: int, rows: int) -> None:
+        bucket = self.inserted if inserted else self.skipped
+        bucket["payloads"] += 1
+        bucket["bytes"] += nbytes
+        bucket["rows"] += rows
+
+    def summary(self) -> str:
+        return (
+            f"inserted {self.inserted['payloads']} payloads "
+            f"({self.inserted['bytes']} bytes, {self.inserted['rows']} rows); "
+            f"skipped {self.skipped['payloads']} unchanged payloads "
+            f"({self.skipped['bytes']} bytes, {self.skipped['rows']} rows)"
+        )
+
+
+class PayloadSpool:
+    """
+    Disk-backed buffer for a streamed JSON array.
+
+    Items are kept one canonical JSON document per line, so memory stays flat
+    regardless of payload size. The hash is updated as items arrive and equals
+    payload_hash(canonical_json(items)) for the same list.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(mode="w+b")
+        self._hasher = hashlib.sha256(b"[")
+        self.count = 0
+        self.nbytes = 2  # enclosing brackets
+
+    def append(self, item) -> None:
+        encoded = canonical_json(item)
+        if self.count:
+            self._hasher.update(b",")
+            self.nbytes += 1
+        self._hasher.update(encoded)
+        self._file.write(encoded + b"\n")
+        self.count += 1
+        self.nbytes += len(encoded)
+
+    @property
+    def digest(self) -> str:
+        hasher = self._hasher.copy()
+        hasher.update(b"]")
+        return hasher.hexdigest()
+
+    def iter_batches(self, max_bytes: int, max_rows: int) -> Iterator[List[Any]]:
+        """Yields lists of items whose canonical size stays under max_bytes."""
+        self._file.seek(0)
+        batch, batch_bytes = [], 0
+        for line in self._file:
+            if batch and (batch_bytes + len(line) > max_bytes or len(batch) >= max_rows):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(json.loads(line))
+            batch_bytes += len(line)
+        if batch:
+            yield batch
+
+    def iter_items(self) -> Iterator[Any]:
+        self._file.seek(0)
+        for line in self._file:
+            yield json.loads(line)
+
+    def close(self) -> None:
+        self._file.close()
+
 
 def get_supabase_client() -> Client:
     url = os.environ.get("SUPABASE_URL")
     key = os.environ.get("SUPABASE_SERVICE_KEY")
-    
+
     if not url or not key:
         logger.error("SUPABASE_URL or SUPABASE_SERVICE_KEY not set")
         sys.exit(1)
-        
+
     return create_client(url, key)
 
-def get_cert_path():
+def get_client_pem() -> bytes:
     """
-    Decodes the base64 encoded certificate from environment variable
-    and writes it to a temporary file.
-    Returns the path to the temporary file.
+    Decodes GOV_CERT_BASE64 into a PEM bundle (private key + certificate +
+    chain) kept in memory. Both a PEM file and the A1 .pfx/.p12 issued by the
+    CA are accepted; PKCS#12 is converted here with GOV_CERT_PASSWORD, so
+    scripts/convert_cert.py is no longer a required step.
     """
     cert_b64 = os.environ.get("GOV_CERT_BASE64")
     if not cert_b64:
         logger.error("GOV_CERT_BASE64 environment variable not set")
         sys.exit(1)
-    
+    password = os.environ.get("GOV_CERT_PASSWORD")
+
     try:
         cert_content = base64.b64decode(cert_b64)
-        
-        # Create a temp file for the certificate
-        # We use delete=False so we can close it and let requests use the path, 
-        # then delete it manually
-        tf = tempfile.NamedTemporaryFile(delete=False, suffix='.pfx')
-        tf.write(cert_content)
-        tf.flush()
-        tf.close()
-        return tf.name
+        if b"-----BEGIN" in cert_content:
+            return cert_content
+
+        private_key, certificate, additional_certificates = pkcs12.load_key_and_certificates(
+            cert_content, password.encode() if password else None
+        )
+        if private_key is None or certificate is None:
+            raise ValueError("PKCS#12 bundle has no private key or certificate")
+        pem = private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        pem += certificate.public_bytes(serialization.Encoding.PEM)
+        for cert in additional_certificates or []:
+            pem += cert.public_bytes(serialization.Encoding.PEM)
+        return pem
     except Exception as e:
-        logger.error(f"Failed to decode/write certificate: {e}")
+        logger.error(f"Failed to decode certificate: {e}")
         sys.exit(1)
 
-def fetch_data(url: str, cert_path: str, cert_pass: str = None):
+def load_cert_chain_in_memory(context: ssl.SSLContext, pem: bytes, password: Optional[str] = None) -> None:
     """
-    Fetches data from the API using mTLS.
-    Retries included in logic if needed, but requests doesn't retry by default.
-    """
-    # If using PFX with requests, we might need simple-pfx or convert to pem.
-    # Requests native support for PFX is limited/dependent on libs.
-    # Ideally, the user provides a PEM file (cert + key) in the env var for python requests.
-    # However, if it is PFX, we might need a separate step.
-    # For now, assuming the content in GOV_CERT_BASE64 is a PEM file which includes Private Key.
-    # If it is a PFX, we would need to convert it using OpenSSL or python libs like cryptography/pkcs12.
-    # Given requirements said "cert extracted from env base64", and "requests configured with certificate",
-    # passing the file path to 'cert' param in requests usually works for PEM.
-    
-    # NOTE: user mentioned .pfx or .pem. PFX directly in requests is not standard. 
-    # We will assume it is a PEM file containing both cert and key, or user has converted it.
-    # If strictly PFX is needed, we'd need code to convert.
-    # Let's try to assume PEM for simplicity as it's standard for python requests `cert` param if combined.
-    
+    SSLContext.load_cert_chain only takes a path. On Linux the bundle is
+    handed over through an anonymous memfd, so the key never touches disk;
+    elsewhere a private temp file is used and removed right after loading.
+    """
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("gov-client-cert", os.MFD_CLOEXEC)
+        try:
+            os.write(fd, pem)
+            context.load_cert_chain(f"/proc/self/fd/{fd}", password=password)
+            return
+        except FileNotFoundError:
+            pass  # /proc not mounted, use the temp file below
+        finally:
+            os.close(fd)
+
+    fd, path = tempfile.mkstemp(suffix=".pem")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        context.load_cert_chain(path, password=password)
+    finally:
+        os.unlink(path)
+
+def create_ssl_context(pem: Optional[bytes]) -> ssl.SSLContext:
+    """
+    Builds the one TLS context shared by every pooled connection: the client
+    identity is parsed once per process instead of once per connection.
+    """
+    context = ssl.create_default_context(cafile=DEFAULT_CA_BUNDLE_PATH)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    if pem:
+        load_cert_chain_in_memory(context, pem, os.environ.get("GOV_CERT_PASSWORD"))
+    return context
+
+class SSLContextAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools all use a prebuilt SSLContext."""
+
+    def __init__(self, ssl_context: ssl.SSLContext, **kwargs):
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self.ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs["ssl_context"] = self.ssl_context
+        return super().proxy_manager_for(*args, **kwargs)
+
+def create_session(ssl_context: ssl.SSLContext, pool_size: int) -> requests.Session:
+    """
+    Creates a single requests session shared by all fetches, so the mTLS
+    handshake is paid once per pooled connection instead of once per request.
+    """
+    session = requests.Session()
+    adapter = SSLContextAdapter(ssl_context, pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
     try:
-        logger.info(f"Fetching from {url}...")
-        # Verify=True is default. cert=path_to_pem_file (with key)
-        response = requests.get(url, cert=cert_path, timeout=60) 
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching {url}: {e}")
+        return (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+    except (TypeError, ValueError):
         return None
 
-def main():
-    logger.info("Starting Tax Gov ETL process")
-    
-    supabase = get_supabase_client()
-    cert_path = get_cert_path()
-    
-    # Passphrase for the key if encrypted (optional, depends on how PEM was generated)
-    # Requests doesn't accept password for PEM file directly in `cert` param easily if key is encrypted?
-    # Actually, if the key is unencrypted in the PEM, no password needed.
-    # If PFX, we definitely need conversion. 
-    # We'll assume the provided base64 is a PEM file with unencrypted private key for simplicity in this V1.
-    # The User Prompt says: "Tenho um certificado A1 (arquivo .pfx ou .pem)".
-    
+def check_response(response: requests.Response) -> None:
+    """Raises RetryableError for transient statuses and HTTPError for the rest."""
+    if response.status_code in RETRYABLE_STATUS:
+        raise RetryableError(
+            f"HTTP {response.status_code} from {response.url}",
+            parse_retry_after(response.headers.get("Retry-After")),
+        )
+    response.raise_for_status()
+
+def conditional_headers(validators: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """If-None-Match / If-Modified-Since from the validators of the last loaded response."""
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+def response_validators(headers) -> Optional[Dict[str, str]]:
+    validators = {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+    }
+    return {k: v for k, v in validators.items() if v} or None
+
+def fetch_data(session: requests.Session, url: str, headers: Optional[Dict[str, str]] = None):
+    """
+    Fetches data from the API using mTLS.
+    Returns (data, bytes_received, validators), with data set to NOT_MODIFIED
+    on a 304; errors propagate so the caller can retry.
+    """
+    logger.info(f"Fetching from {url}...")
+    # The client certificate lives in the session's SSLContext (see create_ssl_context)
+    response = session.get(url, timeout=REQUEST_TIMEOUT, headers=headers)
+    if response.status_code == 304:
+        return NOT_MODIFIED, 0, response_validators(response.headers)
+    check_response(response)
+    body = response.content
+    return json.loads(body), len(body), response_validators(response.headers)
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Incrementally parses a top-level JSON array, yielding each element as soon
+    as it is complete. Only the unparsed tail of the body is kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    started = False
+    finished = False
+    # What may come next inside the array: "first" (element or "]"), "element", "separator"
+    expected = "first"
+
+    def skip_ws(text: str, index: int) -> int:
+        while index < len(text) and text[index] in " \t\r\n":
+            index += 1
+        return index
+
+    def consume(final: bool) -> Iterator[Any]:
+        nonlocal pos, started, finished, expected
+        while not finished:
+            pos = skip_ws(buffer, pos)
+            if pos >= len(buffer):
+                return
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Streaming mode expects a top-level JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                if expected == "element":
+                    raise ValueError("Trailing comma in JSON array")
+                finished = True
+                pos += 1
+                return
+            if buffer[pos] == ",":
+                if expected != "separator":
+                    raise ValueError("Unexpected comma in JSON array")
+                expected = "element"
+                pos += 1
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                return
+            # An element is only accepted once its delimiter has arrived, so a
+            # number split across two chunks is never decoded half-way.
+            delimiter = skip_ws(buffer, end)
+            if delimiter >= len(buffer) or buffer[delimiter] not in ",]":
+                if not final:
+                    return
+                if delimiter >= len(buffer):
+                    raise ValueError("Truncated JSON array in response body")
+                raise ValueError(f"Unexpected data after array element: {buffer[delimiter:delimiter + 20]!r}")
+            pos = end
+            expected = "separator"
+            yield item
+
+    def reject_trailing_data() -> None:
+        # Only whitespace may follow the closing "]"; nothing after it is kept
+        nonlocal buffer, pos
+        if skip_ws(buffer, pos) < len(buffer):
+            raise ValueError("Unexpected data after JSON array")
+        buffer, pos = "", 0
+
+    for chunk in chunks:
+        buffer += utf8.decode(chunk)
+        yield from consume(final=False)
+        buffer, pos = buffer[pos:], 0
+        if finished:
+            reject_trailing_data()
+
+    buffer += utf8.decode(b"", final=True)
+    yield from consume(final=True)
+    if not finished:
+        raise ValueError("Truncated JSON array in response body")
+    reject_trailing_data()
+
+
+def fetch_stream(session: requests.Session, url: str, headers: Optional[Dict[str, str]] = None):
+    """
+    Streaming variant of fetch_data: array items are parsed as the body
+    arrives and spooled to disk instead of being held in memory.
+    Returns (spool, bytes_received, validators).
+    """
+    spool = PayloadSpool()
+    received = 0
+
+    def counted(chunks):
+        nonlocal received
+        for chunk in chunks:
+            received += len(chunk)
+            yield chunk
+
     try:
-        for endpoint in ENDPOINTS:
-            url = f"{API_BASE_URL}/{endpoint}"
-            data = fetch_data(url, cert_path)
-            
-            if data:
-                logger.info(f"Successfully fetched data from {endpoint}. Uploading to Supabase...")
-                
-                payload = {
-                    "source_api": endpoint,
-                    "payload_json": data,
-                    # fetched_at is default now() in DB, but we can send it if we want
-                }
-                
-                try:
-                    supabase.table("raw_gov_tax_data").insert(payload).execute()
-                    logger.info(f"Successfully inserted data for {endpoint}")
-                except Exception as db_err:
-                    logger.error(f"Database error for {endpoint}: {db_err}")
+        logger.info(f"Streaming from {url}...")
+        with session.get(url, timeout=REQUEST_TIMEOUT, stream=True, headers=headers) as response:
+            if response.status_code == 304:
+                spool.close()
+                return NOT_MODIFIED, 0, response_validators(response.headers)
+            check_response(response)
+            for item in iter_json_array(counted(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))):
+                spool.append(item)
+            return spool, received, response_validators(response.headers)
+    except BaseException:
+        spool.close()
+        raise
+
+@dataclass
+class FetchContext:
+    """Everything a fetch needs besides the endpoint name, shared by all workers."""
+    session: requests.Session
+    limiter: EndpointLimiter
+    policy: RetryPolicy
+    breaker: CircuitBreaker
+    metrics: EndpointMetrics
+    stream: bool = False
+    base_url: str = API_BASE_URL
+    # endpoint -> ETag/Last-Modified of the last response that was loaded;
+    # None disables conditional requests (one-shot runs)
+    validators: Optional[Dict[str, Dict[str, str]]] = None
+    stop: threading.Event = field(default_factory=threading.Event)
+
+def fetch_endpoint(ctx: FetchContext, endpoint: str) -> FetchResult:
+    """
+    Fetches one endpoint with retries. Transient errors (timeouts, connection
+    resets, 429/5xx) are retried with backoff; other HTTP errors and invalid
+    JSON fail immediately. The circuit breaker can cut the attempts short.
+    """
+    url = f"{ctx.base_url.rstrip('/')}/{endpoint}"
+    headers = conditional_headers(ctx.validators.get(endpoint)) if ctx.validators is not None else None
+    total_latency = 0.0
+    last_error = None
+
+    for attempt in range(1, ctx.policy.max_attempts + 1):
+        if not ctx.breaker.allow(endpoint):
+            last_error = last_error or "circuit open"
+            logger.warning(f"Skipping {endpoint}: circuit open")
+            break
+
+        retry_after = None
+        retryable = False
+        with ctx.limiter.get(endpoint):
+            started = time.perf_counter()
+            try:
+                if ctx.stream:
+                    body, nbytes, validators = fetch_stream(ctx.session, url, headers)
+                else:
+                    body, nbytes, validators = fetch_data(ctx.session, url, headers)
+            except RetryableError as e:
+                last_error, retry_after, retryable = str(e), e.retry_after, True
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                last_error, retryable = f"{type(e).__name__}: {e}", True
+            except (requests.exceptions.RequestException, ValueError) as e:
+                last_error = f"{type(e).__name__}: {e}"
             else:
+                latency = time.perf_counter() - started
+                total_latency += latency
+                ctx.metrics.record_attempt(endpoint, latency, nbytes)
+                ctx.breaker.record_success(endpoint)
+                if body is NOT_MODIFIED:
+                    logger.info(f"{endpoint} not modified since last load ({latency:.2f}s)")
+                    return FetchResult(endpoint=endpoint, data=None, latency=total_latency,
+                                       not_modified=True, validators=validators)
+                logger.info(f"Fetched {endpoint} in {latency:.2f}s ({nbytes} bytes, attempt {attempt})")
+                if ctx.stream:
+                    return FetchResult(endpoint=endpoint, data=None, latency=total_latency,
+                                       spool=body, validators=validators)
+                return FetchResult(endpoint=endpoint, data=body, latency=total_latency, validators=validators)
+            latency = time.perf_counter() - started
+
+        total_latency += latency
+        ctx.metrics.record_attempt(endpoint, latency, error=last_error)
+        ctx.breaker.record_failure(endpoint)
+        logger.error(f"Error fetching {url} (attempt {attempt}/{ctx.policy.max_attempts}): {last_error}")
+
+        if not retryable or attempt == ctx.policy.max_attempts or ctx.breaker.state(endpoint) == "open":
+            break
+        delay = ctx.policy.delay(attempt, retry_after)
+        logger.info(f"Retrying {endpoint} in {delay:.1f}s")
+        if ctx.stop.wait(delay):
+            break
+
+    return FetchResult(endpoint=endpoint, data=None, latency=total_latency, error=last_error)
+
+def iter_fetches(ctx: FetchContext, endpoints, sequential: bool, max_workers: int):
+    """
+    Yields a FetchResult per endpoint as soon as it is available.
+    In concurrent mode all endpoints are requested at the same time.
+    """
+    if sequential:
+        for endpoint in endpoints:
+            yield fetch_endpoint(ctx, endpoint)
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(fetch_endpoint, ctx, endpoint) for endpoint in endpoints]
+        for future in as_completed(futures):
+            yield future.result()
+
+def get_last_payload_hash(supabase: Client, endpoint: str) -> Optional[str]:
+    """Returns the hash of the most recent stored snapshot for a source_api."""
+    response = (
+        supabase.table("raw_gov_tax_data")
+        .select("payload_hash")
+        .eq("source_api", endpoint)
+        .order("fetched_at", desc=True)
+        .limit(1)
+        .execute()
+    )
+    if response.data:
+        return response.data[0].get("payload_hash")
+    return None
+
+def load_payload(supabase: Client, endpoint: str, data, stats: LoadStats, force: bool = False) -> Optional[bool]:
+    """
+    Inserts the payload into the Bronze Layer unless it is identical to the
+    last stored snapshot. Returns True when a new row was written, False when
+    the payload was unchanged and None when the insert failed.
+    """
+    encoded = canonical_json(data)
+    digest = payload_hash(encoded)
+    rows = len(data) if isinstance(data, list) else 1
+
+    try:
+        if not force and get_last_payload_hash(supabase, endpoint) == digest:
+            logger.info(f"Payload for {endpoint} unchanged (sha256 {digest[:12]}), skipping insert")
+            stats.add(False, len(encoded), rows)
+            return False
+    except Exception as db_err:
+        # Without the previous hash we cannot prove nothing changed, so insert anyway
+        logger.warning(f"Could not read last payload hash for {endpoint}: {db_err}")
+
+    logger.info(f"Successfully fetched data from {endpoint}. Uploading to Supabase...")
+
+    payload = {
+        "source_api": endpoint,
+        "payload_json": data,
+        "payload_hash": digest,
+        # fetched_at is default now() in DB, but we can send it if we want
+    }
+
+    try:
+        supabase.table("raw_gov_tax_data").insert(payload).execute()
+        logger.info(f"Successfully inserted data for {endpoint}")
+        stats.add(True, len(encoded), rows)
+        return True
+    except Exception as db_err:
+        logger.error(f"Database error for {endpoint}: {db_err}")
+        return None
+
+def load_spooled_payload(supabase: Client, endpoint: str, spool: PayloadSpool, stats: LoadStats,
+                         max_bytes: int, max_rows: int, force: bool = False) -> Optional[bool]:
+    """
+    Chunked counterpart of load_payload: the snapshot is written as several
+    Bronze rows sharing one batch_id and fetched_at, each holding a slice of
+    the array small enough to stay under PostgREST request-size limits.
+    """
+    digest = spool.digest
+
+    try:
+        if not force and get_last_payload_hash(supabase, endpoint) == digest:
+            logger.info(f"Payload for {endpoint} unchanged (sha256 {digest[:12]}), skipping insert")
+            stats.add(False, spool.nbytes, spool.count)
+            return False
+    except Exception as db_err:
+        logger.warning(f"Could not read last payload hash for {endpoint}: {db_err}")
+
+    batch_id = str(uuid.uuid4())
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    logger.info(f"Uploading {spool.count} items from {endpoint} in chunks (batch {batch_id})...")
+
+    try:
+        for chunk_index, items in enumerate(spool.iter_batches(max_bytes, max_rows)):
+            supabase.table("raw_gov_tax_data").insert({
+                "source_api": endpoint,
+                "payload_json": items,
+                "payload_hash": digest,
+                "batch_id": batch_id,
+                "chunk_index": chunk_index,
+                "fetched_at": fetched_at,
+            }).execute()
+        logger.info(f"Successfully inserted data for {endpoint} ({chunk_index + 1} chunks)")
+        stats.add(True, spool.nbytes, spool.count)
+        return True
+    except Exception as db_err:
+        logger.error(f"Database error for {endpoint}: {db_err}")
+        # A partial snapshot would carry the new hash and hide the missing
+        # chunks from the next run, so roll the whole batch back.
+        try:
+            supabase.table("raw_gov_tax_data").delete().eq("batch_id", batch_id).execute()
+        except Exception as cleanup_err:
+            logger.error(f"Failed to remove partial batch {batch_id}: {cleanup_err}")
+        return None
+
+def fetch_staging_index(supabase: Client, spec: StagingSpec) -> Dict[tuple, tuple]:
+    """Maps natural key -> (id, row_hash) for every row currently staged."""
+    columns = ",".join(("id", "row_hash") + spec.key_columns)
+    index = {}
+    start = 0
+    while True:
+        response = (
+            supabase.table(spec.table)
+            .select(columns)
+            .order("id")
+            .range(start, start + STAGING_PAGE_SIZE - 1)
+            .execute()
+        )
+        for row in response.data:
+            index[spec.db_key(row)] = (row["id"], row.get("row_hash"))
+        if len(response.data) < STAGING_PAGE_SIZE:
+            return index
+        start += STAGING_PAGE_SIZE
+
+def sync_staging_table(supabase: Client, spec: StagingSpec, items: Iterable[Any]) -> Dict[str, int]:
+    """
+    Reconciles a typed staging table with the items of the latest snapshot:
+    new and changed rows are upserted on the natural key, rows that vanished
+    from the snapshot are deleted and identical rows are left untouched.
+    """
+    latest = {}
+    for row in spec.rows(items):
+        # Duplicated keys inside one payload: the last occurrence wins, as a
+        # single upsert statement cannot touch the same row twice.
+        latest[spec.key(row)] = row
+
+    existing = fetch_staging_index(supabase, spec)
+    synced_at = datetime.now(timezone.utc).isoformat()
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    pending = []
+
+    for key, row in latest.items():
+        digest = row_hash(row)
+        current = existing.pop(key, None)
+        if current and current[1] == digest:
+            counts["unchanged"] += 1
+            continue
+        counts["updated" if current else "inserted"] += 1
+        pending.append({**row, "row_hash": digest, "updated_at": synced_at})
+
+    on_conflict = ",".join(spec.key_columns)
+    for start in range(0, len(pending), STAGING_PAGE_SIZE):
+        supabase.table(spec.table).upsert(pending[start:start + STAGING_PAGE_SIZE], on_conflict=on_conflict).execute()
+
+    stale_ids = [row_id for row_id, _ in existing.values()]
+    for start in range(0, len(stale_ids), STAGING_PAGE_SIZE):
+        supabase.table(spec.table).delete().in_("id", stale_ids[start:start + STAGING_PAGE_SIZE]).execute()
+    counts["deleted"] = len(stale_ids)
+
+    logger.info(
+        f"Staging {spec.table}: {counts['inserted']} inserted, {counts['updated']} updated, "
+        f"{counts['deleted']} deleted, {counts['unchanged']} unchanged"
+    )
+    return counts
+
+def sync_staging(supabase: Client, endpoint: str, items: Iterable[Any]) -> None:
+    spec = STAGING_SPECS.get(endpoint)
+    if not spec:
+        return
+    try:
+        sync_staging_table(supabase, spec, items)
+    except Exception as db_err:
+        logger.error(f"Failed to sync staging table {spec.table}: {db_err}")
+
+def process_result(supabase: Client, ctx: FetchContext, result: FetchResult, args,
+                   stats: LoadStats) -> str:
+    """
+    Loads one fetched endpoint into Bronze (and staging) and returns its outcome:
+    inserted, unchanged, not_modified, empty, fetch_failed, circuit_open or load_failed.
+    """
+    endpoint = result.endpoint
+    loaded = None
+    if result.not_modified:
+        outcome = "not_modified"
+    elif result.spool is not None:
+        try:
+            if not result.spool.count:
                 logger.warning(f"No data fetched for {endpoint}")
-                
+                outcome = "empty"
+            else:
+                loaded = load_spooled_payload(supabase, endpoint, result.spool, stats,
+                                              args.batch_bytes, args.batch_rows, args.force)
+                if loaded and not args.skip_staging:
+                    sync_staging(supabase, endpoint, result.spool.iter_items())
+                outcome = {True: "inserted", False: "unchanged", None: "load_failed"}[loaded]
+        finally:
+            result.spool.close()
+    elif result.data:
+        loaded = load_payload(supabase, endpoint, result.data, stats, args.force)
+        if loaded and not args.skip_staging:
+            sync_staging(supabase, endpoint, result.data)
+        outcome = {True: "inserted", False: "unchanged", None: "load_failed"}[loaded]
+    elif result.error:
+        logger.warning(f"No data fetched for {endpoint}: {result.error}")
+        outcome = "circuit_open" if ctx.breaker.state(endpoint) == "open" else "fetch_failed"
+    else:
+        logger.warning(f"No data fetched for {endpoint}")
+        outcome = "empty"
+
+    # Validators are only remembered once the body they describe is stored,
+    # otherwise a failed load would be masked by 304s on the next polls.
+    if ctx.validators is not None and outcome in ("inserted", "unchanged") and result.validators:
+        ctx.validators[endpoint] = result.validators
+    ctx.metrics.set_outcome(endpoint, outcome)
+    return outcome
+
+def parse_schedule(spec: str, default: float) -> Dict[str, float]:
+    """Parses "classTrib=600,anexos=3600" into per-endpoint poll intervals."""
+    intervals = {endpoint: default for endpoint in ENDPOINTS}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        endpoint, sep, seconds = part.partition("=")
+        if not sep or endpoint not in intervals:
+            raise ValueError(f"Invalid schedule entry {part!r} (expected <endpoint>=<seconds>)")
+        intervals[endpoint] = float(seconds)
+    return intervals
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch government tax data (CFF/SVRS) into Supabase")
+    parser.add_argument("--sequential", action="store_true",
+                        help="fetch endpoints one after another instead of concurrently")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="size of the fetch thread pool (default: %(default)s)")
+    parser.add_argument("--endpoint-concurrency", type=int, default=DEFAULT_ENDPOINT_CONCURRENCY,
+                        help="max in-flight requests per endpoint (default: %(default)s)")
+    parser.add_argument("--force", action="store_true",
+                        help="insert payloads even when they match the last stored hash")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse responses incrementally and load them in bounded chunks")
+    parser.add_argument("--batch-bytes", type=int, default=DEFAULT_BATCH_BYTES,
+                        help="max canonical JSON bytes per chunk in --stream mode (default: %(default)s)")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS,
+                        help="max items per chunk in --stream mode (default: %(default)s)")
+    parser.add_argument("--skip-staging", action="store_true",
+                        help="only load the Bronze Layer, leave the typed staging tables alone")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="attempts per endpoint, including the first one (default: %(default)s)")
+    parser.add_argument("--backoff-base", type=float, default=DEFAULT_BACKOFF_BASE,
+                        help="base delay in seconds for exponential backoff (default: %(default)s)")
+    parser.add_argument("--backoff-max", type=float, default=DEFAULT_BACKOFF_MAX,
+                        help="cap for a single retry delay, Retry-After included (default: %(default)s)")
+    parser.add_argument("--breaker-threshold", type=int, default=DEFAULT_BREAKER_THRESHOLD,
+                        help="consecutive failures that open an endpoint's circuit (default: %(default)s)")
+    parser.add_argument("--summary", default=os.environ.get("ETL_SUMMARY_PATH"),
+                        help="write a JSON run summary (per-endpoint health) to this path")
+    parser.add_argument("--base-url", default=os.environ.get("GOV_API_BASE_URL", API_BASE_URL),
+                        help="API root, e.g. http://127.0.0.1:8000 for scripts/gov_api_stub.py")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and poll each endpoint on its schedule (conditional GETs)")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="default seconds between polls of an endpoint in --daemon mode (default: %(default)s)")
+    parser.add_argument("--schedule", default=DEFAULT_POLL_SCHEDULE,
+                        help="per-endpoint poll intervals, e.g. classTrib=600,anexos=3600")
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="write to a local SQLite file instead of Supabase (offline replay)")
+    args = parser.parse_args(argv)
+    try:
+        parse_schedule(args.schedule, args.poll_interval)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def write_summary(path: str, summary: Dict[str, Any]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    logger.info(f"Run summary written to {path}")
+
+def build_summary(ctx: FetchContext, stats: LoadStats, changed: List[str], wall_clock: float,
+                  args, **extra) -> Dict[str, Any]:
+    summary = {
+        "started_at": datetime.fromtimestamp(time.time() - wall_clock, timezone.utc).isoformat(),
+        "wall_clock_s": wall_clock,
+        "mode": "sequential" if args.sequential else "concurrent",
+        "stream": args.stream,
+        "changed_sources": changed,
+        "dedup": {"inserted": stats.inserted, "skipped": stats.skipped},
+        "endpoints": ctx.metrics.summary(ctx.breaker),
+    }
+    summary.update(extra)
+    return summary
+
+def run_once(supabase: Client, ctx: FetchContext, args, stats: LoadStats) -> List[str]:
+    """Fetches every endpoint once; returns the sources that got a new snapshot."""
+    latencies = {}
+    changed = []
+    run_started = time.perf_counter()
+
+    # Database writes stay on the main thread; only the HTTP calls run in the pool.
+    for result in iter_fetches(ctx, ENDPOINTS, args.sequential, args.max_workers):
+        latencies[result.endpoint] = result.latency
+        if process_result(supabase, ctx, result, args, stats) == "inserted":
+            changed.append(result.endpoint)
+
+    wall_clock = time.perf_counter() - run_started
+    per_endpoint = ", ".join(f"{name}={secs:.2f}s" for name, secs in latencies.items())
+    logger.info(
+        f"Fetch latency per endpoint: {per_endpoint} | "
+        f"sum={sum(latencies.values()):.2f}s wall_clock={wall_clock:.2f}s "
+        f"mode={'sequential' if args.sequential else 'concurrent'}"
+    )
+
+    logger.info(f"Changed sources: {', '.join(changed) or 'none'}")
+    logger.info(f"Dedup stats: {stats.summary()}")
+
+    summary = build_summary(ctx, stats, changed, wall_clock, args)
+    for name, health in summary["endpoints"].items():
+        logger.info(f"Health {name}: outcome={health['outcome']} attempts={health['attempts']} "
+                    f"bytes={health['bytes_received']} p90={health['latency_s']['p90']}")
+    if args.summary:
+        write_summary(args.summary, summary)
+    return changed
+
+def run_daemon(supabase: Client, ctx: FetchContext, args, stats: LoadStats) -> None:
+    """
+    Polls each endpoint on its own interval with the same warm session and
+    Supabase client, until SIGTERM/SIGINT. Polls send the validators of the
+    last loaded response, so an unchanged source costs a 304; servers that
+    ignore them fall back to the payload-hash comparison in load_payload.
+    """
+    intervals = parse_schedule(args.schedule, args.poll_interval)
+    next_due = {endpoint: time.monotonic() for endpoint in ENDPOINTS}
+    changed = []
+    polls = 0
+    started = time.perf_counter()
+
+    def request_stop(signum, frame):
+        logger.info(f"Received signal {signum}, stopping after the current poll")
+        ctx.stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    logger.info("Daemon mode: " + ", ".join(f"{name} every {secs:.0f}s" for name, secs in intervals.items()))
+
+    while not ctx.stop.is_set():
+        now = time.monotonic()
+        due = [endpoint for endpoint, at in next_due.items() if at <= now]
+        if not due:
+            ctx.stop.wait(min(next_due.values()) - now)
+            continue
+
+        for result in iter_fetches(ctx, due, args.sequential, args.max_workers):
+            outcome = process_result(supabase, ctx, result, args, stats)
+            next_due[result.endpoint] = time.monotonic() + intervals[result.endpoint]
+            polls += 1
+            if outcome == "inserted":
+                changed.append(result.endpoint)
+            logger.info(f"Poll {result.endpoint}: {outcome} in {result.latency:.2f}s, "
+                        f"next in {intervals[result.endpoint]:.0f}s")
+
+        if args.summary:
+            write_summary(args.summary, build_summary(
+                ctx, stats, changed, time.perf_counter() - started, args, daemon=True, polls=polls))
+
+    logger.info(f"Daemon stopped after {polls} polls. Dedup stats: {stats.summary()}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.info("Starting Tax Gov ETL process")
+
+    supabase = SqliteClient(args.sqlite) if args.sqlite else get_supabase_client()
+    # The local stub (scripts/gov_api_stub.py) is plain HTTP and needs no certificate
+    needs_cert = args.base_url.startswith("https://") or os.environ.get("GOV_CERT_BASE64")
+    started = time.perf_counter()
+    ssl_context = create_ssl_context(get_client_pem() if needs_cert else None)
+    logger.info(f"TLS context ready in {time.perf_counter() - started:.3f}s")
+
+    pool_size = len(ENDPOINTS) * max(1, args.endpoint_concurrency)
+    session = create_session(ssl_context, pool_size)
+    ctx = FetchContext(
+        session=session,
+        limiter=EndpointLimiter(args.endpoint_concurrency),
+        policy=RetryPolicy(args.max_attempts, args.backoff_base, args.backoff_max),
+        breaker=CircuitBreaker(args.breaker_threshold),
+        metrics=EndpointMetrics(),
+        stream=args.stream,
+        base_url=args.base_url,
+        validators={} if args.daemon else None,
+    )
+    stats = LoadStats()
+
+    try:
+        if args.daemon:
+            run_daemon(supabase, ctx, args, stats)
+        else:
+            run_once(supabase, ctx, args, stats)
     finally:
-        # Cleanup temp file
-        if os.path.exists(cert_path):
-            os.unlink(cert_path)
-            logger.info("Cleaned up temporary certificate file")
+        session.close()
 
 if __name__ == "__main__":
     main()
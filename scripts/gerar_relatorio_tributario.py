@@ -4,12 +4,39 @@
 Gerador de Relatorio de Planejamento Tributario
 Modelo profissional para analise de impacto da Reforma Tributaria (IBS/CBS)
 
+Os resultados por regime vem do motor de calculo (scripts/motor_regimes.py),
+a partir dos dados da empresa.
+
 Execute: python scripts/gerar_relatorio_tributario.py
+Lote (varias empresas): python scripts/gerar_relatorios_lote.py perfis.ndjson
+Servico HTTP local: python scripts/servico_relatorios.py
 """
 
 from fpdf import FPDF
 from datetime import datetime
 import os
+import re
+import time
+import warnings
+
+from calculo_relatorio import calcular_resultados
+
+# A copia de blocos fixos mexe em internos do fpdf2 (estado grafico, conteudo das
+# paginas, catalogo de recursos); so e usada nas versoes testadas. Fora delas,
+# ou se um interno faltar, as secoes sao desenhadas normalmente.
+VERSOES_FPDF_TESTADAS = ((2, 8), (2, 9))  # [minima, limite)
+INTERNOS_FPDF = ("_get_current_graphics_state", "_push_local_stack", "_pop_local_stack")
+ERROS_INTERNOS = (AttributeError, KeyError, TypeError)
+
+try:
+    from fpdf import FPDF_VERSION
+    from fpdf.enums import PDFResourceType
+    VERSAO_FPDF = tuple(int(parte) for parte in re.findall(r"\d+", FPDF_VERSION)[:2])
+    REPRODUCAO_SUPORTADA = (VERSOES_FPDF_TESTADAS[0] <= VERSAO_FPDF < VERSOES_FPDF_TESTADAS[1]
+                            and all(hasattr(FPDF, nome) for nome in INTERNOS_FPDF))
+except ImportError:
+    PDFResourceType = None
+    REPRODUCAO_SUPORTADA = False
 
 # ============================================================================
 # DADOS DA EMPRESA (MODELO - SUBSTITUA PELOS DADOS REAIS)
@@ -54,40 +81,58 @@ DADOS_EMPRESA = {
     "numero_funcionarios": 28,
 }
 
-# Resultados do calculo (valores modelo)
-RESULTADOS = {
-    "simples": {
-        "elegivel": False,
-        "motivo": "Faturamento acima do sublimite de R$ 3,6M",
-        "imposto_anual": None,
-        "carga_efetiva": None,
-    },
-    "presumido": {
-        "elegivel": True,
-        "imposto_anual": 381276.00,
-        "carga_efetiva": 9.08,
-        "creditos": 0,
-    },
-    "real": {
-        "elegivel": True,
-        "imposto_anual": 298450.00,
-        "carga_efetiva": 7.11,
-        "creditos": 156780.00,
-    },
-    "reforma_2027": {
-        "imposto_anual": 285600.00,
-        "carga_efetiva": 6.80,
-        "creditos": 172340.00,
-    },
-    "reforma_2033": {
-        "imposto_anual": 248900.00,
-        "carga_efetiva": 5.93,
-        "creditos": 215640.00,
-    },
-    "melhor_atual": "Lucro Real",
-    "economia_atual": 82826.00,  # L. Presumido - L. Real
-    "economia_reforma": 132376.00,  # L. Presumido - Reforma 2033
-}
+# ============================================================================
+# BLOCOS FIXOS (secoes iguais para qualquer empresa)
+# ============================================================================
+
+class BlocoFixo:
+    """Conteudo ja diagramado de um bloco fixo, pagina a pagina, sem os rodapes"""
+
+    def __init__(self, paginas, quebras, estado_final):
+        self.paginas = paginas            # [(bytes do conteudo, fontes usadas na pagina)]
+        self.quebras = quebras            # estado do pdf antes de cada quebra de pagina
+        self.estado_final = estado_final
+
+
+class GravacaoBloco:
+    """Copia o que um bloco fixo escreve em cada pagina enquanto ele e desenhado"""
+
+    def __init__(self, pdf):
+        self.paginas = []
+        self.quebras = []
+        self.abrir_pagina(pdf)
+
+    def abrir_pagina(self, pdf):
+        self.pagina = pdf.page
+        self.inicio = len(pdf.pages[pdf.page].contents)
+
+    def fechar_pagina(self, pdf):
+        conteudo = bytes(pdf.pages[self.pagina].contents[self.inicio:])
+        fontes = set(pdf._resource_catalog.resources_per_page[(self.pagina, PDFResourceType.FONT)])
+        self.paginas.append((conteudo, fontes))
+
+    def quebra_pagina(self, pdf):
+        # Chamado antes do rodape: o rodape (numero da pagina, data) fica fora do bloco
+        self.fechar_pagina(pdf)
+        self.quebras.append(estado_pdf(pdf))
+
+    def encerrar(self, pdf):
+        self.fechar_pagina(pdf)
+        return BlocoFixo(self.paginas, self.quebras, estado_pdf(pdf))
+
+
+def estado_pdf(pdf):
+    return pdf._get_current_graphics_state(), pdf.x, pdf.y
+
+
+def aplicar_estado(pdf, estado):
+    grafico, pdf.x, pdf.y = estado
+    pdf._pop_local_stack()
+    pdf._push_local_stack(grafico.copy())
+
+
+def chave_fontes(pdf):
+    return tuple((chave, fonte.i) for chave, fonte in pdf.fonts.items())
 
 
 # ============================================================================
@@ -95,10 +140,111 @@ RESULTADOS = {
 # ============================================================================
 
 class RelatorioPlanejamentoTributario(FPDF):
-    def __init__(self):
+    def __init__(self, cache_blocos=None):
         super().__init__()
+        # chave do bloco fixo -> BlocoFixo; compartilhado entre os relatorios de um lote
+        self.cache_blocos = cache_blocos if REPRODUCAO_SUPORTADA else None
+        self.blocos_reutilizados = 0
+        self._gravacao = None
         self.add_page()
         self.set_auto_page_break(auto=True, margin=25)
+        if self.cache_blocos is not None and not self._internos_compativeis():
+            self._desativar_cache("internos do fpdf2 diferentes dos esperados")
+        
+    def _internos_compativeis(self):
+        """Confere, antes de copiar qualquer coisa, os internos usados pela gravacao"""
+        try:
+            estado_pdf(self)[0].copy()
+            self._resource_catalog.resources_per_page[(self.page, PDFResourceType.FONT)]
+            return isinstance(self.pages[self.page].contents, bytearray)
+        except ERROS_INTERNOS:
+            return False
+        
+    def _desativar_cache(self, motivo):
+        warnings.warn(f"Copia de blocos fixos desativada ({motivo}); as secoes serao desenhadas normalmente")
+        self.cache_blocos = None
+        self._gravacao = None
+        
+    def add_page(self, *args, **kwargs):
+        gravacao = self._gravacao
+        if gravacao is not None:
+            try:
+                gravacao.quebra_pagina(self)
+            except ERROS_INTERNOS as e:
+                self._desativar_cache(f"{type(e).__name__}: {e}")
+                gravacao = None
+        super().add_page(*args, **kwargs)
+        if gravacao is not None:
+            try:
+                gravacao.abrir_pagina(self)
+            except ERROS_INTERNOS as e:
+                self._desativar_cache(f"{type(e).__name__}: {e}")
+        
+    def bloco_fixo(self, nome, desenhar, nova_pagina=True):
+        """
+        Desenha um trecho que nao depende da empresa. A primeira vez o trecho e
+        diagramado normalmente e o conteudo de cada pagina fica gravado no
+        cache; nas seguintes o conteudo gravado e copiado para as paginas e so
+        cabecalhos e rodapes sao gerados de novo.
+        """
+        if nova_pagina:
+            self.add_page()
+        # Estado conhecido no inicio do bloco, para o conteudo gravado valer em qualquer relatorio
+        self.set_font('Helvetica', '', 10)
+        self.current_font_is_set_on_page = False
+        self.set_text_color(0, 0, 0)
+        self.set_draw_color(0, 0, 0)
+        self.set_fill_color(255, 255, 255)
+        if self.cache_blocos is None:
+            desenhar(self)
+            return
+        
+        chave = (nome, round(self.x, 3), round(self.y, 3),
+                 repr(self._get_current_graphics_state()), chave_fontes(self))
+        bloco = self.cache_blocos.get(chave)
+        if bloco is not None:
+            try:
+                self._reproduzir_bloco(bloco)
+            except ERROS_INTERNOS as e:
+                # Os internos foram conferidos em _internos_compativeis e as fontes sao
+                # registradas antes do conteudo, entao a falha vem antes de qualquer copia
+                self._desativar_cache(f"{type(e).__name__}: {e}")
+                desenhar(self)
+                return
+            self.blocos_reutilizados += 1
+            return
+        
+        try:
+            self._gravacao = GravacaoBloco(self)
+        except ERROS_INTERNOS as e:
+            self._desativar_cache(f"{type(e).__name__}: {e}")
+            desenhar(self)
+            return
+        try:
+            desenhar(self)
+            # add_page zera _gravacao se a gravacao falhar no meio do bloco
+            gravacao, bloco = self._gravacao, None
+            if gravacao is not None:
+                try:
+                    bloco = gravacao.encerrar(self)
+                except ERROS_INTERNOS as e:
+                    self._desativar_cache(f"{type(e).__name__}: {e}")
+        finally:
+            self._gravacao = None
+        # Um bloco que registra fonte nova nao pode ser copiado para outro pdf
+        if bloco is not None and self.cache_blocos is not None and chave_fontes(self) == chave[-1]:
+            self.cache_blocos[chave] = bloco
+        
+    def _reproduzir_bloco(self, bloco):
+        for numero, (conteudo, fontes) in enumerate(bloco.paginas):
+            if numero:
+                aplicar_estado(self, bloco.quebras[numero - 1])
+                self.add_page()
+            # Fontes antes do conteudo: se o catalogo falhar, nada foi copiado nesta pagina
+            for fonte in fontes:
+                self._resource_catalog.add(PDFResourceType.FONT, fonte, self.page)
+            self.pages[self.page].contents.extend(conteudo)
+        aplicar_estado(self, bloco.estado_final)
         
     def header(self):
         # Cabecalho com logo/marca
@@ -173,16 +319,16 @@ class RelatorioPlanejamentoTributario(FPDF):
         self.set_text_color(0, 0, 0)
         self.ln(22)
         
-    def tabela_comparativa(self, dados):
-        """Cria tabela comparativa de regimes"""
+    def tabela_comparativa(self, dados, cabecalhos=None, colunas=None):
+        """Cria tabela comparativa (por padrao, de regimes)"""
         self.set_font('Helvetica', 'B', 9)
         
         # Cabecalho
         self.set_fill_color(243, 244, 246)
         self.set_draw_color(200, 200, 200)
         
-        colunas = [45, 30, 35, 30, 40]
-        cabecalhos = ['Regime', 'Elegivel', 'Imposto/Ano', 'Carga %', 'Creditos']
+        colunas = colunas or [45, 30, 35, 30, 40]
+        cabecalhos = cabecalhos or ['Regime', 'Elegivel', 'Imposto/Ano', 'Carga %', 'Creditos']
         
         for i, (cab, larg) in enumerate(zip(cabecalhos, colunas)):
             self.cell(larg, 8, cab, 1, 0, 'C', True)
@@ -212,6 +358,9 @@ class RelatorioPlanejamentoTributario(FPDF):
         self.set_font('Helvetica', '', 9)
         
         altura = self.get_string_width(texto) / 165 * 5 + 12
+        # A caixa nao se divide entre paginas
+        if self.get_y() + max(altura, 12) > self.page_break_trigger:
+            self.add_page()
         y_inicio = self.get_y()
         
         self.rect(15, y_inicio, 180, max(altura, 12), 'DF')
@@ -227,18 +376,43 @@ def formatar_moeda(valor):
     return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
 
-def gerar_relatorio():
-    """Gera o relatorio PDF completo"""
-    
-    pdf = RelatorioPlanejamentoTributario()
-    pdf.alias_nb_pages()
-    
-    dados = DADOS_EMPRESA
-    resultados = RESULTADOS
-    
-    # =========================================================================
-    # 1. SUMARIO EXECUTIVO
-    # =========================================================================
+def totais_despesas(dados):
+    """(total mensal com credito, total mensal sem credito)"""
+    return sum(dados['despesas_com_credito'].values()), sum(dados['despesas_sem_credito'].values())
+
+
+# ============================================================================
+# SECOES DO RELATORIO
+# ============================================================================
+
+def texto_reforma(resultados):
+    """
+    (tipo do alerta, frase) sobre o cenario Reforma 2033*, conforme ele fique
+    acima do regime atual, entre o regime atual e o melhor regime de hoje, ou
+    abaixo de ambos. economia_reforma - economia_atual e a diferenca para o
+    melhor regime atual e pode ser negativa.
+    """
+    economia = resultados['economia_reforma']
+    adicional = economia - resultados['economia_atual']
+    if economia <= 0:
+        return "alerta", (
+            "No cenario Reforma 2033* a carga nao fica abaixo da do regime atual: para este perfil, "
+            "os creditos da nao-cumulatividade plena do IBS/CBS nao compensam a aliquota cheia."
+        )
+    if adicional < 0:
+        return "info", (
+            f"No cenario Reforma 2033* a carga cai {formatar_moeda(economia)}/ano em relacao ao regime "
+            f"atual, mas fica {formatar_moeda(-adicional)}/ano acima do {resultados['melhor_atual']}, "
+            f"hoje o regime de menor carga."
+        )
+    return "sucesso", (
+        f"No cenario Reforma 2033* a nao-cumulatividade plena do IBS/CBS reduz a carga em "
+        f"{formatar_moeda(economia)}/ano em relacao ao regime atual, {formatar_moeda(adicional)}/ano "
+        f"abaixo do {resultados['melhor_atual']}, hoje o regime de menor carga."
+    )
+
+
+def secao_sumario(pdf, dados, resultados):
     pdf.titulo_secao("1. SUMARIO EXECUTIVO")
     
     pdf.paragrafo(
@@ -257,24 +431,28 @@ def gerar_relatorio():
     )
     
     pdf.caixa_destaque(
-        "[>>] ECONOMIA COM REFORMA (2033)",
+        "[>>] ECONOMIA COM REFORMA (2033*)",
         f"{formatar_moeda(resultados['economia_reforma'])}/ano",
         (219, 234, 254), (30, 64, 175)
     )
-    
-    pdf.subtitulo("Recomendacao Principal:")
-    pdf.alerta(
-        f"[OK] Migrar para {resultados['melhor_atual']} pode gerar economia de "
-        f"{formatar_moeda(resultados['economia_atual'])}/ano, com aproveitamento de "
-        f"creditos de PIS/COFINS/ICMS. Com a Reforma Tributaria em 2033, "
-        f"a empresa podera ter carga tributaria ainda menor aproveitando a "
-        f"nao-cumulatividade plena do IBS/CBS.",
-        "sucesso"
+    pdf.paragrafo(
+        "* Em relacao ao regime atual, no cenario 'Reforma 2033*' da secao 3 (IBS/CBS mais "
+        "IRPJ/CSLL, sem a CPP sobre a folha)."
     )
     
-    # =========================================================================
-    # 2. DIAGNOSTICO DO PERFIL
-    # =========================================================================
+    pdf.subtitulo("Recomendacao Principal:")
+    if resultados['economia_atual'] > 0:
+        recomendacao = (
+            f"[OK] Migrar para {resultados['melhor_atual']} pode gerar economia de "
+            f"{formatar_moeda(resultados['economia_atual'])}/ano. "
+        )
+    else:
+        recomendacao = f"[OK] O regime atual ({resultados['melhor_atual']}) ja e o de menor carga tributaria. "
+    tipo, texto = texto_reforma(resultados)
+    pdf.alerta(recomendacao + texto, tipo)
+
+
+def secao_diagnostico(pdf, dados, resultados):
     pdf.add_page()
     pdf.titulo_secao("2. DIAGNOSTICO DO PERFIL TRIBUTARIO")
     
@@ -292,8 +470,9 @@ def gerar_relatorio():
     pdf.item_lista(f"Faturamento Anual: {formatar_moeda(dados['faturamento_anual'])}")
     pdf.ln(3)
     
+    total_com_credito, total_sem_credito = totais_despesas(dados)
+    
     # Despesas com credito
-    total_com_credito = sum(dados['despesas_com_credito'].values())
     pdf.subtitulo("Despesas que GERAM Credito (IBS/CBS)")
     for chave, valor in dados['despesas_com_credito'].items():
         nome = chave.replace('_', ' ').title()
@@ -302,16 +481,14 @@ def gerar_relatorio():
     pdf.ln(2)
     
     # Despesas sem credito
-    total_sem_credito = sum(dados['despesas_sem_credito'].values())
     pdf.subtitulo("Despesas SEM Credito")
     for chave, valor in dados['despesas_sem_credito'].items():
         nome = chave.replace('_', ' ').title()
         pdf.item_lista(f"{nome}: {formatar_moeda(valor)}")
     pdf.item_lista(f"TOTAL SEM CREDITO: {formatar_moeda(total_sem_credito)}", 0)
-    
-    # =========================================================================
-    # 3. ANALISE COMPARATIVA
-    # =========================================================================
+
+
+def secao_comparativa(pdf, dados, resultados):
     pdf.add_page()
     pdf.titulo_secao("3. ANALISE COMPARATIVA DE REGIMES")
     
@@ -321,37 +498,44 @@ def gerar_relatorio():
     )
     
     # Tabela
+    def linha_tabela(nome, cenario, elegivel):
+        if cenario['imposto_anual'] is None:
+            return [nome, elegivel, "-", "-", "-"]
+        return [nome, elegivel, formatar_moeda(cenario['imposto_anual']),
+                f"{cenario['carga_efetiva']:.2f}%", formatar_moeda(cenario['creditos'])]
+    
+    sim_nao = lambda cenario: "SIM" if cenario['elegivel'] else "NAO"
     dados_tabela = [
-        ["Simples Nacional", "NAO", "-", "-", "-"],
-        ["Lucro Presumido", "SIM", formatar_moeda(resultados['presumido']['imposto_anual']), 
-         f"{resultados['presumido']['carga_efetiva']:.2f}%", formatar_moeda(0)],
-        ["Lucro Real", "SIM", formatar_moeda(resultados['real']['imposto_anual']), 
-         f"{resultados['real']['carga_efetiva']:.2f}%", formatar_moeda(resultados['real']['creditos'])],
-        ["Reforma 2027", "N/A", formatar_moeda(resultados['reforma_2027']['imposto_anual']), 
-         f"{resultados['reforma_2027']['carga_efetiva']:.2f}%", formatar_moeda(resultados['reforma_2027']['creditos'])],
-        ["Reforma 2033", "N/A", formatar_moeda(resultados['reforma_2033']['imposto_anual']), 
-         f"{resultados['reforma_2033']['carga_efetiva']:.2f}%", formatar_moeda(resultados['reforma_2033']['creditos'])],
+        linha_tabela("Simples Nacional", resultados['simples'], sim_nao(resultados['simples'])),
+        linha_tabela("Lucro Presumido", resultados['presumido'], sim_nao(resultados['presumido'])),
+        linha_tabela("Lucro Real", resultados['real'], sim_nao(resultados['real'])),
+        linha_tabela("Reforma 2027*", resultados['reforma_2027'], "N/A"),
+        linha_tabela("Reforma 2033*", resultados['reforma_2033'], "N/A"),
     ]
     
     pdf.tabela_comparativa(dados_tabela)
-    
-    pdf.alerta(
-        f"[!] Simples Nacional: {resultados['simples']['motivo']}. "
-        f"Mesmo se fosse elegivel, o Lucro Real seria mais vantajoso para esta empresa.",
-        "alerta"
+    pdf.paragrafo(
+        "* Cenarios da reforma: IBS/CBS mais IRPJ/CSLL sobre o lucro estimado, SEM a CPP sobre a "
+        "folha. A projecao ano a ano da secao 6 inclui a CPP e o IRPJ/CSLL do regime atual, por "
+        "isso seu total de 2033 e maior."
     )
     
-    pdf.ln(3)
-    pdf.subtitulo("Por que Lucro Real e mais vantajoso?")
-    pdf.item_lista("Aproveitamento de creditos de PIS (1,65%) e COFINS (7,6%) sobre insumos")
-    pdf.item_lista("Aproveitamento de creditos de ICMS sobre mercadorias")
-    pdf.item_lista(f"Alto volume de compras creditaveis: {formatar_moeda(total_com_credito * 12)}/ano")
-    pdf.item_lista("Estrutura de custos favorece apuracao pelo lucro efetivo")
-    
-    # =========================================================================
-    # 4. IMPACTO DA REFORMA TRIBUTARIA
-    # =========================================================================
-    pdf.add_page()
+    if resultados['simples']['elegivel']:
+        pdf.alerta(f"[i] Simples Nacional: {resultados['simples']['motivo']}.", "info")
+    else:
+        pdf.alerta(f"[!] Simples Nacional nao permitido: {resultados['simples']['motivo']}.", "alerta")
+    
+    if resultados['melhor_atual'] == "Lucro Real":
+        total_com_credito, _ = totais_despesas(dados)
+        pdf.ln(3)
+        pdf.subtitulo("Por que Lucro Real e mais vantajoso?")
+        pdf.item_lista("Aproveitamento de creditos de PIS (1,65%) e COFINS (7,6%) sobre insumos")
+        pdf.item_lista("Aproveitamento de creditos de ICMS sobre mercadorias")
+        pdf.item_lista(f"Alto volume de compras creditaveis: {formatar_moeda(total_com_credito * 12)}/ano")
+        pdf.item_lista("Estrutura de custos favorece apuracao pelo lucro efetivo")
+
+
+def desenhar_reforma_fixo(pdf):
     pdf.titulo_secao("4. IMPACTO DA REFORMA TRIBUTARIA")
     
     pdf.paragrafo(
@@ -371,9 +555,13 @@ def gerar_relatorio():
     pdf.item_lista("Alugueis comerciais")
     pdf.item_lista("Servicos profissionais (advocacia, contabilidade)")
     pdf.ln(3)
+
+
+def secao_reforma(pdf, dados, resultados):
+    pdf.bloco_fixo("reforma", desenhar_reforma_fixo)
     
     creditos_reforma = resultados['reforma_2033']['creditos']
-    creditos_atual = resultados['real']['creditos']
+    creditos_atual = resultados['real']['creditos']  # maior aproveitamento de creditos hoje
     aumento_creditos = creditos_reforma - creditos_atual
     
     pdf.caixa_destaque(
@@ -382,6 +570,7 @@ def gerar_relatorio():
         (220, 252, 231), (34, 197, 94)
     )
     
+    _, total_sem_credito = totais_despesas(dados)
     pdf.subtitulo("Alerta: Despesas que NAO geram credito")
     pdf.alerta(
         "[X] Folha de pagamento, pro-labore, juros bancarios (spread), tributos e consumo "
@@ -389,10 +578,9 @@ def gerar_relatorio():
         f"Sua empresa tem {formatar_moeda(total_sem_credito * 12)}/ano nessa categoria.",
         "alerta"
     )
-    
-    # =========================================================================
-    # 5. ANALISE DA CADEIA DE SUPRIMENTOS
-    # =========================================================================
+
+
+def secao_cadeia(pdf, dados, resultados):
     pdf.titulo_secao("5. ANALISE DA CADEIA DE SUPRIMENTOS")
     
     perc_simples = dados['percentual_fornecedores_simples']
@@ -408,8 +596,11 @@ def gerar_relatorio():
     pdf.item_lista("Fornecedor Pessoa Fisica: SEM CREDITO")
     
     if perc_simples > 30:
+        perda_estimada = resultados.get('perda_creditos_simples')
+        if perda_estimada is None:
+            total_com_credito, _ = totais_despesas(dados)
+            perda_estimada = total_com_credito * 12 * (perc_simples / 100) * 0.23  # Diferenca de aliquota
         pdf.ln(2)
-        perda_estimada = total_com_credito * 12 * (perc_simples / 100) * 0.23  # Diferenca de aliquota
         pdf.alerta(
             f"[!] ATENCAO: Alto percentual de fornecedores Simples ({perc_simples}%) "
             f"pode resultar em perda de creditos estimada em {formatar_moeda(perda_estimada)}/ano. "
@@ -417,10 +608,23 @@ def gerar_relatorio():
             "alerta"
         )
     
-    # =========================================================================
-    # 6. TIMELINE DE ACAO
-    # =========================================================================
-    pdf.add_page()
+    sensibilidade = resultados.get('sensibilidade_fornecedores')
+    if sensibilidade:
+        pdf.ln(2)
+        pdf.subtitulo("Sensibilidade: % de compras de fornecedores do Simples (Reforma 2033*, sem CPP)")
+        tabela = [
+            [f"{ponto['percentual']}%", formatar_moeda(ponto['perda_creditos']),
+             formatar_moeda(ponto['imposto_2033']), f"{ponto['carga_2033']:.2f}%"]
+            for ponto in sensibilidade
+        ]
+        pdf.tabela_comparativa(
+            tabela,
+            cabecalhos=['Fornec. Simples', 'Perda de creditos', 'Imposto 2033', 'Carga %'],
+            colunas=[35, 50, 50, 35],
+        )
+
+
+def desenhar_timeline(pdf):
     pdf.titulo_secao("6. TIMELINE DE ACAO")
     
     pdf.subtitulo("2025-2026: Preparacao")
@@ -452,11 +656,9 @@ def gerar_relatorio():
     pdf.item_lista("Extincao total de ICMS e ISS")
     pdf.item_lista("IBS/CBS em vigor com aliquota cheia (~26,5%)")
     pdf.item_lista("Nao-cumulatividade plena operacional")
-    
-    # =========================================================================
-    # 7. RISCOS E PONTOS DE ATENCAO
-    # =========================================================================
-    pdf.add_page()
+
+
+def desenhar_riscos(pdf):
     pdf.titulo_secao("7. RISCOS E PONTOS DE ATENCAO")
     
     pdf.subtitulo("Vedacoes ao credito (mesmo no novo sistema):")
@@ -479,10 +681,9 @@ def gerar_relatorio():
         "significativamente seus creditos tributarios.",
         "info"
     )
-    
-    # =========================================================================
-    # 8. RECOMENDACOES ESTRATEGICAS
-    # =========================================================================
+
+
+def desenhar_recomendacoes(pdf):
     pdf.titulo_secao("8. RECOMENDACOES ESTRATEGICAS")
     
     pdf.subtitulo("Acoes Imediatas (proximos 6 meses):")
@@ -503,25 +704,63 @@ def gerar_relatorio():
     pdf.item_lista("Adaptar ERP para nova apuracao unificada")
     pdf.item_lista("Reavaliar localizacao de filiais (aliquota por destino)")
     pdf.item_lista("Planejar aproveitamento de creditos acumulados ICMS (240 meses)")
-    
-    # =========================================================================
-    # CONCLUSAO
-    # =========================================================================
+
+
+def secao_timeline(pdf, dados, resultados):
+    pdf.bloco_fixo("timeline", desenhar_timeline)
+    transicao = resultados.get('transicao')
+    if not transicao:
+        return
+    
+    # Tabela e nota ficam juntas: sem espaco no fim da timeline, vao para a pagina seguinte
+    if pdf.get_y() + 30 + 7 * len(transicao['anos']) > pdf.page_break_trigger:
+        pdf.add_page()
+    else:
+        pdf.ln(5)
+    pdf.subtitulo(f"Projecao ano a ano ({transicao['regime']})")
+    tabela = [
+        [str(ano['ano']), formatar_moeda(ano['tributos_atuais']), formatar_moeda(ano['ibs_cbs']),
+         formatar_moeda(ano['total']), f"{ano['carga_efetiva']:.2f}%"]
+        for ano in transicao['anos']
+    ]
+    pdf.tabela_comparativa(
+        tabela,
+        cabecalhos=['Ano', 'Tributos atuais', 'IBS/CBS', 'Total', 'Carga %'],
+        colunas=[20, 45, 40, 45, 30],
+    )
+    pdf.paragrafo(
+        "Tributos atuais = PIS/COFINS e ICMS/ISS remanescentes; IBS/CBS ja liquido dos creditos. "
+        "O Total inclui IRPJ/CSLL e CPP do regime atual; por isso o ano de 2033 difere do cenario "
+        "'Reforma 2033*' da secao 3, que nao inclui a CPP. Em 2026 o IBS/CBS de teste e compensado."
+    )
+
+
+def secao_riscos(pdf, dados, resultados):
+    pdf.bloco_fixo("riscos", desenhar_riscos)
+
+
+def secao_recomendacoes(pdf, dados, resultados):
+    # Continua na pagina dos riscos; a posicao de inicio entra na chave do cache
+    pdf.bloco_fixo("recomendacoes", desenhar_recomendacoes, nova_pagina=False)
+
+
+def secao_conclusao(pdf, dados, resultados):
     pdf.add_page()
     pdf.titulo_secao("9. CONCLUSAO")
     
-    pdf.paragrafo(
-        f"A analise indica que a migracao para {resultados['melhor_atual']} e a opcao "
-        f"mais vantajosa no cenario atual, proporcionando economia de "
-        f"{formatar_moeda(resultados['economia_atual'])} por ano. "
-    )
+    if resultados['economia_atual'] > 0:
+        pdf.paragrafo(
+            f"A analise indica que a migracao para {resultados['melhor_atual']} e a opcao "
+            f"mais vantajosa no cenario atual, proporcionando economia de "
+            f"{formatar_moeda(resultados['economia_atual'])} por ano. "
+        )
+    else:
+        pdf.paragrafo(
+            f"A analise indica que o regime atual, {resultados['melhor_atual']}, ja e a opcao "
+            f"mais vantajosa no cenario atual. "
+        )
     
-    pdf.paragrafo(
-        f"Com a implementacao plena da Reforma Tributaria em 2033, a empresa podera "
-        f"se beneficiar ainda mais da nao-cumulatividade plena, com potencial de "
-        f"economia adicional de {formatar_moeda(resultados['economia_reforma'] - resultados['economia_atual'])} por ano "
-        f"em relacao ao cenario atual."
-    )
+    pdf.paragrafo(texto_reforma(resultados)[1])
     
     pdf.paragrafo(
         "Recomenda-se iniciar imediatamente o planejamento da transicao, com foco na "
@@ -536,15 +775,64 @@ def gerar_relatorio():
         "a decisao e nao substitui parecer formal.",
         "info"
     )
+
+
+SECOES = [
+    ("1_sumario", secao_sumario),
+    ("2_diagnostico", secao_diagnostico),
+    ("3_comparativo", secao_comparativa),
+    ("4_reforma", secao_reforma),
+    ("5_cadeia", secao_cadeia),
+    ("6_timeline", secao_timeline),
+    ("7_riscos", secao_riscos),
+    ("8_recomendacoes", secao_recomendacoes),
+    ("9_conclusao", secao_conclusao),
+]
+
+
+def montar_relatorio(dados, resultados, cache_blocos=None, tempos=None):
+    """
+    Monta o relatorio em memoria para uma empresa; devolve o FPDF pronto para output().
+    
+    cache_blocos: dict reaproveitado entre relatorios (ex. num lote) com as secoes
+    fixas ja diagramadas. tempos: dict que recebe os segundos gastos em cada secao.
+    """
+    
+    pdf = RelatorioPlanejamentoTributario(cache_blocos)
+    pdf.alias_nb_pages()
+    
+    for nome, secao in SECOES:
+        inicio = time.perf_counter()
+        secao(pdf, dados, resultados)
+        if tempos is not None:
+            tempos[nome] = tempos.get(nome, 0.0) + time.perf_counter() - inicio
+    
+    return pdf
+
+
+def renderizar_pdf(dados=None, resultados=None, cache_blocos=None, tempos=None):
+    """Relatorio completo como bytes do PDF, sem tocar no disco (ex. para um servico HTTP)"""
+    
+    dados = dados or DADOS_EMPRESA
+    pdf = montar_relatorio(dados, resultados or calcular_resultados([dados])[0], cache_blocos, tempos)
+    return bytes(pdf.output())
+
+
+def gerar_relatorio(dados=None, resultados=None, output_path=None):
+    """Gera o relatorio PDF completo"""
+    
+    conteudo = renderizar_pdf(dados, resultados)
     
     # =========================================================================
     # SALVAR PDF
     # =========================================================================
     
-    output_dir = os.path.dirname(os.path.abspath(__file__))
-    output_path = os.path.join(output_dir, f"relatorio_tributario_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf")
+    if output_path is None:
+        output_dir = os.path.dirname(os.path.abspath(__file__))
+        output_path = os.path.join(output_dir, f"relatorio_tributario_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf")
     
-    pdf.output(output_path)
+    with open(output_path, "wb") as f:
+        f.write(conteudo)
     print(f"Relatorio gerado com sucesso!")
     print(f"Arquivo: {output_path}")
     
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Geracao em lote do Relatorio de Planejamento Tributario
+
+Le um arquivo de perfis (NDJSON ou CSV), renderiza um PDF por empresa em
+paralelo num pool de processos e grava um manifest.json com o resultado e o
+tempo de cada relatorio (total e por secao). As secoes fixas do relatorio
+sao diagramadas uma vez por processo e reaproveitadas nos relatorios
+seguintes (ver bloco_fixo em gerar_relatorio_tributario). Um perfil invalido vira uma entrada com erro no
+manifesto e nao interrompe o lote, nem um processo do pool que morre no meio.
+
+Formato dos perfis:
+  - NDJSON: uma linha por empresa, {"dados": {...}, "resultados": {...}} no
+    formato de DADOS_EMPRESA / resultados de calculo_relatorio; sem "resultados"
+    (ou uma linha so com os dados), os regimes sao calculados pelo motor, em
+    blocos vetorizados
+  - CSV: colunas com caminho pontuado, ex. razao_social, cnpj,
+    despesas_com_credito.cmv, resultados.presumido.imposto_anual
+    (colunas sem prefixo "resultados." vao para os dados da empresa)
+
+Execute:
+    python scripts/gerar_relatorios_lote.py perfis.ndjson --saida relatorios --processos 8
+    python scripts/gerar_relatorios_lote.py perfis.csv --saida relatorios
+    python scripts/gerar_relatorios_lote.py --exemplo 200 --saida /tmp/relatorios   # perfis sinteticos
+    python scripts/gerar_relatorios_lote.py --exemplo 200 --sem-cache   # diagrama tudo em cada relatorio
+"""
+
+import os
+import re
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from gerar_relatorio_tributario import DADOS_EMPRESA, montar_relatorio
+from calculo_relatorio import calcular_resultados
+
+# Perfis sem resultados calculados juntos pelo motor de regimes
+BLOCO_CALCULO = 500
+
+# Secoes fixas ja diagramadas, uma copia por processo do pool
+CACHE_BLOCOS = {}
+
+CAMPOS_TEXTO = {"razao_social", "cnpj", "cnae_principal", "uf", "municipio", "regime_atual",
+                "melhor_atual", "motivo"}
+
+
+def converter_valor(chave, valor):
+    """Texto do CSV -> numero/booleano/None, exceto nos campos de texto"""
+    if valor is None:
+        return None
+    valor = valor.strip()
+    if chave in CAMPOS_TEXTO:
+        return valor
+    if valor == "":
+        return None
+    if valor.lower() in ("true", "sim"):
+        return True
+    if valor.lower() in ("false", "nao"):
+        return False
+    try:
+        return float(valor) if any(c in valor for c in ".eE") else int(valor)
+    except ValueError:
+        return valor
+
+
+def linha_csv_para_perfil(linha):
+    perfil = {"dados": {}, "resultados": {}}
+    for coluna, valor in linha.items():
+        if not coluna:
+            continue
+        caminho = coluna.strip().split(".")
+        destino = perfil["resultados"] if caminho[0] == "resultados" else perfil["dados"]
+        if caminho[0] == "resultados":
+            caminho = caminho[1:]
+        for parte in caminho[:-1]:
+            destino = destino.setdefault(parte, {})
+        destino[caminho[-1]] = converter_valor(caminho[-1], valor)
+    return perfil
+
+
+def ler_perfis(caminho):
+    """Gera (numero da linha, perfil ou erro de leitura) para cada empresa do arquivo"""
+    with open(caminho, "r", encoding="utf-8-sig", newline="") as f:
+        if caminho.lower().endswith(".csv"):
+            for numero, linha in enumerate(csv.DictReader(f), start=2):
+                yield numero, linha_csv_para_perfil(linha)
+            return
+        for numero, texto in enumerate(f, start=1):
+            if not texto.strip():
+                continue
+            try:
+                yield numero, json.loads(texto)
+            except ValueError as e:
+                yield numero, {"erro_leitura": f"JSON invalido: {e}"}
+
+
+def perfis_exemplo(quantidade, semente=7):
+    """Variacoes do perfil modelo, para testar throughput sem dados reais"""
+    rng = random.Random(semente)
+    for i in range(quantidade):
+        fator = rng.uniform(0.5, 1.5)
+        dados = json.loads(json.dumps(DADOS_EMPRESA))
+        dados["razao_social"] = f"EMPRESA EXEMPLO {i + 1:04d} LTDA"
+        dados["cnpj"] = f"{rng.randrange(10 ** 8):08d}/0001-{i % 100:02d}"
+        for grupo in ("despesas_com_credito", "despesas_sem_credito"):
+            dados[grupo] = {k: round(v * fator, 2) for k, v in dados[grupo].items()}
+        dados["faturamento_mensal"] = round(dados["faturamento_mensal"] * fator, 2)
+        dados["faturamento_anual"] = round(dados["faturamento_mensal"] * 12, 2)
+        yield i + 1, {"dados": dados}
+
+
+def completar_resultados(perfis, tamanho=BLOCO_CALCULO):
+    """Calcula (calculo_relatorio) os resultados dos perfis que so trazem os dados"""
+    bloco = []
+    
+    def calcular():
+        pendentes = [perfil for _, perfil in bloco if isinstance(perfil, dict)
+                     and not perfil.get("resultados") and isinstance(perfil.get("dados"), dict)]
+        if pendentes:
+            try:
+                for perfil, resultados in zip(pendentes, calcular_resultados([p["dados"] for p in pendentes])):
+                    perfil["resultados"] = resultados
+            except Exception:
+                # Um perfil com dados invalidos nao derruba o bloco: recalcula um a um
+                for perfil in pendentes:
+                    try:
+                        perfil["resultados"] = calcular_resultados([perfil["dados"]])[0]
+                    except Exception as e:
+                        perfil["erro_leitura"] = f"calculo dos regimes falhou: {type(e).__name__}: {e}"
+        yield from bloco
+        bloco.clear()
+    
+    for numero, perfil in perfis:
+        if isinstance(perfil, dict) and "dados" not in perfil and "erro_leitura" not in perfil:
+            perfil = {"dados": perfil}
+        bloco.append((numero, perfil))
+        if len(bloco) >= tamanho:
+            yield from calcular()
+    yield from calcular()
+
+
+def nome_arquivo(numero, dados):
+    identificador = re.sub(r"\D", "", str(dados.get("cnpj") or "")) or f"linha{numero}"
+    return f"relatorio_{numero:05d}_{identificador}.pdf"
+
+
+def renderizar_perfil(numero, perfil, pasta_saida, usar_cache=True):
+    """Executa no processo filho: monta e grava um relatorio, medindo o tempo"""
+    inicio = time.perf_counter()
+    inicio_cpu = time.process_time()
+    entrada = {"linha": numero, "pid": os.getpid()}
+    try:
+        if not isinstance(perfil, dict):
+            raise ValueError("perfil nao e um objeto JSON")
+        if "erro_leitura" in perfil:
+            raise ValueError(perfil["erro_leitura"])
+        dados, resultados = perfil.get("dados"), perfil.get("resultados")
+        if not dados or not resultados:
+            raise ValueError("perfil sem 'dados' ou 'resultados'")
+        entrada.update(razao_social=dados.get("razao_social"), cnpj=dados.get("cnpj"))
+        tempos = {}
+        pdf = montar_relatorio(dados, resultados, CACHE_BLOCOS if usar_cache else None, tempos)
+        montagem = time.perf_counter() - inicio
+        caminho = os.path.join(pasta_saida, nome_arquivo(numero, dados))
+        pdf.output(caminho)
+        entrada.update(status="ok", arquivo=caminho, bytes=os.path.getsize(caminho), paginas=pdf.page_no(),
+                       montagem_ms=round(montagem * 1000, 2), blocos_reutilizados=pdf.blocos_reutilizados,
+                       secoes_ms={nome: round(segundos * 1000, 2) for nome, segundos in tempos.items()})
+    except Exception as e:
+        entrada.update(status="erro", erro=f"{type(e).__name__}: {e}",
+                       detalhe=traceback.format_exc(limit=3))
+    entrada["total_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    entrada["cpu_ms"] = round((time.process_time() - inicio_cpu) * 1000, 2)
+    return entrada
+
+
+def entrada_processo_perdido(numero, perfil, erro):
+    """Entrada do manifesto para um perfil cujo processo morreu (segfault, OOM, kill) mesmo isolado"""
+    entrada = {"linha": numero, "status": "erro",
+               "erro": f"{type(erro).__name__}: o processo terminou ao renderizar esta linha ({erro})"}
+    dados = perfil.get("dados") if isinstance(perfil, dict) else None
+    if isinstance(dados, dict):
+        entrada.update(razao_social=dados.get("razao_social"), cnpj=dados.get("cnpj"))
+    entrada.update(total_ms=None, cpu_ms=0.0)
+    return entrada
+
+
+def gerar_lote(perfis, pasta_saida, processos=None, max_pendentes=None, usar_cache=True):
+    """
+    Renderiza todos os perfis num ProcessPoolExecutor. No maximo max_pendentes
+    perfis ficam na fila ao mesmo tempo, entao arquivos grandes nao sao
+    carregados inteiros na memoria.
+    
+    Se um processo filho morre, o pool quebra e todas as tarefas em andamento
+    falham juntas, sem dizer de qual linha foi a culpa: o pool e recriado e
+    essas linhas sao refeitas uma a uma num pool de um processo. So a linha que
+    derruba esse processo vira uma entrada com erro.
+    """
+    processos = processos or os.cpu_count() or 1
+    max_pendentes = max_pendentes or processos * 4
+    os.makedirs(pasta_saida, exist_ok=True)
+    entradas = []
+    pendentes = {}  # futuro -> (numero, perfil, isolado, executor que recebeu a tarefa)
+    executores = {False: None, True: None}  # isolado -> pool
+    suspeitas = deque()  # linhas que estavam no pool quando ele quebrou
+    
+    def executor_de(isolado):
+        if executores[isolado] is None:
+            executores[isolado] = ProcessPoolExecutor(max_workers=1 if isolado else processos)
+        return executores[isolado]
+    
+    def descartar(isolado, quebrado):
+        if executores[isolado] is quebrado:
+            if not isolado:
+                print("Pool de processos quebrado, recriando; linhas em andamento refeitas uma a uma",
+                      file=sys.stderr)
+            executores[isolado] = None
+            quebrado.shutdown(wait=False, cancel_futures=True)
+    
+    def submeter(numero, perfil, isolado=False):
+        executor = executor_de(isolado)
+        try:
+            futuro = executor.submit(renderizar_perfil, numero, perfil, pasta_saida, usar_cache)
+        except BrokenProcessPool:
+            descartar(isolado, executor)
+            executor = executor_de(isolado)
+            futuro = executor.submit(renderizar_perfil, numero, perfil, pasta_saida, usar_cache)
+        pendentes[futuro] = (numero, perfil, isolado, executor)
+    
+    def coletar():
+        prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+        for futuro in prontos:
+            numero, perfil, isolado, dono = pendentes.pop(futuro)
+            try:
+                entradas.append(futuro.result())
+            except BrokenProcessPool as e:
+                descartar(isolado, dono)
+                if isolado:
+                    entradas.append(entrada_processo_perdido(numero, perfil, e))
+                else:
+                    suspeitas.append((numero, perfil))
+        # Uma suspeita por vez: se o processo isolado morrer, a culpa e dela
+        if suspeitas and not any(isolado for _, _, isolado, _ in pendentes.values()):
+            numero, perfil = suspeitas.popleft()
+            submeter(numero, perfil, isolado=True)
+    
+    try:
+        for numero, perfil in completar_resultados(perfis):
+            while len(pendentes) >= max_pendentes:
+                coletar()
+            submeter(numero, perfil)
+        while pendentes or suspeitas:
+            coletar()
+    finally:
+        for executor in executores.values():
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+    return sorted(entradas, key=lambda e: e["linha"])
+
+
+def resumo_lote(entradas, duracao, processos):
+    ok = [e for e in entradas if e["status"] == "ok"]
+    tempos = sorted(e["total_ms"] for e in ok)
+    cpu = sum(e["cpu_ms"] for e in entradas) / 1000
+    secoes = {}
+    for entrada in ok:
+        for nome, ms in entrada["secoes_ms"].items():
+            secoes[nome] = secoes.get(nome, 0.0) + ms
+    return {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "processos": processos,
+        "relatorios": len(entradas),
+        "ok": len(ok),
+        "erros": len(entradas) - len(ok),
+        "duracao_s": round(duracao, 3),
+        "relatorios_por_s": round(len(ok) / duracao, 2) if duracao > 0 else None,
+        # Tempo de CPU somado / tempo de parede: ~processos quando escala linearmente
+        "paralelismo_efetivo": round(cpu / duracao, 2) if duracao > 0 else None,
+        "tempo_ms": {
+            "p50": tempos[len(tempos) // 2] if tempos else None,
+            "p90": tempos[int(len(tempos) * 0.9)] if tempos else None,
+            "max": tempos[-1] if tempos else None,
+        },
+        # Media por relatorio; onde o tempo de diagramacao vai
+        "secoes_ms_media": {nome: round(total / len(ok), 2) for nome, total in sorted(secoes.items())},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Gera relatorios tributarios em lote")
+    parser.add_argument("perfis", nargs="?", help="arquivo de perfis (.ndjson/.jsonl ou .csv)")
+    parser.add_argument("--saida", default="relatorios", help="pasta dos PDFs e do manifest.json (padrao: %(default)s)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(),
+                        help="processos em paralelo (padrao: numero de CPUs)")
+    parser.add_argument("--sem-cache", action="store_true", help="diagrama as secoes fixas em todo relatorio")
+    parser.add_argument("--exemplo", type=int, metavar="N", help="usa N perfis sinteticos em vez de um arquivo")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.exemplo:
+        perfis = perfis_exemplo(args.exemplo)
+    elif args.perfis:
+        perfis = ler_perfis(args.perfis)
+    else:
+        print("Informe o arquivo de perfis ou --exemplo N")
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    entradas = gerar_lote(perfis, args.saida, args.processos, usar_cache=not args.sem_cache)
+    resumo = resumo_lote(entradas, time.perf_counter() - inicio, args.processos)
+
+    manifesto = os.path.join(args.saida, "manifest.json")
+    with open(manifesto, "w", encoding="utf-8") as f:
+        json.dump({**resumo, "entradas": entradas}, f, indent=2, ensure_ascii=False)
+
+    print(f"{resumo['ok']} relatorios gerados, {resumo['erros']} com erro, em {resumo['duracao_s']}s "
+          f"({resumo['relatorios_por_s']} relatorios/s, paralelismo efetivo {resumo['paralelismo_efetivo']})")
+    if resumo["secoes_ms_media"]:
+        print("Tempo medio por secao: " + ", ".join(f"{nome} {ms}ms" for nome, ms in resumo["secoes_ms_media"].items()))
+    print(f"Manifesto: {manifesto}")
+    for entrada in entradas:
+        if entrada["status"] == "erro":
+            print(f"  linha {entrada['linha']}: {entrada['erro']}")
+    if resumo["erros"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Local stand-in for the CFF/SVRS consultation API.
+
+Serves JSON dumps over plain HTTP so the ETL can be run without the real
+endpoint or a certificate. Each GET /<endpoint> returns the file mapped to
+that endpoint; ETag and Last-Modified are sent (unless disabled) and
+conditional requests get a 304. Files are re-read when their mtime changes,
+so editing a dump simulates a new publication.
+
+Usage:
+    python scripts/gov_api_stub.py                                  # serves the *_dump.json files in the repo root
+    python scripts/gov_api_stub.py --port 8001 --payload anexos=anexos_dump.json
+    python scripts/gov_api_stub.py --no-validators --fail-rate 0.2  # exercise hash fallback and retries
+
+    python scripts/etl_tax_gov.py --base-url http://127.0.0.1:8000 --daemon
+"""
+
+import os
+import sys
+import random
+import hashlib
+import argparse
+import logging
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PAYLOADS = {
+    "classTrib": os.path.join(REPO_ROOT, "rules_dump.json"),
+    "anexos": os.path.join(REPO_ROOT, "anexos_dump.json"),
+    "indOper": os.path.join(REPO_ROOT, "indoper_dump.json"),
+}
+
+
+class PayloadStore:
+    """Endpoint -> file, with the body and validators cached per mtime."""
+
+    def __init__(self, payloads: Dict[str, str]):
+        self.payloads = payloads
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[float, bytes, str]] = {}
+
+    def get(self, endpoint: str) -> Optional[Tuple[bytes, str, float]]:
+        path = self.payloads.get(endpoint)
+        if path is None or not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._cache.get(endpoint)
+            if cached is None or cached[0] != mtime:
+                with open(path, "rb") as f:
+                    body = f.read()
+                cached = (mtime, body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+                self._cache[endpoint] = cached
+        return cached[1], cached[2], mtime
+
+
+def make_handler(store: PayloadStore, validators: bool, fail_rate: float, latency: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            endpoint = self.path.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+            if fail_rate and random.random() < fail_rate:
+                self.send_error(503, "Injected failure")
+                return
+            found = store.get(endpoint)
+            if found is None:
+                self.send_error(404, f"Unknown endpoint {endpoint}")
+                return
+            body, etag, mtime = found
+            if latency:
+                threading.Event().wait(latency)
+
+            if validators and self.not_modified(etag, mtime):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if validators:
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def not_modified(self, etag: str, mtime: float) -> bool:
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match is not None:
+                return etag in [tag.strip() for tag in if_none_match.split(",")]
+            if_modified_since = self.headers.get("If-Modified-Since")
+            if if_modified_since:
+                try:
+                    return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+        def log_message(self, format, *args):
+            logger.info(f"{self.address_string()} {format % args}")
+
+    return StubHandler
+
+
+def parse_payloads(values) -> Dict[str, str]:
+    if not values:
+        return {name: path for name, path in DEFAULT_PAYLOADS.items() if os.path.exists(path)}
+    payloads = {}
+    for value in values:
+        endpoint, sep, path = value.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected endpoint=path, got {value!r}")
+        payloads[endpoint] = path
+    return payloads
+
+
+def create_server(payloads: Dict[str, str], host: str = "127.0.0.1", port: int = 8000,
+                  validators: bool = True, fail_rate: float = 0.0, latency: float = 0.0) -> ThreadingHTTPServer:
+    handler = make_handler(PayloadStore(payloads), validators, fail_rate, latency)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve gov API dumps locally for the ETL")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--payload", action="append",
+                        help="endpoint=path to a JSON file (repeatable; default: the *_dump.json files)")
+    parser.add_argument("--no-validators", action="store_true",
+                        help="send no ETag/Last-Modified, forcing the ETL's hash fallback")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="fraction of requests answered with 503")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds to wait before answering each request")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        payloads = parse_payloads(args.payload)
+    except argparse.ArgumentTypeError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    server = create_server(payloads, args.host, args.port, not args.no_validators,
+                           args.fail_rate, args.latency)
+    logger.info(f"Serving {', '.join(sorted(payloads)) or 'nothing'} on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
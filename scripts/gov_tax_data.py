@@ -0,0 +1,309 @@
+"""
+Shared helpers for the government tax data (CFF/SVRS) scripts.
+
+Describes how each source_api payload is shaped, how its items are flattened
+into typed rows and which natural key identifies an item across snapshots.
+"""
+
+import json
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# classTrib boolean flags -> staging column names
+CLASS_TRIB_FLAGS = {
+    "IndNFe": "ind_nfe",
+    "IndNFCe": "ind_nfce",
+    "IndCTe": "ind_cte",
+    "IndCTeOS": "ind_cteos",
+    "IndNFSE": "ind_nfse",
+    "IndBPe": "ind_bpe",
+    "IndBPeTA": "ind_bpeta",
+    "IndBPeTM": "ind_bpetm",
+    "IndNF3e": "ind_nf3e",
+    "IndNFAg": "ind_nfag",
+    "IndNFCom": "ind_nfcom",
+    "IndNFGas": "ind_nfgas",
+    "IndNFABI": "ind_nfabi",
+    "IndNFSVIA": "ind_nfsvia",
+    "IndDERE": "ind_dere",
+    "IndEstornoCred": "ind_estorno_cred",
+    "IndTribRegular": "ind_trib_regular",
+    "IndCredPresOper": "ind_cred_pres_oper",
+    "MonofasiaPadrao": "monofasia_padrao",
+    "MonofasiaRetidaAnt": "monofasia_retida_ant",
+    "MonofasiaDiferimento": "monofasia_diferimento",
+    "MonofasiaSujeitaRetencao": "monofasia_sujeita_retencao",
+}
+
+
+def canonical_json(data) -> bytes:
+    """
+    Serializes a payload deterministically (sorted keys, compact separators),
+    so the same government data always produces the same bytes.
+    """
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def payload_hash(encoded: bytes) -> str:
+    return hashlib.sha256(encoded).hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def parse_gov_datetime(value) -> Optional[str]:
+    """
+    Normalizes API timestamps ("2026-01-01T00:00:00") to naive ISO seconds.
+    Cached: whole annexes share a handful of validity dates.
+    """
+    if value in (None, ""):
+        return None
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed.replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+def to_int(value) -> Optional[int]:
+    if value in (None, ""):
+        return None
+    return int(value)
+
+
+def to_float(value) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    return float(value)
+
+
+def iter_class_trib_rules(items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields classTrib rule dicts from any of the shapes seen so far: the raw API
+    items (rules nested under "classificacoesTributarias"), the debug_tax_rules
+    dump ({"rule": {...}}) or flat rule dicts.
+    """
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        nested = item.get("classificacoesTributarias")
+        if isinstance(nested, list):
+            for rule in nested:
+                if isinstance(rule, dict):
+                    yield rule
+        elif isinstance(item.get("rule"), dict):
+            yield item["rule"]
+        elif "cClassTrib" in item:
+            yield item
+
+
+def iter_flat_items(items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    for item in items:
+        if isinstance(item, dict):
+            yield item
+
+
+def class_trib_row(rule: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not rule.get("cClassTrib"):
+        return None
+    row = {
+        "c_class_trib": str(rule["cClassTrib"]),
+        "descricao": rule.get("DescricaoClassTrib"),
+        "tipo_aliquota": rule.get("TipoAliquota"),
+        "anexo": to_int(rule.get("Anexo")),
+        "p_red_ibs": to_float(rule.get("pRedIBS")),
+        "p_red_cbs": to_float(rule.get("pRedCBS")),
+        "inicio_vigencia": parse_gov_datetime(rule.get("InicioVigencia")),
+        "fim_vigencia": parse_gov_datetime(rule.get("FimVigencia")),
+        "publicacao": parse_gov_datetime(rule.get("Publicacao")),
+        "link": rule.get("Link"),
+    }
+    for flag, column in CLASS_TRIB_FLAGS.items():
+        row[column] = bool(rule.get(flag, False))
+    return row
+
+
+def anexo_row(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if item.get("nroAnexo") is None or not item.get("codNcmNbs") or not item.get("dthIniVig"):
+        return None
+    return {
+        "nro_anexo": to_int(item["nroAnexo"]),
+        # Some published codes carry stray whitespace ("97039000 ")
+        "cod_ncm_nbs": str(item["codNcmNbs"]).strip(),
+        "tipo_anexo": item.get("TipoAnexo"),
+        "dth_ini_vig": parse_gov_datetime(item["dthIniVig"]),
+        "dth_fim_vig": parse_gov_datetime(item.get("dthFimVig")),
+    }
+
+
+def ind_oper_row(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not item.get("codOperacao"):
+        return None
+    return {
+        "cod_operacao": str(item["codOperacao"]),
+        "nome_operacao": item.get("nomeOperacao"),
+        "tex_disp_legal": item.get("texDispLegal"),
+        "tex_local_fornec": item.get("texLocalFornec"),
+        "tex_caract_fornec": item.get("texCaractFornec"),
+        "tex_local_operacao": item.get("texLocalOperacao"),
+        "dth_publicacao": parse_gov_datetime(item.get("dthPublicacao")),
+        "dth_ini_vig": parse_gov_datetime(item.get("dthIniVig")),
+        "dth_fim_vig": parse_gov_datetime(item.get("dthFimVig")),
+    }
+
+
+def cred_presumido_row(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # No credPresumido sample has been dumped yet; cCredPres is the code the
+    # NF-e layout uses, and the whole item is kept in `dados` until the other
+    # fields are known.
+    code = item.get("cCredPres")
+    if code in (None, ""):
+        return None
+    return {
+        "c_cred_pres": str(code),
+        "descricao": item.get("DescricaoCredPres") or item.get("descricao"),
+        "dados": item,
+    }
+
+
+@dataclass(frozen=True)
+class StagingSpec:
+    source_api: str
+    table: str
+    key_columns: Tuple[str, ...]
+    iter_items: Callable[[Iterable[Any]], Iterator[Dict[str, Any]]]
+    build_row: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+    def key(self, row: Dict[str, Any]) -> tuple:
+        return tuple(row[column] for column in self.key_columns)
+
+    def db_key(self, row: Dict[str, Any]) -> tuple:
+        """Key of a row read back from PostgREST, with timestamps re-normalized."""
+        return tuple(
+            parse_gov_datetime(row[column]) if column.startswith("dth_") else row[column]
+            for column in self.key_columns
+        )
+
+    def rows(self, items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+        for item in self.iter_items(items):
+            row = self.build_row(item)
+            if row is not None:
+                yield row
+
+
+STAGING_SPECS = {
+    "classTrib": StagingSpec("classTrib", "gov_class_trib", ("c_class_trib",),
+                             iter_class_trib_rules, class_trib_row),
+    "anexos": StagingSpec("anexos", "gov_anexo_ncm", ("nro_anexo", "cod_ncm_nbs", "dth_ini_vig"),
+                          iter_flat_items, anexo_row),
+    "indOper": StagingSpec("indOper", "gov_ind_oper", ("cod_operacao",),
+                           iter_flat_items, ind_oper_row),
+    "credPresumido": StagingSpec("credPresumido", "gov_cred_presumido", ("c_cred_pres",),
+                                 iter_flat_items, cred_presumido_row),
+}
+
+
+def row_hash(row: Dict[str, Any]) -> str:
+    return payload_hash(canonical_json(row))
+
+
+def open_dump(path: str, mode: str = "r"):
+    """Text handle on a dump file, transparently (de)compressing *.zst with the zstandard package."""
+    if not path.endswith(".zst"):
+        return open(path, mode, encoding="utf-8")
+    import io
+    import zstandard
+
+    raw = open(path, mode + "b")
+    if "r" in mode:
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    else:
+        stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def iter_dump(path: str) -> Iterator[Any]:
+    """Streams the items of a dump; NDJSON (.ndjson/.jsonl, optionally .zst) one line at a time."""
+    name = path[:-4] if path.endswith(".zst") else path
+    with open_dump(path) as f:
+        if not name.endswith((".ndjson", ".jsonl")):
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_dump(path: str) -> list:
+    """Loads a dump written by dump_tables.py (JSON array or NDJSON, optionally zstd)."""
+    return list(iter_dump(path))
+
+
+def create_supabase_client():
+    """
+    Client for the standalone tools. Prefers the service credentials used by
+    the ETL and falls back to the Vite variables used by the dump scripts.
+    """
+    import os
+    from supabase import create_client
+
+    url = os.environ.get("SUPABASE_URL") or os.environ.get("VITE_SUPABASE_URL")
+    key = os.environ.get("SUPABASE_SERVICE_KEY") or os.environ.get("VITE_SUPABASE_PUBLISHABLE_KEY")
+    if not url or not key:
+        raise RuntimeError("Missing SUPABASE_URL/SUPABASE_SERVICE_KEY (or VITE_SUPABASE_* fallbacks)")
+    return create_client(url, key)
+
+
+@dataclass
+class Snapshot:
+    """One stored pull of a source_api; chunked snapshots span several rows."""
+    source_api: str
+    snapshot_id: str
+    fetched_at: str
+    batch_id: Optional[str] = None
+    row_ids: List[int] = field(default_factory=list)
+
+    def iter_items(self, supabase, page_size: int = 20) -> Iterator[Any]:
+        """Streams the items of the snapshot, one Bronze row at a time."""
+        for start in range(0, len(self.row_ids), page_size):
+            response = (
+                supabase.table("raw_gov_tax_data")
+                .select("id,chunk_index,payload_json")
+                .in_("id", self.row_ids[start:start + page_size])
+                .order("chunk_index")
+                .execute()
+            )
+            for row in response.data:
+                payload = row["payload_json"]
+                if isinstance(payload, list):
+                    yield from payload
+                else:
+                    yield payload
+
+
+def list_snapshots(supabase, source_api: str, count: int = 2, page_size: int = 200) -> list:
+    """
+    Returns the `count` most recent snapshots of a source_api, newest first.
+    Only ids and timestamps are read here; payloads are fetched lazily.
+    """
+    snapshots: Dict[str, Snapshot] = {}
+    start = 0
+    while True:
+        response = (
+            supabase.table("raw_gov_tax_data")
+            .select("id,fetched_at,batch_id,chunk_index")
+            .eq("source_api", source_api)
+            .order("fetched_at", desc=True)
+            .order("id")
+            .range(start, start + page_size - 1)
+            .execute()
+        )
+        for row in response.data:
+            snapshot_id = row.get("batch_id") or f"row:{row['id']}"
+            if snapshot_id not in snapshots:
+                if len(snapshots) == count:
+                    return list(snapshots.values())
+                snapshots[snapshot_id] = Snapshot(source_api, snapshot_id, row["fetched_at"],
+                                                  row.get("batch_id"))
+            snapshots[snapshot_id].row_ids.append(row["id"])
+        if len(response.data) < page_size:
+            return list(snapshots.values())
+        start += page_size
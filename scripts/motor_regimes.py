@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Motor de calculo dos regimes tributarios (Simples Nacional, Lucro Presumido,
+Lucro Real e Reforma IBS/CBS)
+
+Porte vetorizado em NumPy de src/lib/tax-planning-engine.ts, com as mesmas
+formulas (inclusive as simplificacoes do motor TS, como o cenario da reforma
+sem CPP) e as mesmas regras de src/data/tax-planning-rules.json e
+src/data/cnae-database.json. Cada perfil vira uma linha de PerfisEmpresas e
+cada calculo opera sobre colunas inteiras, entao milhares de empresas ou
+cenarios saem numa unica chamada.
+
+O dict DADOS_EMPRESA do relatorio e o formato de entrada; resultados_relatorio()
+devolve os regimes e economias do dict RESULTADOS, que calculo_relatorio completa
+com a transicao e a sensibilidade para gerar_relatorio_tributario.py.
+
+Execute:
+    python scripts/motor_regimes.py                                  # empresa modelo do relatorio
+    python scripts/motor_regimes.py perfis.ndjson --saida resultados.ndjson
+    python scripts/motor_regimes.py --exemplo 100000                 # mede o throughput
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass, fields
+from functools import lru_cache
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_REGRAS = os.path.join(REPO_ROOT, "src", "data", "tax-planning-rules.json")
+CAMINHO_CNAES = os.path.join(REPO_ROOT, "src", "data", "cnae-database.json")
+
+# Constantes fixas no motor TS (nao vem do JSON de regras)
+ALIQUOTA_IBS_CBS_PADRAO = 0.255
+REDUCAO_SETORIAL = {
+    "saude": 0.60,
+    "educacao": 0.60,
+    "transporte_publico": 0.60,
+    "agropecuaria": 0.60,
+    "cultura": 0.60,
+}
+ALIQUOTA_CREDITO_SIMPLES = 0.07  # credito de compra de fornecedor do Simples na reforma
+BASE_ADICIONAL_IRPJ = 240000
+UFS_SUBLIMITE_REDUZIDO = ("AC", "AP", "RR")
+
+DESPESAS_COM_CREDITO = ("cmv", "aluguel", "energia_telecom", "servicos_pj", "outros_insumos",
+                        "transporte_frete", "manutencao", "tarifas_bancarias")
+DESPESAS_SEM_CREDITO = ("folha_pagamento", "pro_labore", "despesas_financeiras", "tributos",
+                        "uso_pessoal", "outras")
+
+ANEXOS_SIMPLES = ("I", "II", "III", "IV", "V")
+REGIMES_ATUAIS = ("simples", "presumido", "real")
+NOMES_REGIMES = {"simples": "Simples Nacional", "presumido": "Lucro Presumido", "real": "Lucro Real"}
+
+# Motivo de inelegibilidade ao Simples
+SIMPLES_ELEGIVEL, SIMPLES_FATURAMENTO, SIMPLES_CNAE = 0, 1, 2
+
+
+@lru_cache(maxsize=None)
+def carregar_json(caminho):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def carregar_regras(caminho=CAMINHO_REGRAS):
+    return carregar_json(caminho)
+
+
+def carregar_cnaes(caminho=CAMINHO_CNAES):
+    return carregar_json(caminho)["cnaes"]
+
+
+def codigo_cnae(texto):
+    """'4711-3/02 - Comercio varejista...' -> '4711-3/02'"""
+    texto = str(texto or "").strip()
+    encontrado = re.match(r"\d{4}-\d/\d{2}", texto)
+    return encontrado.group(0) if encontrado else texto
+
+
+def regime_atual_codigo(texto):
+    texto = str(texto or "").lower()
+    for indice, codigo in enumerate(REGIMES_ATUAIS):
+        if codigo in texto:
+            return indice
+    return -1
+
+
+def formatar_reais(valor):
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+# ============================================================================
+# PARAMETROS POR CNAE
+# ============================================================================
+
+@dataclass(frozen=True)
+class ParametrosCnae:
+    servico_alto: bool          # isServicoAltoPresuncao do motor TS
+    presuncao_irpj: float
+    presuncao_csll: float
+    simples_permitido: bool
+    motivo_vedacao: str
+    anexo_padrao: int           # indice em ANEXOS_SIMPLES
+    anexo_fator_r: int          # -1 quando a atividade nao esta sujeita ao Fator R
+    fator_r_minimo: float
+    reducao_setorial: float
+
+
+def parametros_cnae(cnae, cnaes):
+    info = cnaes.get(cnae)
+    if info:
+        presuncao = info.get("lucro_presumido")
+        servico_alto = bool(presuncao) and presuncao.get("presuncao_irpj") == 0.32
+    else:
+        presuncao = None
+        servico_alto = cnae[:1] in ("6", "7", "8")
+    if presuncao:
+        presuncao_irpj, presuncao_csll = presuncao["presuncao_irpj"], presuncao["presuncao_csll"]
+    else:
+        presuncao_irpj, presuncao_csll = (0.32, 0.32) if servico_alto else (0.08, 0.12)
+
+    simples = (info or {}).get("simples") or {}
+    anexo_padrao = simples.get("anexo_padrao") or ("V" if servico_alto else "I")
+    anexo_fator_r = simples.get("anexo_fator_r")
+    reducao = ((info or {}).get("reforma_tributaria") or {}).get("reducao_aliquota")
+    if not reducao:
+        reducao = REDUCAO_SETORIAL.get((info or {}).get("setor", ""), 0.0)
+    return ParametrosCnae(
+        servico_alto=servico_alto,
+        presuncao_irpj=presuncao_irpj,
+        presuncao_csll=presuncao_csll,
+        simples_permitido=simples.get("permitido", True) if simples else True,
+        motivo_vedacao=simples.get("motivo") or "Vedacao legal",
+        anexo_padrao=ANEXOS_SIMPLES.index(anexo_padrao),
+        anexo_fator_r=ANEXOS_SIMPLES.index(anexo_fator_r) if anexo_fator_r else -1,
+        fator_r_minimo=simples.get("fator_r_minimo") or 0.28,
+        reducao_setorial=reducao,
+    )
+
+
+# ============================================================================
+# PERFIS (uma coluna por campo, uma linha por empresa/cenario)
+# ============================================================================
+
+@dataclass
+class PerfisEmpresas:
+    faturamento_anual: np.ndarray
+    cmv_anual: np.ndarray
+    despesas_com_credito: np.ndarray     # total anual
+    despesas_sem_credito: np.ndarray     # total anual
+    folha_anual: np.ndarray              # folha + pro-labore
+    lucro_liquido: np.ndarray            # NaN: estimado pelas despesas
+    adicoes_lalur: np.ndarray
+    exclusoes_lalur: np.ndarray
+    fornecedores_simples: np.ndarray     # fracao 0-1
+    compras_creditaveis: np.ndarray      # fracao 0-1
+    sublimite_simples: np.ndarray
+    regime_atual: np.ndarray             # indice em REGIMES_ATUAIS, -1 desconhecido
+    cnaes: np.ndarray                    # indice em parametros
+    parametros: list                     # ParametrosCnae distintos do lote
+
+    def __len__(self):
+        return len(self.faturamento_anual)
+
+    @classmethod
+    def de_dados(cls, lista_dados, cnaes=None):
+        """Converte dicts no formato DADOS_EMPRESA (valores de despesa mensais)"""
+        cnaes = carregar_cnaes() if cnaes is None else cnaes
+        n = len(lista_dados)
+        colunas = {nome: np.zeros(n) for nome in (
+            "faturamento_anual", "cmv_anual", "despesas_com_credito", "despesas_sem_credito", "folha_anual",
+            "lucro_liquido", "adicoes_lalur", "exclusoes_lalur", "fornecedores_simples",
+            "compras_creditaveis", "sublimite_simples")}
+        regime_atual = np.full(n, -1, dtype=np.int8)
+        indices_cnae = np.zeros(n, dtype=np.int32)
+        parametros, por_cnae = [], {}
+
+        for i, dados in enumerate(lista_dados):
+            com = dados.get("despesas_com_credito") or {}
+            sem = dados.get("despesas_sem_credito") or {}
+            colunas["faturamento_anual"][i] = (dados.get("faturamento_anual")
+                                               or (dados.get("faturamento_mensal") or 0) * 12)
+            colunas["cmv_anual"][i] = (com.get("cmv") or 0) * 12
+            colunas["despesas_com_credito"][i] = sum(com.get(k) or 0 for k in DESPESAS_COM_CREDITO) * 12
+            colunas["despesas_sem_credito"][i] = sum(sem.get(k) or 0 for k in DESPESAS_SEM_CREDITO) * 12
+            colunas["folha_anual"][i] = ((sem.get("folha_pagamento") or 0) + (sem.get("pro_labore") or 0)) * 12
+            # lucro_liquido zero ou ausente conta como nao informado, como no motor TS
+            colunas["lucro_liquido"][i] = dados.get("lucro_liquido") or np.nan
+            colunas["adicoes_lalur"][i] = dados.get("adicoes_lalur") or 0
+            colunas["exclusoes_lalur"][i] = dados.get("exclusoes_lalur") or 0
+            colunas["fornecedores_simples"][i] = (dados.get("percentual_fornecedores_simples") or 0) / 100
+            creditaveis = dados.get("percentual_compras_creditaveis")
+            colunas["compras_creditaveis"][i] = (100 if creditaveis is None else creditaveis) / 100
+            colunas["sublimite_simples"][i] = 1800000 if dados.get("uf") in UFS_SUBLIMITE_REDUZIDO else 3600000
+            regime_atual[i] = regime_atual_codigo(dados.get("regime_atual"))
+
+            cnae = codigo_cnae(dados.get("cnae_principal"))
+            if cnae not in por_cnae:
+                por_cnae[cnae] = len(parametros)
+                parametros.append(parametros_cnae(cnae, cnaes))
+            indices_cnae[i] = por_cnae[cnae]
+
+        return cls(regime_atual=regime_atual, cnaes=indices_cnae, parametros=parametros, **colunas)
+
+    def selecionar(self, linhas):
+        """Novo lote com as linhas pedidas (repetidas se preciso), em copias das colunas"""
+        colunas = {campo.name: getattr(self, campo.name) for campo in fields(self)}
+        colunas = {nome: valor[linhas] if isinstance(valor, np.ndarray) else valor for nome, valor in colunas.items()}
+        return PerfisEmpresas(**colunas)
+
+    def coluna_cnae(self, campo, dtype=np.float64):
+        """Parametro do CNAE de cada linha"""
+        valores = np.array([getattr(p, campo) for p in self.parametros], dtype=dtype)
+        return valores[self.cnaes]
+
+
+@dataclass
+class ResultadoRegime:
+    elegivel: np.ndarray
+    imposto_bruto: np.ndarray
+    creditos: np.ndarray
+    imposto_liquido: np.ndarray
+    carga_efetiva: np.ndarray            # % do faturamento
+    # Composicao do imposto liquido (somam imposto_liquido)
+    consumo_federal: np.ndarray          # PIS/COFINS (e IPI no DAS)
+    icms_iss: np.ndarray
+    ibs_cbs: np.ndarray
+    renda: np.ndarray                    # IRPJ + CSLL
+    cpp: np.ndarray
+
+
+COMPONENTES = ("consumo_federal", "icms_iss", "ibs_cbs", "renda", "cpp")
+
+
+def resultado_regime(elegivel, faturamento, bruto, creditos, **componentes):
+    """Zera as linhas inelegiveis, soma os componentes e calcula a carga efetiva"""
+    elegivel = np.broadcast_to(elegivel, faturamento.shape)
+    zerar = lambda valores: np.where(elegivel, valores, 0.0)
+    partes = {nome: zerar(componentes.get(nome, 0.0)) for nome in COMPONENTES}
+    liquido = sum(partes.values())
+    carga = np.divide(liquido * 100, faturamento, out=np.zeros_like(faturamento), where=faturamento > 0)
+    return ResultadoRegime(elegivel.copy(), zerar(bruto), zerar(creditos), liquido, carga, **partes)
+
+
+def irpj_csll(base_irpj, base_csll, aliquotas):
+    """IRPJ (normal + adicional sobre o excedente anual) e CSLL"""
+    irpj = aliquotas["irpj"]
+    adicional = np.maximum(0.0, base_irpj - (irpj.get("base_adicional_anual") or BASE_ADICIONAL_IRPJ))
+    return base_irpj * irpj["normal"] + adicional * irpj["adicional"], base_csll * aliquotas["csll"]
+
+
+def aliquota_cpp(regras):
+    inss = regras["outros_tributos"]["inss_patronal"]
+    terceiros = inss.get("terceiros") or {}
+    return ((inss.get("aliquota_padrao") or 0.20) + ((inss.get("rat") or {}).get("grau_2") or 0.02)
+            + (terceiros.get("salario_educacao") or 0.025) + (terceiros.get("incra") or 0.002)
+            + (terceiros.get("sesi_senai") or 0.015) + (terceiros.get("outras") or 0.016))
+
+
+def icms_estimado(regras, faturamento, cmv_anual, servico):
+    """(debito, credito) de ICMS para quem nao e servico"""
+    icms = regras["icms"]
+    debito = np.where(servico, 0.0, faturamento * (icms.get("aliquota_interna_media") or 0.18))
+    credito = np.where(servico, 0.0, cmv_anual * (icms.get("credito_estimado") or 0.12))
+    return debito, credito
+
+
+# ============================================================================
+# SIMPLES NACIONAL
+# ============================================================================
+
+@dataclass
+class TabelaSimples:
+    limites: np.ndarray          # [anexo, faixa]
+    aliquotas: np.ndarray
+    deducoes: np.ndarray
+    share_federal: np.ndarray    # [anexo]
+    share_icms_iss: np.ndarray
+    share_renda: np.ndarray      # IRPJ + CSLL
+    share_cpp: np.ndarray
+    tem_iss: np.ndarray
+    cpp_separado: np.ndarray
+
+    @classmethod
+    def de_regras(cls, regras):
+        anexos = [regras["simples_nacional"]["anexos"][nome] for nome in ANEXOS_SIMPLES]
+        faixa = lambda campo: np.array([[f[campo] for f in anexo["faixas"]] for anexo in anexos], dtype=np.float64)
+        distribuicao = [anexo.get("distribuicao_tributos") or {} for anexo in anexos]
+        icms_iss = np.array([(d.get("icms") or 0) + (d.get("iss") or 0) for d in distribuicao])
+        return cls(
+            limites=faixa("limite"), aliquotas=faixa("aliquota"), deducoes=faixa("deducao"),
+            share_federal=1 - icms_iss, share_icms_iss=icms_iss,
+            share_renda=np.array([(d.get("irpj") or 0) + (d.get("csll") or 0) for d in distribuicao]),
+            share_cpp=np.array([d.get("cpp") or 0 for d in distribuicao]),
+            tem_iss=np.array([bool(d.get("iss")) for d in distribuicao]),
+            cpp_separado=np.array([(a.get("cpp_aliquota") or 0.20) if a.get("cpp_separado") else 0.0
+                                   for a in anexos]),
+        )
+
+
+@dataclass
+class ResultadoSimples(ResultadoRegime):
+    motivo: np.ndarray           # SIMPLES_ELEGIVEL / SIMPLES_FATURAMENTO / SIMPLES_CNAE
+    anexo: np.ndarray
+    fator_r: np.ndarray
+    aliquota_efetiva: np.ndarray
+    hibrido: np.ndarray
+
+
+def calcular_simples(perfis, regras=None):
+    regras = regras or carregar_regras()
+    tabela = TabelaSimples.de_regras(regras)
+    fat = perfis.faturamento_anual
+    limite = regras["simples_nacional"].get("limite_faturamento_anual") or 4800000
+
+    motivo = np.where(fat > limite, SIMPLES_FATURAMENTO,
+                      np.where(perfis.coluna_cnae("simples_permitido", bool), SIMPLES_ELEGIVEL, SIMPLES_CNAE))
+
+    # Anexo e Fator R (ex.: Anexo V vai para o III com folha >= 28% da receita)
+    fator_r = np.divide(perfis.folha_anual, fat, out=np.zeros_like(fat), where=fat > 0)
+    alternativo = perfis.coluna_cnae("anexo_fator_r", np.int64)
+    anexo = np.where((alternativo >= 0) & (fator_r >= perfis.coluna_cnae("fator_r_minimo")),
+                     alternativo, perfis.coluna_cnae("anexo_padrao", np.int64))
+
+    # Faixa: a primeira cujo limite cobre o faturamento, ou a ultima
+    limites = tabela.limites[anexo]
+    faixa = np.minimum((limites < fat[:, None]).sum(axis=1), limites.shape[1] - 1)
+    nominal = tabela.aliquotas[anexo, faixa]
+    aliquota = np.divide(np.maximum(0.0, fat * nominal - tabela.deducoes[anexo, faixa]), fat,
+                         out=np.zeros_like(fat), where=fat > 0)
+
+    # Acima do sublimite (hibrido) ICMS/ISS saem do DAS e sao apurados por fora
+    hibrido = fat > perfis.sublimite_simples
+    share_federal = tabela.share_federal[anexo]
+    share_icms_iss = tabela.share_icms_iss[anexo]
+    tem_iss = tabela.tem_iss[anexo]
+    federal = fat * aliquota * np.where(hibrido, share_federal, 1.0)
+    iss_externo = fat * (regras["iss"].get("aliquota_maxima") or 0.05)
+    icms_debito, icms_credito = icms_estimado(regras, fat, perfis.cmv_anual, tem_iss)
+    externo = np.where(hibrido, np.where(tem_iss, iss_externo, np.maximum(0.0, icms_debito - icms_credito)), 0.0)
+    creditos = np.where(hibrido, icms_credito, 0.0)
+    icms_debito_hibrido = np.where(hibrido, icms_debito, 0.0)
+
+    cpp_separado = perfis.folha_anual * tabela.cpp_separado[anexo]
+    das_cheio = np.where(hibrido, federal / share_federal, federal)
+    bruto = federal + cpp_separado + np.where(hibrido, np.where(icms_debito_hibrido > 0, icms_debito_hibrido, externo),
+                                              das_cheio * share_icms_iss)
+
+    # Reparte o DAS pela distribuicao do anexo; ICMS/ISS do hibrido sao os apurados por fora
+    icms_iss = np.where(hibrido, externo, das_cheio * share_icms_iss)
+    renda = das_cheio * tabela.share_renda[anexo]
+    cpp = das_cheio * tabela.share_cpp[anexo] + cpp_separado
+    consumo_federal = federal - np.where(hibrido, 0.0, das_cheio * share_icms_iss) - renda - das_cheio * tabela.share_cpp[anexo]
+
+    base = resultado_regime(motivo == SIMPLES_ELEGIVEL, fat, bruto, creditos, consumo_federal=consumo_federal,
+                            icms_iss=icms_iss, renda=renda, cpp=cpp)
+    return ResultadoSimples(**vars(base), motivo=motivo, anexo=anexo, fator_r=fator_r,
+                            aliquota_efetiva=aliquota, hibrido=hibrido)
+
+
+# ============================================================================
+# LUCRO PRESUMIDO / LUCRO REAL
+# ============================================================================
+
+def calcular_presumido(perfis, regras=None):
+    regras = regras or carregar_regras()
+    lp = regras["lucro_presumido"]
+    fat = perfis.faturamento_anual
+    presuncao_irpj = perfis.coluna_cnae("presuncao_irpj")
+
+    irpj, csll = irpj_csll(fat * presuncao_irpj, fat * perfis.coluna_cnae("presuncao_csll"), lp["aliquotas"])
+    pis_cofins = fat * ((lp["aliquotas"]["pis"].get("aliquota") or 0.0065)
+                        + (lp["aliquotas"]["cofins"].get("aliquota") or 0.03))
+
+    servico = presuncao_irpj >= 0.16  # aproximacao do motor TS: transporte de passageiros ou servico
+    iss = np.where(servico, fat * (regras["iss"].get("aliquota_padrao") or 0.05), 0.0)
+    icms_debito, icms_credito = icms_estimado(regras, fat, perfis.cmv_anual, servico)
+    icms_liquido = np.maximum(0.0, icms_debito - icms_credito)
+    cpp = perfis.folha_anual * aliquota_cpp(regras)
+
+    elegivel = fat <= (lp.get("limite_faturamento_anual") or 78000000)
+    bruto = irpj + csll + pis_cofins + icms_debito + iss + cpp
+    return resultado_regime(elegivel, fat, bruto, icms_credito, consumo_federal=pis_cofins,
+                            icms_iss=icms_liquido + iss, renda=irpj + csll, cpp=cpp)
+
+
+def lucro_estimado(perfis):
+    return perfis.faturamento_anual - perfis.despesas_com_credito - perfis.despesas_sem_credito
+
+
+def calcular_real(perfis, regras=None):
+    regras = regras or carregar_regras()
+    lr = regras["lucro_real"]["aliquotas"]
+    fat = perfis.faturamento_anual
+    servico = perfis.coluna_cnae("servico_alto", bool)
+
+    contabil = np.where(np.isnan(perfis.lucro_liquido), lucro_estimado(perfis), perfis.lucro_liquido)
+    lucro_real = np.maximum(0.0, contabil + perfis.adicoes_lalur - perfis.exclusoes_lalur)
+    irpj, csll = irpj_csll(lucro_real, lucro_real, lr)
+
+    # PIS/COFINS nao-cumulativo: credito sobre as despesas que geram credito
+    aliquota_pis = lr["pis"].get("aliquota") or 0.0165
+    aliquota_cofins = lr["cofins"].get("aliquota") or 0.076
+    debito_pis_cofins = fat * (aliquota_pis + aliquota_cofins)
+    credito_pis, credito_cofins = perfis.despesas_com_credito * aliquota_pis, perfis.despesas_com_credito * aliquota_cofins
+    pis_cofins = np.maximum(0.0, fat * aliquota_pis - credito_pis) + np.maximum(0.0, fat * aliquota_cofins - credito_cofins)
+
+    iss = np.where(servico, fat * (regras["iss"].get("aliquota_padrao") or 0.05), 0.0)
+    icms_debito, icms_credito = icms_estimado(regras, fat, perfis.cmv_anual, servico)
+    icms_liquido = np.maximum(0.0, icms_debito - icms_credito)
+    cpp = perfis.folha_anual * aliquota_cpp(regras)
+
+    bruto = irpj + csll + debito_pis_cofins + icms_debito + iss + cpp
+    return resultado_regime(True, fat, bruto, credito_pis + credito_cofins + icms_credito, consumo_federal=pis_cofins,
+                            icms_iss=icms_liquido + iss, renda=irpj + csll, cpp=cpp)
+
+
+# ============================================================================
+# REFORMA TRIBUTARIA (IBS/CBS)
+# ============================================================================
+
+def aliquota_ibs_cbs(ano, regras=None):
+    """CBS + IBS do ano, sem reducao setorial"""
+    if ano >= 2033:
+        return ALIQUOTA_IBS_CBS_PADRAO
+    transicao = (regras or carregar_regras())["reforma_tributaria"]["transicao"][str(ano)]
+    return transicao["cbs"] + transicao["ibs"]
+
+
+def fator_credito(perfis):
+    """Parcela da aliquota cheia recuperada nas compras (fornecedor do Simples credita ~7%)"""
+    simples = perfis.fornecedores_simples
+    proporcao = ALIQUOTA_CREDITO_SIMPLES / ALIQUOTA_IBS_CBS_PADRAO
+    return ((1 - simples) + simples * proporcao) * perfis.compras_creditaveis
+
+
+def calcular_reforma(perfis, ano=2033, regras=None):
+    fat = perfis.faturamento_anual
+    aliquota = aliquota_ibs_cbs(ano, regras) * (1 - perfis.coluna_cnae("reducao_setorial"))
+
+    debito = fat * aliquota
+    credito = perfis.despesas_com_credito * aliquota * fator_credito(perfis)
+    ibs_cbs = np.maximum(0.0, debito - credito)
+
+    # IRPJ/CSLL continuam sobre o lucro estimado
+    lucro = np.maximum(0.0, lucro_estimado(perfis))
+    irpj = lucro * 0.15 + np.maximum(0.0, lucro - BASE_ADICIONAL_IRPJ) * 0.10
+    csll = lucro * 0.09
+    return resultado_regime(True, fat, debito + irpj + csll, credito, ibs_cbs=ibs_cbs, renda=irpj + csll)
+
+
+# ============================================================================
+# COMPARACAO
+# ============================================================================
+
+@dataclass
+class ComparacaoRegimes:
+    perfis: PerfisEmpresas
+    simples: ResultadoSimples
+    presumido: ResultadoRegime
+    real: ResultadoRegime
+    reforma_2027: ResultadoRegime
+    reforma_2033: ResultadoRegime
+    melhor_atual: np.ndarray         # indice em REGIMES_ATUAIS
+    menor_imposto_atual: np.ndarray
+    economia_atual: np.ndarray
+    economia_reforma: np.ndarray
+
+
+def comparar_regimes(perfis, regras=None):
+    """
+    Calcula todos os regimes e escolhe o melhor atual. As economias sao medidas
+    contra o regime atual da empresa (o que o relatorio apresenta); sem regime
+    atual conhecido e elegivel, contra o segundo melhor, como no motor TS.
+    """
+    regras = regras or carregar_regras()
+    simples = calcular_simples(perfis, regras)
+    presumido = calcular_presumido(perfis, regras)
+    real = calcular_real(perfis, regras)
+    reforma_2027 = calcular_reforma(perfis, 2027, regras)
+    reforma_2033 = calcular_reforma(perfis, 2033, regras)
+
+    regimes = (simples, presumido, real)
+    impostos = np.stack([np.where(r.elegivel, r.imposto_liquido, np.inf) for r in regimes], axis=1)
+    ordem = np.argsort(impostos, axis=1, kind="stable")
+    linhas = np.arange(len(perfis))
+    melhor = ordem[:, 0]
+    menor = impostos[linhas, melhor]
+    segundo = impostos[linhas, ordem[:, 1]]
+
+    atual = perfis.regime_atual.astype(np.int64)
+    imposto_atual = np.where(atual >= 0, impostos[linhas, np.maximum(atual, 0)], np.inf)
+    referencia = np.where(np.isfinite(imposto_atual), imposto_atual, np.where(np.isfinite(segundo), segundo, menor))
+
+    return ComparacaoRegimes(
+        perfis=perfis, simples=simples, presumido=presumido, real=real,
+        reforma_2027=reforma_2027, reforma_2033=reforma_2033,
+        melhor_atual=melhor, menor_imposto_atual=menor,
+        economia_atual=referencia - menor,
+        economia_reforma=np.maximum(0.0, referencia - reforma_2033.imposto_liquido),
+    )
+
+
+def motivo_simples(comparacao, i):
+    perfis = comparacao.perfis
+    motivo = comparacao.simples.motivo[i]
+    if motivo == SIMPLES_FATURAMENTO:
+        return f"Faturamento ({formatar_reais(perfis.faturamento_anual[i])}) excede o limite de R$ 4,8 milhoes"
+    if motivo == SIMPLES_CNAE:
+        return f"Atividade impeditiva ao Simples Nacional: {perfis.parametros[perfis.cnaes[i]].motivo_vedacao}"
+    simples = comparacao.simples
+    texto = f"Anexo {ANEXOS_SIMPLES[simples.anexo[i]]}, aliquota efetiva {simples.aliquota_efetiva[i] * 100:.2f}%"
+    return texto + (" (hibrido: ICMS/ISS fora do DAS)" if simples.hibrido[i] else "")
+
+
+def resultados_relatorio(comparacao):
+    """Um dict no formato RESULTADOS do relatorio para cada linha"""
+    saida = []
+    valor = lambda array, i: round(float(array[i]), 2)
+    for i in range(len(comparacao.perfis)):
+        cenarios = {}
+        for nome in ("simples", "presumido", "real", "reforma_2027", "reforma_2033"):
+            regime = getattr(comparacao, nome)
+            elegivel = bool(regime.elegivel[i])
+            cenarios[nome] = {
+                "elegivel": elegivel,
+                "imposto_anual": valor(regime.imposto_liquido, i) if elegivel else None,
+                "carga_efetiva": valor(regime.carga_efetiva, i) if elegivel else None,
+                "creditos": valor(regime.creditos, i) if elegivel else None,
+            }
+        cenarios["simples"]["motivo"] = motivo_simples(comparacao, i)
+        saida.append({
+            **cenarios,
+            "melhor_atual": NOMES_REGIMES[REGIMES_ATUAIS[comparacao.melhor_atual[i]]],
+            "economia_atual": valor(comparacao.economia_atual, i),
+            "economia_reforma": valor(comparacao.economia_reforma, i),
+        })
+    return saida
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def perfis_sinteticos(quantidade, semente=7):
+    """Empresas aleatorias em torno da empresa modelo, para medir throughput"""
+    from gerar_relatorio_tributario import DADOS_EMPRESA
+
+    rng = np.random.default_rng(semente)
+    cnaes = list(carregar_cnaes()) + [codigo_cnae(DADOS_EMPRESA["cnae_principal"])]
+    regimes = ["Simples Nacional", "Lucro Presumido", "Lucro Real"]
+    escalas = rng.lognormal(0.0, 0.8, quantidade)
+    saida = []
+    for i in range(quantidade):
+        dados = json.loads(json.dumps(DADOS_EMPRESA))
+        dados["cnae_principal"] = cnaes[rng.integers(len(cnaes))]
+        dados["regime_atual"] = regimes[rng.integers(3)]
+        dados["faturamento_mensal"] = round(DADOS_EMPRESA["faturamento_mensal"] * escalas[i], 2)
+        dados["faturamento_anual"] = round(dados["faturamento_mensal"] * 12, 2)
+        for grupo in ("despesas_com_credito", "despesas_sem_credito"):
+            dados[grupo] = {k: round(v * escalas[i] * rng.uniform(0.6, 1.4), 2) for k, v in dados[grupo].items()}
+        dados["percentual_fornecedores_simples"] = int(rng.integers(0, 80))
+        saida.append(dados)
+    return saida
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Calcula Simples, Presumido, Real e Reforma para empresas")
+    parser.add_argument("perfis", nargs="?", help="NDJSON com os dados de cada empresa (ou {\"dados\": {...}})")
+    parser.add_argument("--saida", help="grava um NDJSON com {dados, resultados} por empresa")
+    parser.add_argument("--exemplo", type=int, metavar="N", help="calcula N empresas sinteticas e mede o tempo")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.exemplo:
+        lista = perfis_sinteticos(args.exemplo)
+    elif args.perfis:
+        with open(args.perfis, "r", encoding="utf-8") as f:
+            lista = [json.loads(linha) for linha in f if linha.strip()]
+        lista = [item.get("dados", item) for item in lista]
+    else:
+        from gerar_relatorio_tributario import DADOS_EMPRESA
+        lista = [DADOS_EMPRESA]
+
+    inicio = time.perf_counter()
+    perfis = PerfisEmpresas.de_dados(lista)
+    montagem = time.perf_counter() - inicio
+    comparacao = comparar_regimes(perfis)
+    calculo = time.perf_counter() - inicio - montagem
+    resultados = resultados_relatorio(comparacao)
+
+    if args.saida:
+        # O NDJSON alimenta o gerar_relatorios_lote: leva tambem a transicao e a
+        # sensibilidade das secoes 5 e 6. calculo_relatorio importa este modulo.
+        from calculo_relatorio import calcular_resultados
+        resultados = calcular_resultados(lista, comparacao=comparacao)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            for dados, resultado in zip(lista, resultados):
+                f.write(json.dumps({"dados": dados, "resultados": resultado}, ensure_ascii=False) + "\n")
+        print(f"{len(resultados)} empresas -> {args.saida}")
+    elif len(resultados) == 1:
+        print(json.dumps(resultados[0], indent=2, ensure_ascii=False))
+
+    contagem = {NOMES_REGIMES[r]: int((comparacao.melhor_atual == i).sum()) for i, r in enumerate(REGIMES_ATUAIS)}
+    print(f"{len(perfis)} empresas: perfis em {montagem:.3f}s, calculo vetorizado em {calculo:.3f}s "
+          f"({len(perfis) / calculo if calculo > 0 else 0:,.0f} empresas/s)", file=sys.stderr)
+    print(f"Melhor regime atual: {contagem}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
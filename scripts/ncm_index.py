@@ -0,0 +1,198 @@
+"""
+In-memory NCM/NBS -> annex index over the anexos data.
+
+Codes are kept in one sorted list with a parallel list of annex tuples, so:
+  - exact lookups are a dict hit (bisect on the sorted list for prefixes)
+  - chapter/heading prefix queries ("0201", "020130") are two bisects plus
+    the size of the answer
+  - hierarchical matches also pick up annex entries registered at chapter
+    or heading level for a full 8-digit NCM
+  - lookup_many() resolves a whole column of NCMs in one call
+
+Usage:
+    python scripts/ncm_index.py 02013000 0201 --dump anexos_dump.json
+    python scripts/ncm_index.py --bench --queries 200000
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from gov_tax_data import load_dump
+
+_NON_DIGITS = re.compile(r"\D")
+# Sorts right after every digit, so prefix + _PREFIX_END bounds a prefix range
+_PREFIX_END = ":"
+
+
+def normalize_code(code) -> str:
+    """'0201.30.00' / 2013000 -> '02013000'. Integers lose the leading zero, so pad NCMs to 8 digits."""
+    if isinstance(code, int):
+        return f"{code:08d}"
+    return _NON_DIGITS.sub("", str(code or ""))
+
+
+class NcmAnnexIndex:
+    def __init__(self, entries: Iterable[Tuple[str, int, Optional[str]]]):
+        by_code: Dict[str, set] = {}
+        by_annex: Dict[int, set] = {}
+        self.kinds: Dict[str, str] = {}
+        for code, annex, kind in entries:
+            by_code.setdefault(code, set()).add(annex)
+            by_annex.setdefault(annex, set()).add(code)
+            if kind:
+                self.kinds[code] = kind
+        self.codes: List[str] = sorted(by_code)
+        self.annexes: List[Tuple[int, ...]] = [tuple(sorted(by_code[c])) for c in self.codes]
+        self._exact: Dict[str, Tuple[int, ...]] = dict(zip(self.codes, self.annexes))
+        self._by_annex: Dict[int, List[str]] = {a: sorted(codes) for a, codes in by_annex.items()}
+        self._lengths = sorted({len(code) for code in self.codes})
+
+    @classmethod
+    def from_items(cls, items: Iterable[Dict[str, Any]], tipo: Optional[str] = None) -> "NcmAnnexIndex":
+        """Builds from raw anexos items (nroAnexo/codNcmNbs/TipoAnexo); tipo='NCM' or 'NBS' filters."""
+        def entries():
+            for item in items:
+                if not isinstance(item, dict) or item.get("nroAnexo") is None:
+                    continue
+                kind = item.get("TipoAnexo")
+                if tipo and kind != tipo:
+                    continue
+                code = normalize_code(item.get("codNcmNbs"))
+                if code:
+                    yield code, int(item["nroAnexo"]), kind
+        return cls(entries())
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def lookup(self, code) -> Tuple[int, ...]:
+        """Annexes listing exactly this code."""
+        return self._exact.get(normalize_code(code), ())
+
+    def prefix(self, prefix) -> List[Tuple[str, Tuple[int, ...]]]:
+        """(code, annexes) for every code under a chapter/heading/subheading prefix."""
+        prefix = normalize_code(prefix)
+        start = bisect_left(self.codes, prefix)
+        end = bisect_left(self.codes, prefix + _PREFIX_END, start)
+        return list(zip(self.codes[start:end], self.annexes[start:end]))
+
+    def annexes_under(self, prefix) -> Tuple[int, ...]:
+        """Annexes with at least one code under the prefix."""
+        return tuple(sorted({a for _, annexes in self.prefix(prefix) for a in annexes}))
+
+    def match(self, code) -> Tuple[int, ...]:
+        """
+        Annexes that apply to a code: exact entries plus entries registered at
+        a shorter (chapter/heading) level that prefix it.
+        """
+        code = normalize_code(code)
+        found = set()
+        for length in self._lengths:
+            if length > len(code):
+                break
+            found.update(self._exact.get(code[:length], ()))
+        return tuple(sorted(found))
+
+    def lookup_many(self, codes: Sequence, hierarchical: bool = False) -> List[Tuple[int, ...]]:
+        """Resolves a column of codes at once; repeated codes are resolved only once."""
+        resolve = self.match if hierarchical else self.lookup
+        cache: Dict[Any, Tuple[int, ...]] = {}
+        result = []
+        for code in codes:
+            annexes = cache.get(code)
+            if annexes is None:
+                annexes = cache[code] = resolve(code)
+            result.append(annexes)
+        return result
+
+    def codes_for_annex(self, annex: int) -> List[str]:
+        return self._by_annex.get(int(annex), [])
+
+
+def linear_lookup(items: List[Dict[str, Any]], code: str) -> Tuple[int, ...]:
+    """The list-comprehension scan verify_data.py used before the index; kept for the benchmark."""
+    return tuple(sorted({a["nroAnexo"] for a in items if str(a.get("codNcmNbs", "")).strip() == code}))
+
+
+def run_benchmark(items: List[Dict[str, Any]], queries: int, scan_sample: int) -> None:
+    started = time.perf_counter()
+    index = NcmAnnexIndex.from_items(items)
+    build = time.perf_counter() - started
+
+    rng = random.Random(42)
+    codes = [rng.choice(index.codes) if rng.random() < 0.8 else f"{rng.randrange(10 ** 8):08d}"
+             for _ in range(queries)]
+
+    started = time.perf_counter()
+    for code in codes[:scan_sample]:
+        linear_lookup(items, code)
+    scan = (time.perf_counter() - started) / scan_sample
+
+    started = time.perf_counter()
+    for code in codes:
+        index.lookup(code)
+    exact = (time.perf_counter() - started) / queries
+
+    started = time.perf_counter()
+    index.lookup_many(codes, hierarchical=True)
+    bulk = (time.perf_counter() - started) / queries
+
+    started = time.perf_counter()
+    for code in codes[:scan_sample]:
+        index.prefix(code[:4])
+    prefix = (time.perf_counter() - started) / scan_sample
+
+    for code in codes[:scan_sample]:
+        assert index.lookup(code) == linear_lookup(items, code), code
+
+    print(f"Entries: {len(items)} ({len(index)} distinct codes), index built in {build * 1000:.1f} ms")
+    print(f"Linear scan:        {scan * 1e6:10.1f} us/query ({scan_sample} queries)")
+    print(f"Index exact:        {exact * 1e6:10.2f} us/query ({queries} queries)")
+    print(f"Index bulk (hier.): {bulk * 1e6:10.2f} us/query")
+    print(f"Index heading (4d): {prefix * 1e6:10.2f} us/query")
+    print(f"Speedup (exact vs scan): {scan / exact:,.0f}x")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Look up NCM/NBS codes in the annex index")
+    parser.add_argument("codes", nargs="*", help="codes or chapter/heading prefixes to look up")
+    parser.add_argument("--dump", default="anexos_dump.json", help="anexos JSON dump (default: %(default)s)")
+    parser.add_argument("--tipo", choices=["NCM", "NBS"], help="only index this annex type")
+    parser.add_argument("--bench", action="store_true", help="benchmark the index against a linear scan")
+    parser.add_argument("--queries", type=int, default=100000, help="queries for --bench (default: %(default)s)")
+    parser.add_argument("--scan-sample", type=int, default=500,
+                        help="queries timed on the slow linear scan in --bench (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    items = load_dump(args.dump)
+    if args.bench:
+        run_benchmark(items, args.queries, args.scan_sample)
+        return
+
+    index = NcmAnnexIndex.from_items(items, args.tipo)
+    if not args.codes:
+        print(f"{len(index)} codes indexed; pass codes or prefixes to look them up")
+        sys.exit(0)
+    for code in args.codes:
+        code = normalize_code(code)
+        if len(code) >= 8:
+            print(f"{code}: annexes {list(index.match(code)) or 'none'}")
+        else:
+            matches = index.prefix(code)
+            print(f"{code}*: {len(matches)} codes in annexes {list(index.annexes_under(code)) or 'none'}")
+            for match_code, annexes in matches[:10]:
+                print(f"  {match_code}: {list(annexes)}")
+            if len(matches) > 10:
+                print(f"  ... {len(matches) - 10} more")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Deterministic pre-classification from the official LC 214/2025 annexes.
+
+An NCM listed in one of the annexes (Anexo I - Cesta Básica Nacional, Anexo
+VII - alimentos com redução de 60%, ...) already determines cesta_basica and
+reducao_reforma, so those products are classified locally and only the
+remainder goes to the tax-classifier function. The reduction of each annex
+comes from the classTrib rules that reference it when the dump has them, and
+from the law otherwise.
+
+Usage:
+    python scripts/pre_classifier.py catalog.csv
+    python scripts/pre_classifier.py catalog.csv --batch-latency 6.5 --anexos anexos_dump.json
+"""
+
+import os
+import time
+import argparse
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from gov_tax_data import class_trib_row, iter_class_trib_rules, load_dump
+from ncm_index import NcmAnnexIndex, normalize_code
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ANEXOS_DUMP = os.path.join(REPO_ROOT, "anexos_dump.json")
+DEFAULT_CLASS_TRIB_DUMP = os.path.join(REPO_ROOT, "rules_dump.json")
+# Typical tax-classifier call for a full batch, used when no call was timed
+DEFAULT_BATCH_LATENCY = 5.0
+
+
+@dataclass(frozen=True)
+class AnnexRule:
+    reducao: float
+    setor: str
+    descricao: str
+    cesta_basica: bool = False
+    c_class_trib: Optional[str] = None
+
+
+# NCM annexes of LC 214/2025 and the IBS/CBS reduction they grant
+ANNEX_RULES: Dict[int, AnnexRule] = {
+    1: AnnexRule(1.0, "alimentos_basicos", "Cesta Básica Nacional de Alimentos", cesta_basica=True),
+    4: AnnexRule(0.6, "saude", "dispositivos médicos"),
+    5: AnnexRule(0.6, "saude", "dispositivos de acessibilidade"),
+    6: AnnexRule(0.6, "saude", "nutrição enteral e parenteral"),
+    7: AnnexRule(0.6, "alimentos_basicos", "alimentos destinados ao consumo humano"),
+    8: AnnexRule(0.6, "comercio", "higiene pessoal e limpeza"),
+    9: AnnexRule(0.6, "outros", "insumos agropecuários e aquícolas"),
+    10: AnnexRule(0.6, "outros", "produções nacionais artísticas e culturais"),
+    11: AnnexRule(0.6, "outros", "soberania e segurança nacional"),
+    12: AnnexRule(1.0, "saude", "dispositivos médicos (alíquota zero)"),
+    13: AnnexRule(1.0, "saude", "dispositivos de acessibilidade (alíquota zero)"),
+    14: AnnexRule(1.0, "saude", "medicamentos (alíquota zero)"),
+    15: AnnexRule(1.0, "alimentos_basicos", "produtos hortícolas, frutas e ovos"),
+}
+
+
+def annex_rules_from_class_trib(items, on: Optional[date] = None) -> Dict[int, AnnexRule]:
+    """ANNEX_RULES with the reduction and cClassTrib taken from rules that reference the annex."""
+    rules = dict(ANNEX_RULES)
+    day = (on or date.today()).isoformat()
+    for rule in iter_class_trib_rules(items):
+        row = class_trib_row(rule)
+        if row is None or row["anexo"] not in rules or row["p_red_ibs"] is None:
+            continue
+        if (row["inicio_vigencia"] or "") > day or (row["fim_vigencia"] and row["fim_vigencia"][:10] < day):
+            continue
+        base = rules[row["anexo"]]
+        reducao = round(row["p_red_ibs"] / 100, 4)
+        if base.c_class_trib is None or reducao > base.reducao:
+            rules[row["anexo"]] = AnnexRule(reducao, base.setor, base.descricao, base.cesta_basica,
+                                            row["c_class_trib"])
+    return rules
+
+
+class PreClassifier:
+    def __init__(self, index: NcmAnnexIndex, rules: Dict[int, AnnexRule] = ANNEX_RULES):
+        self.index = index
+        self.rules = rules
+        self.stats = {"local": 0, "forwarded": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_dumps(cls, anexos_path: str = DEFAULT_ANEXOS_DUMP,
+                   class_trib_path: Optional[str] = DEFAULT_CLASS_TRIB_DUMP) -> "PreClassifier":
+        index = NcmAnnexIndex.from_items(load_dump(anexos_path), "NCM")
+        rules = ANNEX_RULES
+        if class_trib_path and os.path.exists(class_trib_path):
+            rules = annex_rules_from_class_trib(load_dump(class_trib_path))
+        return cls(index, rules)
+
+    def classify(self, produto: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Record for a product whose NCM is listed in an annex, None when the model has to decide."""
+        ncm = normalize_code(produto.get("ncm"))
+        if len(ncm) != 8:
+            return None
+        matches = [(annex, self.rules[annex]) for annex in self.index.lookup(ncm) if annex in self.rules]
+        if not matches:
+            return None
+        # An NCM in several annexes (e.g. I and VII) takes the largest reduction
+        annex, rule = max(matches, key=lambda match: (match[1].reducao, match[1].cesta_basica))
+        return {
+            **produto,
+            "classificacao": {
+                "setor": rule.setor,
+                "cesta_basica": rule.cesta_basica,
+                "reducao_reforma": rule.reducao,
+                "icms_substituicao": None,
+                "anexo_simples_sugerido": None,
+                "unidade_venda_sugerida": None,
+                "unit_type": None,
+                "conversion_factor": None,
+                "sugestao_economia": None,
+                "anexo_lc214": annex,
+                "c_class_trib": rule.c_class_trib,
+            },
+            "motivo": f"NCM listado no Anexo {annex} da LC 214/2025 ({rule.descricao})",
+            "source": "governo",
+            "local": True,
+        }
+
+    def split(self, produtos: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """(records resolved locally, products to forward to tax-classifier)."""
+        started = time.perf_counter()
+        resolved, forward = [], []
+        for produto in produtos:
+            record = self.classify(produto)
+            if record is None:
+                forward.append(produto)
+            else:
+                resolved.append(record)
+        self.stats["local"] += len(resolved)
+        self.stats["forwarded"] += len(forward)
+        self.stats["seconds"] += time.perf_counter() - started
+        return resolved, forward
+
+    def summary(self, batch_latency: float = DEFAULT_BATCH_LATENCY, batch_size: int = 50) -> Dict[str, Any]:
+        """Local share and the model-call time it avoids, both per thousand products."""
+        total = self.stats["local"] + self.stats["forwarded"]
+        share = self.stats["local"] / total if total else 0.0
+        return {
+            "products": total,
+            "resolved_locally": self.stats["local"],
+            "forwarded": self.stats["forwarded"],
+            "local_share": round(share, 4),
+            "local_ms_per_1000": round(self.stats["seconds"] / total * 1e6, 2) if total else None,
+            # Call time avoided, summed over calls (before any concurrency)
+            "call_seconds_saved_per_1000": round(share * 1000 / batch_size * batch_latency, 1),
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how much of a catalog the annexes classify locally")
+    parser.add_argument("input", help="catalog file (.csv or .ndjson/.jsonl)")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--anexos", default=DEFAULT_ANEXOS_DUMP, help="anexos dump (default: %(default)s)")
+    parser.add_argument("--class-trib", default=DEFAULT_CLASS_TRIB_DUMP, help="classTrib dump (default: %(default)s)")
+    parser.add_argument("--batch-latency", type=float, default=DEFAULT_BATCH_LATENCY,
+                        help="seconds per tax-classifier call of 50 products (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from classify_catalog import MAX_BATCH_SIZE, batched, read_products
+
+    args = parse_args(argv)
+    pre = PreClassifier.from_dumps(args.anexos, args.class_trib)
+    by_annex: Dict[int, int] = {}
+    for chunk in batched(read_products(args.input, args.format), 1000):
+        resolved, _ = pre.split(chunk)
+        for record in resolved:
+            annex = record["classificacao"]["anexo_lc214"]
+            by_annex[annex] = by_annex.get(annex, 0) + 1
+
+    summary = pre.summary(args.batch_latency, MAX_BATCH_SIZE)
+    print(f"Products: {summary['products']}")
+    print(f"Resolved locally: {summary['resolved_locally']} ({summary['local_share']:.1%})")
+    for annex, count in sorted(by_annex.items()):
+        print(f"  Anexo {annex:>2} ({pre.rules[annex].descricao}): {count}")
+    print(f"Forwarded to tax-classifier: {summary['forwarded']}")
+    print(f"Local classification: {summary['local_ms_per_1000']} ms per 1000 products")
+    print(f"Call time saved: {summary['call_seconds_saved_per_1000']} s per 1000 products "
+          f"(at {args.batch_latency}s per {MAX_BATCH_SIZE}-product call)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sensibilidade da carga tributaria ao mix de despesas e aos fornecedores do Simples
+
+Responde perguntas como "e se 20% das compras forem para fornecedores do regime
+regular?" ou "e se o CMV crescer 10%?". Cada cenario e uma copia da empresa
+base com os fatores alterados:
+  - fornecedores_simples: % das compras de fornecedores do Simples (valor absoluto)
+  - faturamento e cada despesa com credito (cmv, aluguel, ...): multiplicadores
+
+Os cenarios vem de uma grade (produto cartesiano dos valores de cada fator) ou
+de amostras aleatorias (Monte Carlo) e sao todos calculados numa unica chamada
+do motor_regimes. A saida sao as faixas de percentis da carga e das economias.
+Quando o faturamento ou as despesas mudam, um lucro_liquido informado e
+ajustado pela mesma diferenca.
+
+Distribuicoes (--dist nome=tipo:parametros):
+    uniforme:min:max   normal:media:desvio   triangular:min:moda:max
+
+Execute:
+    python scripts/sensibilidade.py                                        # Monte Carlo padrao, empresa modelo
+    python scripts/sensibilidade.py --grade fornecedores_simples=0:80:9
+    python scripts/sensibilidade.py --grade fornecedores_simples=15,35 cmv=0.9:1.1:3
+    python scripts/sensibilidade.py --amostras 100000 --dist cmv=normal:1.1:0.05 --csv cenarios.csv
+"""
+
+import sys
+import csv
+import json
+import time
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+
+from motor_regimes import (ALIQUOTA_CREDITO_SIMPLES, ALIQUOTA_IBS_CBS_PADRAO, DESPESAS_COM_CREDITO, NOMES_REGIMES,
+                           REGIMES_ATUAIS, PerfisEmpresas, comparar_regimes, formatar_reais)
+from simulador_transicao import regime_base
+
+FATORES = ("fornecedores_simples", "faturamento") + DESPESAS_COM_CREDITO
+PERCENTIS = (5, 25, 50, 75, 95)
+AMOSTRAS_PADRAO = 100000
+# Pontos da tabela de sensibilidade do relatorio (% de compras do Simples)
+PONTOS_FORNECEDORES = (0, 20, 40, 60, 80)
+
+
+# ============================================================================
+# CENARIOS
+# ============================================================================
+
+def despesas_por_linha(lista_dados):
+    """[empresas, DESPESAS_COM_CREDITO] com os valores anuais de cada despesa"""
+    return np.array([[((dados.get("despesas_com_credito") or {}).get(k) or 0) * 12 for k in DESPESAS_COM_CREDITO]
+                     for dados in lista_dados], dtype=np.float64).reshape(len(lista_dados), len(DESPESAS_COM_CREDITO))
+
+
+def variar(perfis, linhas, valores, despesas=None):
+    """
+    Repete as empresas base (indices em linhas) aplicando os fatores de cada
+    cenario. valores: nome do fator -> array alinhado com linhas. Multiplicar
+    despesas pede o detalhamento por linha (despesas_por_linha).
+    """
+    desconhecidos = set(valores) - set(FATORES)
+    if desconhecidos:
+        raise ValueError(f"fatores desconhecidos: {', '.join(sorted(desconhecidos))}")
+    cenarios = perfis.selecionar(linhas)
+    variacao = np.zeros(len(cenarios))
+
+    if "faturamento" in valores:
+        novo = cenarios.faturamento_anual * valores["faturamento"]
+        variacao += novo - cenarios.faturamento_anual
+        cenarios.faturamento_anual = novo
+
+    multiplicadores = [valores.get(nome) for nome in DESPESAS_COM_CREDITO]
+    if any(m is not None for m in multiplicadores):
+        if despesas is None:
+            raise ValueError("variar despesas pede o detalhamento de despesas_por_linha()")
+        fatores = np.ones((len(cenarios), len(DESPESAS_COM_CREDITO)))
+        for j, multiplicador in enumerate(multiplicadores):
+            if multiplicador is not None:
+                fatores[:, j] = multiplicador
+        por_linha = despesas[linhas] * fatores
+        nova = por_linha.sum(axis=1)
+        variacao -= nova - cenarios.despesas_com_credito
+        cenarios.despesas_com_credito = nova
+        cenarios.cmv_anual = por_linha[:, DESPESAS_COM_CREDITO.index("cmv")]
+
+    if "fornecedores_simples" in valores:
+        fornecedores = np.empty(len(cenarios))
+        fornecedores[:] = valores["fornecedores_simples"]
+        cenarios.fornecedores_simples = np.clip(fornecedores / 100, 0, 1)
+
+    cenarios.lucro_liquido = cenarios.lucro_liquido + variacao  # NaN (estimado) continua NaN
+    return cenarios
+
+
+def perda_creditos_simples(perfis):
+    """IBS/CBS 2033 que deixa de ser creditado por comprar de fornecedores do Simples"""
+    aliquota = ALIQUOTA_IBS_CBS_PADRAO * (1 - perfis.coluna_cnae("reducao_setorial"))
+    perda_relativa = 1 - ALIQUOTA_CREDITO_SIMPLES / ALIQUOTA_IBS_CBS_PADRAO
+    return perfis.despesas_com_credito * aliquota * perfis.fornecedores_simples * perda_relativa \
+        * perfis.compras_creditaveis
+
+
+def avaliar(perfis, regras=None, comparacao=None):
+    """Metricas de cada cenario, uma coluna por nome"""
+    comparacao = comparacao or comparar_regimes(perfis, regras)
+    linhas = np.arange(len(perfis))
+    regimes = (comparacao.simples, comparacao.presumido, comparacao.real)
+    impostos = np.stack([r.imposto_liquido for r in regimes])
+    cargas = np.stack([r.carga_efetiva for r in regimes])
+    atual = regime_base(comparacao, "atual")
+    melhor = comparacao.melhor_atual
+    return {
+        "imposto_atual": impostos[atual, linhas],
+        "carga_atual": cargas[atual, linhas],
+        "imposto_melhor": impostos[melhor, linhas],
+        "carga_melhor": cargas[melhor, linhas],
+        "imposto_2033": comparacao.reforma_2033.imposto_liquido,
+        "carga_2033": comparacao.reforma_2033.carga_efetiva,
+        "economia_atual": comparacao.economia_atual,
+        "economia_reforma": comparacao.economia_reforma,
+        "perda_creditos_simples": perda_creditos_simples(perfis),
+        "melhor_regime": melhor,
+    }
+
+
+@dataclass
+class Sensibilidade:
+    valores: dict        # fator -> array de entrada de cada cenario
+    metricas: dict       # metrica -> array de resultado de cada cenario
+
+    def __len__(self):
+        return len(self.metricas["imposto_atual"])
+
+    def faixas(self, percentis=PERCENTIS):
+        """Metrica -> {percentil: valor}"""
+        nomes = [nome for nome in self.metricas if nome != "melhor_regime"]
+        tabela = np.percentile(np.stack([self.metricas[nome] for nome in nomes]), percentis, axis=1)
+        return {nome: {p: round(float(tabela[j, i]), 2) for j, p in enumerate(percentis)}
+                for i, nome in enumerate(nomes)}
+
+    def frequencia_melhor_regime(self):
+        contagem = np.bincount(self.metricas["melhor_regime"], minlength=len(REGIMES_ATUAIS))
+        return {NOMES_REGIMES[r]: round(float(contagem[i] / len(self)), 4) for i, r in enumerate(REGIMES_ATUAIS)}
+
+    def gravar_csv(self, caminho):
+        nomes_valores, nomes_metricas = list(self.valores), list(self.metricas)
+        with open(caminho, "w", encoding="utf-8", newline="") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(nomes_valores + nomes_metricas)
+            colunas = [self.valores[n] for n in nomes_valores] + [self.metricas[n] for n in nomes_metricas]
+            for linha in zip(*colunas):
+                escritor.writerow([round(float(v), 4) if isinstance(v, np.floating) else v.item() for v in linha])
+
+
+def analisar(dados, valores, regras=None):
+    """Cenarios de uma empresa: valores fator -> array (todos do mesmo tamanho)"""
+    n = len(next(iter(valores.values()))) if valores else 1
+    perfis = PerfisEmpresas.de_dados([dados])
+    cenarios = variar(perfis, np.zeros(n, dtype=np.int64), valores, despesas_por_linha([dados]))
+    return Sensibilidade(valores, avaliar(cenarios, regras))
+
+
+def sensibilidade_fornecedores(comparacao, pontos=PONTOS_FORNECEDORES, regras=None):
+    """
+    Tabela do relatorio: para cada empresa do lote, a reforma 2033 com cada %
+    de compras do Simples em pontos. Todas as empresas x pontos numa chamada.
+    """
+    perfis = comparacao.perfis
+    linhas = np.repeat(np.arange(len(perfis)), len(pontos))
+    percentuais = np.tile(np.asarray(pontos, np.float64), len(perfis))
+    metricas = avaliar(variar(perfis, linhas, {"fornecedores_simples": percentuais}), regras)
+    valor = lambda nome, k: round(float(metricas[nome][k]), 2)
+    return [
+        [
+            {
+                "percentual": int(percentuais[k]),
+                "perda_creditos": valor("perda_creditos_simples", k),
+                "imposto_2033": valor("imposto_2033", k),
+                "carga_2033": valor("carga_2033", k),
+            }
+            for k in range(i * len(pontos), (i + 1) * len(pontos))
+        ]
+        for i in range(len(perfis))
+    ]
+
+
+# ============================================================================
+# GRADE E AMOSTRAS
+# ============================================================================
+
+def ler_grade(especificacoes):
+    """'nome=ini:fim:passos' ou 'nome=v1,v2,...' -> produto cartesiano, fator -> array"""
+    eixos = {}
+    for especificacao in especificacoes:
+        nome, _, texto = especificacao.partition("=")
+        if ":" in texto:
+            inicio, fim, passos = texto.split(":")
+            eixos[nome] = np.linspace(float(inicio), float(fim), int(passos))
+        else:
+            eixos[nome] = np.array([float(v) for v in texto.split(",")])
+    malha = np.meshgrid(*eixos.values(), indexing="ij")
+    return {nome: eixo.ravel() for nome, eixo in zip(eixos, malha)}
+
+
+def amostrar(tipo, parametros, n, rng):
+    if tipo == "uniforme":
+        return rng.uniform(parametros[0], parametros[1], n)
+    if tipo == "normal":
+        return rng.normal(parametros[0], parametros[1], n)
+    if tipo == "triangular":
+        return rng.triangular(parametros[0], parametros[1], parametros[2], n)
+    raise ValueError(f"distribuicao desconhecida: {tipo}")
+
+
+def ler_distribuicoes(especificacoes):
+    """'nome=tipo:a:b[:c]' -> {nome: (tipo, [a, b, c])}"""
+    distribuicoes = {}
+    for especificacao in especificacoes:
+        nome, _, texto = especificacao.partition("=")
+        tipo, *parametros = texto.split(":")
+        distribuicoes[nome] = (tipo, [float(p) for p in parametros])
+    return distribuicoes
+
+
+def distribuicoes_padrao(dados):
+    """Fornecedores do Simples +-20 pontos; faturamento e cada despesa informada +-10% (1 desvio)"""
+    base = dados.get("percentual_fornecedores_simples") or 0
+    distribuicoes = {
+        "fornecedores_simples": ("uniforme", [max(0, base - 20), min(100, base + 20)]),
+        "faturamento": ("normal", [1.0, 0.1]),
+    }
+    com = dados.get("despesas_com_credito") or {}
+    distribuicoes.update({nome: ("normal", [1.0, 0.1]) for nome in DESPESAS_COM_CREDITO if com.get(nome)})
+    return distribuicoes
+
+
+def gerar_amostras(distribuicoes, n, semente=None):
+    rng = np.random.default_rng(semente)
+    valores = {nome: amostrar(tipo, parametros, n, rng) for nome, (tipo, parametros) in distribuicoes.items()}
+    # Multiplicadores negativos nao fazem sentido (cauda da normal)
+    return {nome: v if nome == "fornecedores_simples" else np.maximum(v, 0.0) for nome, v in valores.items()}
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def imprimir_faixas(sensibilidade):
+    print(f"{'Metrica':<24}" + "".join(f"{'P' + str(p):>18}" for p in PERCENTIS))
+    for nome, faixa in sensibilidade.faixas().items():
+        formatar = (lambda v: f"{v:.2f}%") if nome.startswith("carga") else formatar_reais
+        print(f"{nome:<24}" + "".join(f"{formatar(faixa[p]):>18}" for p in PERCENTIS))
+    frequencia = ", ".join(f"{nome} {f:.1%}" for nome, f in sensibilidade.frequencia_melhor_regime().items())
+    print(f"Melhor regime nos cenarios: {frequencia}")
+
+
+def imprimir_grade(sensibilidade):
+    nomes = list(sensibilidade.valores)
+    print("".join(f"{nome:>22}" for nome in nomes) + f"{'Imposto atual':>18}{'Carga atual':>13}"
+          f"{'Imposto 2033':>18}{'Perda creditos':>18}")
+    metricas = sensibilidade.metricas
+    for k in range(len(sensibilidade)):
+        print("".join(f"{sensibilidade.valores[nome][k]:>22.2f}" for nome in nomes)
+              + f"{formatar_reais(metricas['imposto_atual'][k]):>18}{metricas['carga_atual'][k]:>12.2f}%"
+              f"{formatar_reais(metricas['imposto_2033'][k]):>18}{formatar_reais(metricas['perda_creditos_simples'][k]):>18}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sensibilidade da carga tributaria (grade ou Monte Carlo)")
+    parser.add_argument("--dados", help="JSON com os dados da empresa (padrao: empresa modelo do relatorio)")
+    parser.add_argument("--grade", nargs="+", metavar="FATOR=ESPEC",
+                        help="grade: fator=ini:fim:passos ou fator=v1,v2,...")
+    parser.add_argument("--dist", action="append", default=[], metavar="FATOR=TIPO:PARAMS",
+                        help="distribuicao de um fator no Monte Carlo (repetivel); sem --dist usa as padrao")
+    parser.add_argument("--amostras", type=int, default=AMOSTRAS_PADRAO,
+                        help="cenarios do Monte Carlo (padrao: %(default)s)")
+    parser.add_argument("--semente", type=int, help="semente do gerador aleatorio")
+    parser.add_argument("--csv", help="grava entradas e metricas de cada cenario")
+    parser.add_argument("--json", help="grava as faixas de percentis")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.dados:
+        with open(args.dados, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        dados = dados.get("dados", dados)
+    else:
+        from gerar_relatorio_tributario import DADOS_EMPRESA
+        dados = DADOS_EMPRESA
+
+    inicio = time.perf_counter()
+    if args.grade:
+        valores = ler_grade(args.grade)
+    else:
+        distribuicoes = ler_distribuicoes(args.dist) if args.dist else distribuicoes_padrao(dados)
+        valores = gerar_amostras(distribuicoes, args.amostras, args.semente)
+    sensibilidade = analisar(dados, valores)
+    duracao = time.perf_counter() - inicio
+
+    if args.grade and len(sensibilidade) <= 50:
+        imprimir_grade(sensibilidade)
+        print()
+    imprimir_faixas(sensibilidade)
+    print(f"{len(sensibilidade)} cenarios ({', '.join(valores)}) em {duracao:.3f}s", file=sys.stderr)
+
+    if args.csv:
+        sensibilidade.gravar_csv(args.csv)
+        print(f"Cenarios: {args.csv}", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"cenarios": len(sensibilidade), "fatores": list(valores), "faixas": sensibilidade.faixas(),
+                       "melhor_regime": sensibilidade.frequencia_melhor_regime()}, f, indent=2, ensure_ascii=False)
+        print(f"Faixas: {args.json}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servico HTTP local do Relatorio de Planejamento Tributario
+
+Recebe o perfil de uma empresa em JSON e devolve o PDF, renderizado em
+memoria num pool de processos (cada processo reaproveita as secoes fixas ja
+diagramadas, como no lote). Roda sem rede externa: so a biblioteca padrao,
+fpdf2 e numpy.
+
+Rotas:
+  POST /relatorio   corpo DADOS_EMPRESA ou {"dados": {...}, "resultados": {...}};
+                    sem resultados, o motor_regimes calcula -> application/pdf
+  GET  /metricas    requisicoes, fila, latencias (p50/p90/p99) em JSON
+  GET  /saude       {"status": "ok"}
+
+Perfis sem os campos que o relatorio le recebem 422 antes de entrar no pool;
+uma falha dentro do renderizador e 500.
+
+Capacidade: no maximo processos + fila relatorios aceitos ao mesmo tempo; acima
+disso a resposta e 503 com Retry-After (backpressure, a fila nao cresce sem
+limite). Um relatorio que passa de --timeout recebe 504; se ainda estava na
+fila ele e cancelado, se ja estava rodando a vaga so volta quando termina.
+
+Execute:
+    python scripts/servico_relatorios.py --porta 8765 --processos 4 --fila 16
+    curl -X POST --data @empresa.json http://127.0.0.1:8765/relatorio -o relatorio.pdf
+    curl http://127.0.0.1:8765/metricas
+"""
+
+import os
+import json
+import numbers
+import time
+import argparse
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from gerar_relatorio_tributario import renderizar_pdf
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MAX_CORPO = 1024 * 1024
+JANELA_LATENCIAS = 1000  # ultimas requisicoes usadas nos percentis
+
+# Secoes fixas ja diagramadas, uma copia por processo do pool
+CACHE_BLOCOS = {}
+
+
+def renderizar(perfil):
+    """Executa no processo filho: PDF em bytes e os tempos de montagem"""
+    inicio = time.perf_counter()
+    dados = perfil.get("dados", perfil)
+    tempos = {}
+    conteudo = renderizar_pdf(dados, perfil.get("resultados"), CACHE_BLOCOS, tempos)
+    return conteudo, {
+        "pid": os.getpid(),
+        "render_ms": round((time.perf_counter() - inicio) * 1000, 2),
+        "secoes_ms": {nome: round(segundos * 1000, 2) for nome, segundos in tempos.items()},
+    }
+
+
+# Campos que o relatorio le diretamente de DADOS_EMPRESA e de RESULTADOS
+CAMPOS_TEXTO = ("razao_social", "cnpj", "cnae_principal", "municipio", "uf", "regime_atual")
+CAMPOS_NUMERICOS = ("numero_funcionarios", "faturamento_mensal", "faturamento_anual",
+                    "percentual_fornecedores_simples")
+GRUPOS_DESPESAS = ("despesas_com_credito", "despesas_sem_credito")
+CENARIOS = ("simples", "presumido", "real", "reforma_2027", "reforma_2033")
+CAMPOS_CENARIO = ("elegivel", "imposto_anual", "carga_efetiva", "creditos")
+
+
+def numero(valor):
+    return isinstance(valor, numbers.Real) and not isinstance(valor, bool)
+
+
+def validar_perfil(perfil):
+    """Mensagem do primeiro problema do perfil, ou None se o relatorio pode ser montado"""
+    dados = perfil.get("dados", perfil)
+    for campo in CAMPOS_TEXTO:
+        if not isinstance(dados.get(campo), str):
+            return f"dados.{campo} ausente ou nao e texto"
+    for campo in CAMPOS_NUMERICOS:
+        if not numero(dados.get(campo)):
+            return f"dados.{campo} ausente ou nao e numero"
+    for grupo in GRUPOS_DESPESAS:
+        despesas = dados.get(grupo)
+        if not isinstance(despesas, dict) or not all(numero(v) for v in despesas.values()):
+            return f"dados.{grupo} deve ser um objeto de valores numericos"
+
+    resultados = perfil.get("resultados") if "dados" in perfil else None
+    if resultados is None:
+        return None
+    if not isinstance(resultados, dict):
+        return "resultados nao e um objeto JSON"
+    for cenario in CENARIOS:
+        valores = resultados.get(cenario)
+        if not isinstance(valores, dict) or any(campo not in valores for campo in CAMPOS_CENARIO):
+            return f"resultados.{cenario} deve ter {', '.join(CAMPOS_CENARIO)}"
+    if "motivo" not in resultados["simples"]:
+        return "resultados.simples.motivo ausente"
+    if not isinstance(resultados.get("melhor_atual"), str):
+        return "resultados.melhor_atual ausente ou nao e texto"
+    for campo in ("economia_atual", "economia_reforma"):
+        if not numero(resultados.get(campo)):
+            return f"resultados.{campo} ausente ou nao e numero"
+    return None
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+class Metricas:
+    """Contadores e latencias recentes, atualizados pelas threads do servidor"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.inicio = time.time()
+        self.contadores = {"recebidas": 0, "ok": 0, "erros": 0, "rejeitadas": 0, "timeouts": 0, "invalidas": 0}
+        self.latencias = deque(maxlen=JANELA_LATENCIAS)
+        self.renders = deque(maxlen=JANELA_LATENCIAS)
+
+    def contar(self, nome):
+        with self._lock:
+            self.contadores[nome] += 1
+
+    def registrar(self, latencia_ms, render_ms=None):
+        with self._lock:
+            self.latencias.append(round(latencia_ms, 2))
+            if render_ms is not None:
+                self.renders.append(render_ms)
+
+    def resumo(self, pool):
+        with self._lock:
+            latencias, renders = list(self.latencias), list(self.renders)
+            contadores = dict(self.contadores)
+        return {
+            "uptime_s": round(time.time() - self.inicio, 1),
+            "requisicoes": contadores,
+            "fila": pool.estado(),
+            "latencia_ms": {f"p{int(p * 100)}": percentil(latencias, p) for p in (0.5, 0.9, 0.99)},
+            "render_ms": {f"p{int(p * 100)}": percentil(renders, p) for p in (0.5, 0.9, 0.99)},
+        }
+
+
+class PoolLimitado:
+    """
+    ProcessPoolExecutor com no maximo processos + fila tarefas aceitas. A vaga
+    e devolvida quando a tarefa termina (nao quando o cliente desiste), entao
+    timeouts nao fazem a fila real passar do limite.
+    """
+
+    def __init__(self, processos, fila):
+        self.processos = processos
+        self.capacidade = processos + fila
+        self._vagas = threading.BoundedSemaphore(self.capacidade)
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self._executor = ProcessPoolExecutor(max_workers=processos)
+
+    def submeter(self, funcao, *args):
+        """Future da tarefa, ou None quando nao ha vaga"""
+        if not self._vagas.acquire(blocking=False):
+            return None
+        with self._lock:
+            self._pendentes += 1
+            try:
+                try:
+                    futuro = self._executor.submit(funcao, *args)
+                except BrokenProcessPool:
+                    # Um processo filho morreu: recria o pool e tenta de novo
+                    logger.warning("Pool de processos quebrado, recriando")
+                    quebrado, self._executor = self._executor, ProcessPoolExecutor(max_workers=self.processos)
+                    quebrado.shutdown(wait=False, cancel_futures=True)
+                    futuro = self._executor.submit(funcao, *args)
+            except BaseException:
+                # Sem tarefa, a vaga volta agora; senao a capacidade encolhe para sempre
+                self._pendentes -= 1
+                self._vagas.release()
+                raise
+        futuro.add_done_callback(self._liberar)
+        return futuro
+
+    def _liberar(self, _futuro):
+        with self._lock:
+            self._pendentes -= 1
+        self._vagas.release()
+
+    def estado(self):
+        with self._lock:
+            pendentes = self._pendentes
+        return {
+            "processos": self.processos,
+            "capacidade": self.capacidade,
+            "pendentes": pendentes,
+            "em_execucao": min(pendentes, self.processos),
+            "aguardando": max(0, pendentes - self.processos),
+        }
+
+    def encerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def make_handler(pool, metricas, timeout, max_corpo=MAX_CORPO):
+    class RelatorioHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            rota = self.path.split("?", 1)[0].rstrip("/")
+            if rota == "/saude":
+                self.responder_json(200, {"status": "ok"})
+            elif rota == "/metricas":
+                self.responder_json(200, metricas.resumo(pool))
+            else:
+                self.responder_json(404, {"erro": f"rota desconhecida: {rota}"})
+
+        def do_POST(self):
+            rota = self.path.split("?", 1)[0].rstrip("/")
+            if rota != "/relatorio":
+                self.responder_json(404, {"erro": f"rota desconhecida: {rota}"})
+                return
+            inicio = time.perf_counter()
+            metricas.contar("recebidas")
+
+            perfil, erro = self.ler_perfil()
+            if erro is None:
+                problema = validar_perfil(perfil)
+                if problema:
+                    erro = (422, {"erro": f"perfil incompleto ou invalido: {problema}"})
+            if erro:
+                metricas.contar("invalidas")
+                self.responder_json(*erro)
+                return
+
+            try:
+                futuro = pool.submeter(renderizar, perfil)
+            except Exception as e:
+                metricas.contar("erros")
+                logger.error(f"Falha ao enfileirar: {type(e).__name__}: {e}")
+                self.responder_json(500, {"erro": f"{type(e).__name__}: {e}"})
+                return
+            if futuro is None:
+                metricas.contar("rejeitadas")
+                self.responder_json(503, {"erro": "servico ocupado, tente novamente"}, {"Retry-After": "1"})
+                return
+
+            # Toda requisicao que chegou ao pool entra nas latencias, com sucesso ou nao
+            try:
+                conteudo, info = futuro.result(timeout=timeout)
+            except FuturesTimeout:
+                futuro.cancel()
+                metricas.contar("timeouts")
+                metricas.registrar((time.perf_counter() - inicio) * 1000)
+                self.responder_json(504, {"erro": f"relatorio nao ficou pronto em {timeout}s"})
+                return
+            except Exception as e:
+                # O perfil ja foi validado: o que falha aqui e defeito do renderizador
+                metricas.contar("erros")
+                metricas.registrar((time.perf_counter() - inicio) * 1000)
+                logger.error(f"Falha ao renderizar: {type(e).__name__}: {e}")
+                self.responder_json(500, {"erro": f"{type(e).__name__}: {e}"})
+                return
+
+            latencia = (time.perf_counter() - inicio) * 1000
+            metricas.contar("ok")
+            metricas.registrar(latencia, info["render_ms"])
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(conteudo)))
+            self.send_header("X-Tempo-Render-Ms", str(info["render_ms"]))
+            self.send_header("X-Tempo-Total-Ms", f"{latencia:.2f}")
+            self.end_headers()
+            self.wfile.write(conteudo)
+
+        def ler_perfil(self):
+            """(perfil, None) ou (None, (status, corpo do erro))"""
+            try:
+                tamanho = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                return None, (400, {"erro": "Content-Length invalido"})
+            if tamanho <= 0:
+                return None, (411, {"erro": "corpo JSON com Content-Length obrigatorio"})
+            if tamanho > max_corpo:
+                self.close_connection = True
+                return None, (413, {"erro": f"corpo maior que {max_corpo} bytes"})
+            try:
+                perfil = json.loads(self.rfile.read(tamanho))
+            except ValueError as e:
+                return None, (400, {"erro": f"JSON invalido: {e}"})
+            if not isinstance(perfil, dict) or not isinstance(perfil.get("dados", perfil), dict):
+                return None, (400, {"erro": "perfil nao e um objeto JSON"})
+            return perfil, None
+
+        def responder_json(self, status, corpo, cabecalhos=None):
+            conteudo = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(conteudo)))
+            for nome, valor in (cabecalhos or {}).items():
+                self.send_header(nome, valor)
+            self.end_headers()
+            self.wfile.write(conteudo)
+
+        def log_message(self, format, *args):
+            logger.info(f"{self.address_string()} {format % args}")
+
+    return RelatorioHandler
+
+
+def criar_servidor(host="127.0.0.1", porta=8765, processos=None, fila=None, timeout=30.0, max_corpo=MAX_CORPO):
+    """Servidor pronto para serve_forever(); o pool fica em servidor.pool"""
+    processos = processos or os.cpu_count() or 1
+    fila = processos * 4 if fila is None else fila
+    pool = PoolLimitado(processos, fila)
+    metricas = Metricas()
+    servidor = ThreadingHTTPServer((host, porta), make_handler(pool, metricas, timeout, max_corpo))
+    servidor.daemon_threads = True
+    servidor.pool, servidor.metricas = pool, metricas
+    return servidor
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servico HTTP local de relatorios tributarios")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--processos", type=int, default=os.cpu_count(),
+                        help="processos de renderizacao (padrao: numero de CPUs)")
+    parser.add_argument("--fila", type=int, help="relatorios aguardando alem dos em execucao (padrao: 4 por processo)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="segundos por relatorio (padrao: %(default)s)")
+    parser.add_argument("--max-corpo", type=int, default=MAX_CORPO, help="bytes do JSON (padrao: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    servidor = criar_servidor(args.host, args.porta, args.processos, args.fila, args.timeout, args.max_corpo)
+    estado = servidor.pool.estado()
+    logger.info(f"Servindo relatorios em http://{args.host}:{servidor.server_port} "
+                f"({estado['processos']} processos, capacidade {estado['capacidade']}, timeout {args.timeout}s)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servidor.pool.encerrar()
+
+
+if __name__ == "__main__":
+    main()
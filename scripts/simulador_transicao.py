@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Simulador ano a ano da transicao da Reforma Tributaria (2026-2033)
+
+O cronograma e uma tabela (um ano por linha): aliquotas de CBS e IBS e a
+fracao que ainda resta de PIS/COFINS e de ICMS/ISS. Cada empresa parte do
+imposto do seu regime (motor_regimes), repartido em tributos que a reforma
+extingue (PIS/COFINS/IPI, ICMS/ISS) e tributos que ficam (IRPJ/CSLL e CPP);
+a cada ano os extintos sao reduzidos pela tabela e o IBS/CBS e apurado por
+debito - credito. Todas as contas sao arrays [empresas, anos], entao uma
+carteira inteira sai numa chamada.
+
+Cronogramas:
+  - lc214 (padrao): LC 214/2025 - teste de 0,9% CBS + 0,1% IBS em 2026
+    (compensavel), CBS plena e fim de PIS/COFINS em 2027, ICMS/ISS caindo
+    10 pontos por ano de 2029 a 2032, IVA pleno em 2033
+  - regras: a tabela "transicao" de src/data/tax-planning-rules.json
+  - um arquivo CSV/JSON com as colunas ano, cbs, ibs, consumo_federal,
+    icms_iss e compensavel
+
+Diferente de calcular_reforma (porte do motor TS), aqui IRPJ/CSLL e CPP
+seguem as regras do regime da empresa em todos os anos.
+
+Execute:
+    python scripts/simulador_transicao.py                              # empresa modelo
+    python scripts/simulador_transicao.py perfis.ndjson --csv serie.csv
+    python scripts/simulador_transicao.py --exemplo 50000 --cronograma regras
+"""
+
+import csv
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+
+from motor_regimes import (ALIQUOTA_IBS_CBS_PADRAO, NOMES_REGIMES, REGIMES_ATUAIS, PerfisEmpresas,
+                           carregar_regras, comparar_regimes, fator_credito, formatar_reais)
+
+COLUNAS_CRONOGRAMA = ("ano", "cbs", "ibs", "consumo_federal", "icms_iss", "compensavel")
+
+# ano, CBS, IBS, fracao restante de PIS/COFINS/IPI, fracao restante de ICMS/ISS, compensavel
+CRONOGRAMA_LC214 = [
+    (2026, 0.009, 0.001, 1.0, 1.0, True),
+    (2027, 0.084, 0.001, 0.0, 1.0, False),
+    (2028, 0.084, 0.001, 0.0, 1.0, False),
+    (2029, 0.085, 0.017, 0.0, 0.9, False),
+    (2030, 0.085, 0.034, 0.0, 0.8, False),
+    (2031, 0.085, 0.051, 0.0, 0.7, False),
+    (2032, 0.085, 0.068, 0.0, 0.6, False),
+    (2033, 0.085, 0.170, 0.0, 0.0, False),
+]
+
+
+@dataclass
+class Cronograma:
+    anos: np.ndarray
+    cbs: np.ndarray
+    ibs: np.ndarray
+    consumo_federal: np.ndarray
+    icms_iss: np.ndarray
+    compensavel: np.ndarray      # IBS/CBS de teste, compensado com PIS/COFINS
+
+    @classmethod
+    def de_linhas(cls, linhas):
+        linhas = sorted(linhas, key=lambda linha: int(linha[0]))
+        colunas = list(zip(*linhas))
+        return cls(
+            anos=np.array(colunas[0], dtype=np.int32),
+            cbs=np.array(colunas[1], dtype=np.float64),
+            ibs=np.array(colunas[2], dtype=np.float64),
+            consumo_federal=np.array(colunas[3], dtype=np.float64),
+            icms_iss=np.array(colunas[4], dtype=np.float64),
+            compensavel=np.array([str(v).lower() in ("1", "true", "sim") for v in colunas[5]]),
+        )
+
+    @classmethod
+    def lc214(cls):
+        return cls.de_linhas(CRONOGRAMA_LC214)
+
+    @classmethod
+    def de_regras(cls, regras=None):
+        """Tabela 'transicao' do JSON de regras: a mesma reducao vale para todos os tributos atuais"""
+        transicao = (regras or carregar_regras())["reforma_tributaria"]["transicao"]
+        return cls.de_linhas([
+            (int(ano), t["cbs"], t["ibs"], 1 - t["reducao_tributos_atuais"], 1 - t["reducao_tributos_atuais"],
+             t.get("fase") == "teste")
+            for ano, t in transicao.items()
+        ])
+
+    @classmethod
+    def de_arquivo(cls, caminho):
+        with open(caminho, "r", encoding="utf-8-sig", newline="") as f:
+            if caminho.lower().endswith(".csv"):
+                registros = list(csv.DictReader(f))
+            else:
+                registros = json.load(f)
+        faltando = [c for c in COLUNAS_CRONOGRAMA if registros and c not in registros[0]]
+        if faltando:
+            raise ValueError(f"cronograma sem as colunas {', '.join(faltando)}")
+        return cls.de_linhas([
+            (int(r["ano"]), float(r["cbs"]), float(r["ibs"]), float(r["consumo_federal"]),
+             float(r["icms_iss"]), r["compensavel"])
+            for r in registros
+        ])
+
+    @classmethod
+    def carregar(cls, nome):
+        if nome in (None, "lc214"):
+            return cls.lc214()
+        if nome == "regras":
+            return cls.de_regras()
+        return cls.de_arquivo(nome)
+
+    @property
+    def aliquota(self):
+        return self.cbs + self.ibs
+
+
+@dataclass
+class SerieTransicao:
+    anos: np.ndarray
+    regime: np.ndarray               # indice em REGIMES_ATUAIS usado como ponto de partida
+    faturamento: np.ndarray
+    tributos_atuais: np.ndarray      # [empresas, anos] o que resta de PIS/COFINS e ICMS/ISS
+    ibs_cbs: np.ndarray              # IBS/CBS devido (zero nos anos compensaveis)
+    creditos: np.ndarray             # creditos de IBS/CBS
+    renda_folha: np.ndarray          # IRPJ/CSLL + CPP, iguais em todos os anos
+    total: np.ndarray
+    carga_efetiva: np.ndarray        # % do faturamento
+
+    def linhas(self, i):
+        """Serie de uma empresa, um dict por ano"""
+        return [
+            {
+                "ano": int(ano),
+                "tributos_atuais": round(float(self.tributos_atuais[i, j]), 2),
+                "ibs_cbs": round(float(self.ibs_cbs[i, j]), 2),
+                "creditos": round(float(self.creditos[i, j]), 2),
+                "renda_folha": round(float(self.renda_folha[i, j]), 2),
+                "total": round(float(self.total[i, j]), 2),
+                "carga_efetiva": round(float(self.carga_efetiva[i, j]), 2),
+            }
+            for j, ano in enumerate(self.anos)
+        ]
+
+    def agregado(self):
+        """Carteira inteira por ano: somas e a mediana da carga efetiva"""
+        faturamento = self.faturamento.sum()
+        return [
+            {
+                "ano": int(ano),
+                "tributos_atuais": round(float(self.tributos_atuais[:, j].sum()), 2),
+                "ibs_cbs": round(float(self.ibs_cbs[:, j].sum()), 2),
+                "creditos": round(float(self.creditos[:, j].sum()), 2),
+                "total": round(float(self.total[:, j].sum()), 2),
+                "carga_media": round(float(self.total[:, j].sum() / faturamento * 100), 2) if faturamento else None,
+                "carga_mediana": round(float(np.median(self.carga_efetiva[:, j])), 2),
+            }
+            for j, ano in enumerate(self.anos)
+        ]
+
+    def gravar_csv(self, caminho, nomes=None):
+        """Formato longo (empresa, ano, ...), pronto para graficos"""
+        with open(caminho, "w", encoding="utf-8", newline="") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["empresa", "regime", "ano", "tributos_atuais", "ibs_cbs", "creditos",
+                               "renda_folha", "total", "carga_efetiva"])
+            for i in range(len(self.regime)):
+                nome = nomes[i] if nomes else i
+                regime = NOMES_REGIMES[REGIMES_ATUAIS[self.regime[i]]]
+                for linha in self.linhas(i):
+                    escritor.writerow([nome, regime] + list(linha.values()))
+
+
+def regime_base(comparacao, base):
+    """Regime de partida de cada empresa: o atual (se elegivel), o melhor, ou um fixo"""
+    melhor = comparacao.melhor_atual
+    if base == "melhor":
+        return melhor
+    regimes = (comparacao.simples, comparacao.presumido, comparacao.real)
+    elegiveis = np.stack([r.elegivel for r in regimes], axis=1)
+    linhas = np.arange(len(melhor))
+    if base == "atual":
+        pedido = comparacao.perfis.regime_atual.astype(np.int64)
+    else:
+        pedido = np.full(len(melhor), REGIMES_ATUAIS.index(base))
+    valido = (pedido >= 0) & elegiveis[linhas, np.maximum(pedido, 0)]
+    return np.where(valido, pedido, melhor)
+
+
+def simular_transicao(perfis, cronograma=None, base="atual", comparacao=None, regras=None):
+    cronograma = cronograma or Cronograma.lc214()
+    comparacao = comparacao or comparar_regimes(perfis, regras)
+    regime = regime_base(comparacao, base)
+    linhas = np.arange(len(perfis))
+    regimes = (comparacao.simples, comparacao.presumido, comparacao.real)
+    componente = lambda nome: np.stack([getattr(r, nome) for r in regimes])[regime, linhas]
+
+    fat = perfis.faturamento_anual
+    reducao = perfis.coluna_cnae("reducao_setorial")
+    # [empresas, anos]
+    aliquota = (1 - reducao)[:, None] * cronograma.aliquota[None, :]
+    debito = fat[:, None] * aliquota
+    creditos = (perfis.despesas_com_credito * fator_credito(perfis))[:, None] * aliquota
+    ibs_cbs = np.where(cronograma.compensavel[None, :], 0.0, np.maximum(0.0, debito - creditos))
+
+    atuais = (componente("consumo_federal")[:, None] * cronograma.consumo_federal[None, :]
+              + componente("icms_iss")[:, None] * cronograma.icms_iss[None, :])
+    renda_folha = np.broadcast_to((componente("renda") + componente("cpp"))[:, None], atuais.shape)
+    total = atuais + ibs_cbs + renda_folha
+    carga = np.divide(total * 100, fat[:, None], out=np.zeros_like(total), where=fat[:, None] > 0)
+    return SerieTransicao(cronograma.anos, regime, fat, atuais, ibs_cbs, creditos, renda_folha, total, carga)
+
+
+def imprimir_serie(linhas, titulo):
+    print(titulo)
+    print(f"{'Ano':>6} {'Trib. atuais':>18} {'IBS/CBS':>18} {'Creditos':>18} {'Total':>18} {'Carga':>8}")
+    for linha in linhas:
+        carga = linha.get("carga_efetiva", linha.get("carga_media"))
+        print(f"{linha['ano']:>6} {formatar_reais(linha['tributos_atuais']):>18} {formatar_reais(linha['ibs_cbs']):>18} "
+              f"{formatar_reais(linha['creditos']):>18} {formatar_reais(linha['total']):>18} {carga:>7.2f}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simula a transicao 2026-2033 ano a ano")
+    parser.add_argument("perfis", nargs="?", help="NDJSON com os dados de cada empresa (ou {\"dados\": {...}})")
+    parser.add_argument("--cronograma", default="lc214",
+                        help="lc214, regras ou arquivo CSV/JSON com a tabela (padrao: %(default)s)")
+    parser.add_argument("--base", choices=["atual", "melhor"] + list(REGIMES_ATUAIS), default="atual",
+                        help="regime de partida de cada empresa (padrao: %(default)s)")
+    parser.add_argument("--csv", help="grava a serie de cada empresa (formato longo)")
+    parser.add_argument("--json", help="grava a serie agregada da carteira")
+    parser.add_argument("--exemplo", type=int, metavar="N", help="usa N empresas sinteticas")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.exemplo:
+        from motor_regimes import perfis_sinteticos
+        lista = perfis_sinteticos(args.exemplo)
+    elif args.perfis:
+        with open(args.perfis, "r", encoding="utf-8") as f:
+            lista = [json.loads(linha) for linha in f if linha.strip()]
+        lista = [item.get("dados", item) for item in lista]
+    else:
+        from gerar_relatorio_tributario import DADOS_EMPRESA
+        lista = [DADOS_EMPRESA]
+
+    cronograma = Cronograma.carregar(args.cronograma)
+    perfis = PerfisEmpresas.de_dados(lista)
+    inicio = time.perf_counter()
+    serie = simular_transicao(perfis, cronograma, args.base)
+    duracao = time.perf_counter() - inicio
+
+    if len(perfis) == 1:
+        imprimir_serie(serie.linhas(0), f"{lista[0].get('razao_social', 'Empresa')} - partindo de "
+                       f"{NOMES_REGIMES[REGIMES_ATUAIS[serie.regime[0]]]}")
+    else:
+        imprimir_serie(serie.agregado(), f"Carteira de {len(perfis)} empresas (somas; carga = total / faturamento)")
+    print(f"{len(perfis)} empresas x {len(cronograma.anos)} anos em {duracao * 1000:.1f} ms "
+          f"(cronograma {args.cronograma}, IBS/CBS pleno de referencia {ALIQUOTA_IBS_CBS_PADRAO:.1%})",
+          file=sys.stderr)
+
+    if args.csv:
+        serie.gravar_csv(args.csv, [d.get("razao_social") or d.get("cnpj") for d in lista])
+        print(f"Serie por empresa: {args.csv}", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"cronograma": args.cronograma, "anos": serie.agregado()}, f, indent=2, ensure_ascii=False)
+        print(f"Serie agregada: {args.json}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+SQLite stand-in for the Supabase client, for offline ETL runs and benchmarks.
+
+Implements the subset of the supabase-py / PostgREST query builder used by
+the gov tax scripts: select/insert/upsert/delete with eq, in_, order, limit
+and range. Tables and columns are created on first write; dict/list values
+are stored as JSON text and decoded on read.
+
+    client = SqliteClient("replay.db")
+    client.table("raw_gov_tax_data").insert({...}).execute()
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+# Column defaults the Postgres schema fills in on insert
+TABLE_DEFAULTS = {
+    "raw_gov_tax_data": {"fetched_at": lambda: datetime.now(timezone.utc).isoformat()},
+}
+
+
+def quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SqliteResponse:
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+
+class SqliteQuery:
+    def __init__(self, client: "SqliteClient", table: str):
+        self.client = client
+        self.table = table
+        self.action = "select"
+        self.columns = "*"
+        self.rows: List[Dict[str, Any]] = []
+        self.on_conflict: Optional[str] = None
+        self.filters: List[tuple] = []
+        self.ordering: List[tuple] = []
+        self.limit_count: Optional[int] = None
+        self.offset = 0
+
+    def select(self, columns: str = "*", **kwargs) -> "SqliteQuery":
+        self.action = "select"
+        self.columns = columns
+        return self
+
+    def insert(self, rows) -> "SqliteQuery":
+        self.action = "insert"
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = "") -> "SqliteQuery":
+        self.action = "upsert"
+        self.rows = rows if isinstance(rows, list) else [rows]
+        self.on_conflict = on_conflict
+        return self
+
+    def delete(self) -> "SqliteQuery":
+        self.action = "delete"
+        return self
+
+    def eq(self, column: str, value) -> "SqliteQuery":
+        self.filters.append((column, "=", value))
+        return self
+
+    def in_(self, column: str, values: Sequence) -> "SqliteQuery":
+        self.filters.append((column, "in", list(values)))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "SqliteQuery":
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, count: int) -> "SqliteQuery":
+        self.limit_count = count
+        return self
+
+    def range(self, start: int, end: int) -> "SqliteQuery":
+        self.offset = start
+        self.limit_count = end - start + 1
+        return self
+
+    def execute(self) -> SqliteResponse:
+        return self.client._execute(self)
+
+
+class SqliteClient:
+    """Drop-in for supabase.Client.table(...) chains, backed by one SQLite file."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("pragma synchronous=normal")
+        self.conn.execute("create table if not exists _json_columns (tbl text, col text, primary key (tbl, col))")
+        self.lock = threading.Lock()
+        self.columns: Dict[str, set] = {}
+        self.json_columns: Dict[str, set] = {}
+        for tbl, col in self.conn.execute("select tbl, col from _json_columns"):
+            self.json_columns.setdefault(tbl, set()).add(col)
+
+    def table(self, name: str) -> SqliteQuery:
+        return SqliteQuery(self, name)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # -- schema ---------------------------------------------------------
+
+    def _ensure_table(self, table: str, rows: List[Dict[str, Any]] = ()) -> set:
+        columns = self.columns.get(table)
+        if columns is None:
+            self.conn.execute(f"create table if not exists {quote(table)} (id integer primary key autoincrement)")
+            columns = {row[1] for row in self.conn.execute(f"pragma table_info({quote(table)})")}
+            self.columns[table] = columns
+        json_columns = self.json_columns.setdefault(table, set())
+        for row in rows:
+            for column, value in row.items():
+                if column not in columns:
+                    self.conn.execute(f"alter table {quote(table)} add column {quote(column)}")
+                    columns.add(column)
+                if isinstance(value, (dict, list)) and column not in json_columns:
+                    json_columns.add(column)
+                    self.conn.execute("insert or ignore into _json_columns values (?, ?)", (table, column))
+        return columns
+
+    def _encode(self, value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        return value
+
+    # -- statements -----------------------------------------------------
+
+    def _where(self, query: SqliteQuery, columns: set):
+        clauses, params = [], []
+        for column, op, value in query.filters:
+            if column not in columns:
+                # Never written: every row is null there
+                clauses.append("1" if op == "=" and value is None else "0")
+            elif op == "in":
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{quote(column)} in ({','.join('?' * len(value))})")
+                params.extend(value)
+            elif value is None:
+                clauses.append(f"{quote(column)} is null")
+            else:
+                clauses.append(f"{quote(column)} = ?")
+                params.append(value)
+        return (" where " + " and ".join(clauses)) if clauses else "", params
+
+    def _execute(self, query: SqliteQuery) -> SqliteResponse:
+        with self.lock:
+            if query.action in ("insert", "upsert"):
+                return self._write(query)
+            columns = self._ensure_table(query.table)
+            where, params = self._where(query, columns)
+            if query.action == "delete":
+                with self.conn:
+                    self.conn.execute(f"delete from {quote(query.table)}{where}", params)
+                return SqliteResponse([])
+            return self._select(query, where, params)
+
+    def _select(self, query: SqliteQuery, where: str, params: list) -> SqliteResponse:
+        columns = self.columns[query.table]
+        wanted = [c.strip() for c in query.columns.split(",")] if query.columns != "*" else sorted(columns)
+        projection = ", ".join(quote(c) if c in columns else f"null as {quote(c)}" for c in wanted)
+        sql = f"select {projection} from {quote(query.table)}{where}"
+        ordering = [(c, desc) for c, desc in query.ordering if c in columns]
+        if ordering:
+            sql += " order by " + ", ".join(quote(c) + (" desc" if desc else "") for c, desc in ordering)
+        if query.limit_count is not None:
+            sql += f" limit {int(query.limit_count)} offset {int(query.offset)}"
+        json_columns = self.json_columns.get(query.table, set())
+        data = []
+        for values in self.conn.execute(sql, params):
+            row = dict(zip(wanted, values))
+            for column in json_columns.intersection(row):
+                if isinstance(row[column], str):
+                    row[column] = json.loads(row[column])
+            data.append(row)
+        return SqliteResponse(data)
+
+    def _write(self, query: SqliteQuery) -> SqliteResponse:
+        if not query.rows:
+            return SqliteResponse([])
+        defaults = TABLE_DEFAULTS.get(query.table, {})
+        rows = [{**{k: f() for k, f in defaults.items() if k not in row}, **row} for row in query.rows]
+        with self.conn:
+            self._ensure_table(query.table, rows)
+            names = list(dict.fromkeys(column for row in rows for column in row))
+            sql = (f"insert into {quote(query.table)} ({', '.join(map(quote, names))}) "
+                   f"values ({', '.join('?' * len(names))})")
+            if query.action == "upsert" and query.on_conflict:
+                keys = [c.strip() for c in query.on_conflict.split(",")]
+                key_list = ", ".join(map(quote, keys))
+                index = quote(f"uq_{query.table}_{'_'.join(keys)}")
+                self.conn.execute(f"create unique index if not exists {index} on {quote(query.table)} ({key_list})")
+                updates = [c for c in names if c not in keys and c != "id"]
+                sql += f" on conflict ({key_list}) do update set " + ", ".join(
+                    f"{quote(c)} = excluded.{quote(c)}" for c in updates)
+            self.conn.executemany(sql, [[self._encode(row.get(c)) for c in names] for row in rows])
+        return SqliteResponse(rows)
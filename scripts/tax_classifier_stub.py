@@ -0,0 +1,154 @@
+"""
+Local stand-in for the tax-classifier edge function.
+
+Speaks the same contract as supabase/functions/tax-classifier: POST
+{"produtos": [{id, descricao, ncm}]}, at most 50 products handled per call,
+answer {"success", "data": [{id, classificacao, motivo, source}], "metadata"}.
+Classification is a deterministic keyword rule instead of the model, and
+--latency simulates the model call so client throughput can be measured.
+
+Usage:
+    python scripts/tax_classifier_stub.py --port 8010 --latency 1.5
+    python scripts/classify_catalog.py catalog.csv --url http://127.0.0.1:8010
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import logging
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from gov_tax_data import load_dump
+from ncm_index import NcmAnnexIndex
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MAX_PRODUCTS = 50  # produtos.slice(0, 50) in the edge function
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CESTA_KEYWORDS = ("ARROZ", "FEIJAO", "FEIJÃO", "LEITE", "CAFE", "CAFÉ", "FARINHA", "OVOS", "ACUCAR", "AÇÚCAR")
+NO_BENEFIT_KEYWORDS = ("CERVEJA", "VODKA", "WHISKY", "CIGARRO", "PERFUME", "REFRIGERANTE")
+
+
+def classify_product(produto: Dict[str, Any], gov_index: NcmAnnexIndex) -> Dict[str, Any]:
+    descricao = str(produto.get("descricao") or "").upper()
+    is_gov = bool(gov_index.lookup(produto.get("ncm"))) if produto.get("ncm") else False
+    cesta = any(word in descricao for word in CESTA_KEYWORDS) and not any(
+        word in descricao for word in NO_BENEFIT_KEYWORDS)
+    item = {
+        "id": produto.get("id"),
+        "classificacao": {
+            "setor": "alimentos_basicos" if cesta else "comercio",
+            "cesta_basica": cesta,
+            "reducao_reforma": 1.0 if cesta else 0.0,
+            "icms_substituicao": False,
+            "anexo_simples_sugerido": "I",
+            "unidade_venda_sugerida": "UN",
+            "unit_type": "UN",
+            "conversion_factor": 1,
+            "sugestao_economia": "Stub local",
+        },
+        "motivo": "Classificação determinística do stub local",
+        "source": "governo" if is_gov else "ia",
+    }
+    if is_gov:
+        item["motivo"] += " (NCM Validado na Tabela Oficial)"
+    return item
+
+
+def make_handler(gov_index: NcmAnnexIndex, latency: float, fail_rate: float, counters: Dict[str, int]):
+    lock = threading.Lock()
+
+    class ClassifierHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def respond(self, status: int, body: Dict[str, Any]) -> None:
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                produtos = json.loads(self.rfile.read(length) or b"{}").get("produtos")
+            except ValueError:
+                produtos = None
+            with lock:
+                counters["requests"] += 1
+            if not produtos or not isinstance(produtos, list):
+                self.respond(500, {"success": False, "error": "Lista de produtos é obrigatória"})
+                return
+            if fail_rate and random.random() < fail_rate:
+                self.respond(503, {"success": False, "error": "Injected failure"})
+                return
+            if latency:
+                time.sleep(latency)
+
+            limited = produtos[:MAX_PRODUCTS]
+            data: List[Dict[str, Any]] = [classify_product(p, gov_index) for p in limited]
+            with lock:
+                counters["products"] += len(limited)
+            self.respond(200, {
+                "success": True,
+                "data": data,
+                "metadata": {
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "total": len(limited),
+                    "gov_matches": sum(1 for c in data if c["source"] == "governo"),
+                    "ai_predictions": sum(1 for c in data if c["source"] == "ia"),
+                },
+            })
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return ClassifierHandler
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8010, latency: float = 0.0, fail_rate: float = 0.0,
+                  anexos_path: str = os.path.join(REPO_ROOT, "anexos_dump.json")) -> ThreadingHTTPServer:
+    items = load_dump(anexos_path) if anexos_path and os.path.exists(anexos_path) else []
+    server = ThreadingHTTPServer((host, port), None)
+    server.counters = {"requests": 0, "products": 0}
+    server.RequestHandlerClass = make_handler(NcmAnnexIndex.from_items(items, "NCM"), latency, fail_rate,
+                                              server.counters)
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local tax-classifier stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per call, simulating the model")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--anexos", default=os.path.join(REPO_ROOT, "anexos_dump.json"),
+                        help="anexos dump used to flag gov-validated NCMs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = create_server(args.host, args.port, args.latency, args.fail_rate, args.anexos)
+    logger.info(f"tax-classifier stub on http://{args.host}:{server.server_port} (latency {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Served {server.counters['requests']} requests, {server.counters['products']} products")
+
+
+if __name__ == "__main__":
+    main()
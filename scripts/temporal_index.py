@@ -0,0 +1,336 @@
+"""
+As-of-date index over the validity windows of the gov tax data.
+
+Every record carries a window: InicioVigencia/FimVigencia on classTrib,
+dthIniVig/dthFimVig on anexos and indOper. This module answers:
+  - as_of(source, date):         every record in force on a date
+  - entity_as_of(source, key, d): the versions of one NCM/rule/operation in force
+  - timeline(source, key):       all versions of one entity, oldest first
+  - changes_between(source, a, b): records whose window opens or closes in (a, b]
+
+The published end date is the last day in force (indOper has one-day
+windows with dthIniVig == dthFimVig), so windows are stored half-open as
+[start, end + 1 day) and an open end means "still in force".
+Point queries go through a centered interval tree (O(log n + k)); per-entity
+timelines are sorted by start; window edges are kept in sorted arrays for
+range queries. Several snapshots can be loaded: records are identified by
+their staging natural key and the newest snapshot wins, so the index is
+built once and no query scans the snapshots again.
+
+Usage:
+    python scripts/temporal_index.py --dump anexos=anexos_dump.json --as-of 2027-03-01 --entity 02013000
+    python scripts/temporal_index.py --sqlite replay.db --snapshots 5 --source-api anexos --changes 2026-01-01 2027-01-01
+    python scripts/temporal_index.py --dump anexos=anexos_dump.json --bench
+"""
+
+import sys
+import time
+import random
+import argparse
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from gov_tax_data import STAGING_SPECS, create_supabase_client, list_snapshots, load_dump, parse_gov_datetime
+
+# Stand-in for an open validity end; ISO strings compare chronologically
+OPEN_END = "9999-12-31T23:59:59"
+
+# source_api -> (entity column, window start column, window end column)
+TEMPORAL_FIELDS = {
+    "anexos": ("cod_ncm_nbs", "dth_ini_vig", "dth_fim_vig"),
+    "classTrib": ("c_class_trib", "inicio_vigencia", "fim_vigencia"),
+    "indOper": ("cod_operacao", "dth_ini_vig", "dth_fim_vig"),
+}
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over half-open [start, end) intervals.
+    Each node keeps the intervals containing its center twice: by start
+    ascending and by end descending, so a stabbing query stops scanning a
+    node at the first interval that cannot contain the point.
+    """
+
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+    def __init__(self, intervals: List[Tuple[str, str, int]]):
+        points = sorted({start for start, _, _ in intervals})
+        self.center = points[len(points) // 2]
+        here, left, right = [], [], []
+        for interval in intervals:
+            start, end, _ = interval
+            if end <= self.center:
+                left.append(interval)
+            elif start > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        self.by_start = sorted(here, key=lambda i: i[0])
+        self.by_end = sorted(here, key=lambda i: i[1], reverse=True)
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def query(self, point: str, out: Optional[List[int]] = None) -> List[int]:
+        out = [] if out is None else out
+        node = self
+        while node is not None:
+            if point < node.center:
+                for start, _, ident in node.by_start:
+                    if start > point:
+                        break
+                    out.append(ident)
+                node = node.left
+            else:
+                for _, end, ident in node.by_end:
+                    if end <= point:
+                        break
+                    out.append(ident)
+                node = node.right
+        return out
+
+
+@dataclass
+class SourceIndex:
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    windows: List[Tuple[str, str]] = field(default_factory=list)
+    entities: List[str] = field(default_factory=list)
+    tree: Optional[IntervalTree] = None
+    timelines: Dict[str, List[int]] = field(default_factory=dict)
+    starts: List[Tuple[str, int]] = field(default_factory=list)
+    ends: List[Tuple[str, int]] = field(default_factory=list)
+
+
+class TemporalIndex:
+    def __init__(self):
+        # source_api -> natural key -> (row, snapshot_id)
+        self._records: Dict[str, Dict[tuple, Tuple[Dict[str, Any], Optional[str]]]] = {}
+        self._built: Dict[str, SourceIndex] = {}
+
+    def add_snapshot(self, source_api: str, items: Iterable[Any], snapshot_id: Optional[str] = None) -> int:
+        """
+        Merges one snapshot. Add snapshots oldest first: a record re-published
+        with a different window (e.g. a closed dthFimVig) replaces the old one.
+        """
+        if source_api not in TEMPORAL_FIELDS:
+            raise ValueError(f"{source_api} has no validity window")
+        spec = STAGING_SPECS[source_api]
+        records = self._records.setdefault(source_api, {})
+        count = 0
+        for row in spec.rows(items):
+            records[spec.key(row)] = (row, snapshot_id)
+            count += 1
+        self._built.pop(source_api, None)
+        return count
+
+    def _index(self, source_api: str) -> SourceIndex:
+        built = self._built.get(source_api)
+        if built is not None:
+            return built
+        entity_column, start_column, end_column = TEMPORAL_FIELDS[source_api]
+        built = SourceIndex()
+        intervals = []
+        for row, snapshot_id in self._records.get(source_api, {}).values():
+            start = row.get(start_column)
+            end = exclusive_end(row.get(end_column))
+            if not start or end <= start:
+                continue  # no window, or an empty one that contains no date
+            ident = len(built.rows)
+            built.rows.append({**row, "_snapshot": snapshot_id} if snapshot_id else row)
+            built.windows.append((start, end))
+            built.entities.append(row[entity_column])
+            built.timelines.setdefault(row[entity_column], []).append(ident)
+            intervals.append((start, end, ident))
+        for idents in built.timelines.values():
+            idents.sort(key=lambda i: built.windows[i])
+        built.tree = IntervalTree(intervals) if intervals else None
+        built.starts = sorted((start, ident) for start, _, ident in intervals)
+        built.ends = sorted((end, ident) for _, end, ident in intervals if end != OPEN_END)
+        self._built[source_api] = built
+        return built
+
+    def as_of(self, source_api: str, date) -> List[Dict[str, Any]]:
+        """Every record of a source in force on the date."""
+        built = self._index(source_api)
+        if built.tree is None:
+            return []
+        point = normalize_date(date)
+        return [built.rows[i] for i in sorted(built.tree.query(point))]
+
+    def entity_as_of(self, source_api: str, entity: str, date) -> List[Dict[str, Any]]:
+        """Versions of one entity in force on the date (an NCM can sit in several annexes)."""
+        built = self._index(source_api)
+        point = normalize_date(date)
+        idents = built.timelines.get(entity, [])
+        # Timelines are sorted by start: only the prefix starting on/before the date can match
+        cut = bisect_right([built.windows[i][0] for i in idents], point)
+        return [built.rows[i] for i in idents[:cut] if built.windows[i][1] > point]
+
+    def timeline(self, source_api: str, entity: str) -> List[Dict[str, Any]]:
+        built = self._index(source_api)
+        return [built.rows[i] for i in built.timelines.get(entity, [])]
+
+    def timelines(self, source_api: str, entities: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Bulk timeline(): one dict lookup per entity."""
+        return {entity: self.timeline(source_api, entity) for entity in entities}
+
+    def changes_between(self, source_api: str, after, until) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """(date, 'start'|'end', row) for windows opening or closing in (after, until], by date."""
+        built = self._index(source_api)
+        low, high = normalize_date(after), normalize_date(until)
+        events = []
+        for kind, edges in (("start", built.starts), ("end", built.ends)):
+            lo = bisect_right(edges, (low, len(built.rows)))
+            hi = bisect_right(edges, (high, len(built.rows)))
+            events.extend((date, kind, built.rows[ident]) for date, ident in edges[lo:hi])
+        events.sort(key=lambda e: (e[0], e[1] == "start"))
+        return events
+
+    def scan_as_of(self, source_api: str, date) -> List[Dict[str, Any]]:
+        """Reference full scan, used by the benchmark to check the tree."""
+        built = self._index(source_api)
+        point = normalize_date(date)
+        return [row for row, (start, end) in zip(built.rows, built.windows) if start <= point < end]
+
+
+def exclusive_end(value: Optional[str]) -> str:
+    """Last day in force -> first instant no longer in force."""
+    if not value:
+        return OPEN_END
+    end = datetime.fromisoformat(value)
+    if end.time() == datetime.min.time():
+        end += timedelta(days=1)
+    return end.isoformat(timespec="seconds")
+
+
+def normalize_date(value) -> str:
+    """'2027-03-01' or a datetime -> '2027-03-01T00:00:00'."""
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    return parse_gov_datetime(value)
+
+
+def synthetic_history(index: TemporalIndex, source_api: str, versions: int) -> TemporalIndex:
+    """Copy of a source where every record is re-published once a year, for benchmarking."""
+    _, start_column, end_column = TEMPORAL_FIELDS[source_api]
+    history = TemporalIndex()
+    records = history._records.setdefault(source_api, {})
+    for key, (row, snapshot_id) in index._records.get(source_api, {}).items():
+        for version in range(versions):
+            year = 2026 + version
+            records[key + (version,)] = ({**row, start_column: f"{year}-01-01T00:00:00",
+                                          end_column: f"{year}-12-31T00:00:00"}, snapshot_id)
+    return history
+
+
+def run_benchmark(index: TemporalIndex, source_api: str, queries: int, versions: int = 1) -> None:
+    if versions > 1:
+        index = synthetic_history(index, source_api, versions)
+    started = time.perf_counter()
+    built = index._index(source_api)
+    build = time.perf_counter() - started
+    if built.tree is None:
+        print(f"{source_api}: nothing to index")
+        return
+
+    rng = random.Random(7)
+    dates = [f"{rng.randint(2026, 2026 + max(versions, 8))}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" for _ in range(queries)]
+    entities = [rng.choice(built.entities) for _ in range(queries)]
+
+    started = time.perf_counter()
+    for date in dates[:200]:
+        expected = index.scan_as_of(source_api, date)
+    scan = (time.perf_counter() - started) / 200
+
+    started = time.perf_counter()
+    for date in dates[:200]:
+        result = index.as_of(source_api, date)
+    tree = (time.perf_counter() - started) / 200
+    assert sorted(map(id, result)) == sorted(map(id, expected))
+
+    started = time.perf_counter()
+    for entity, date in zip(entities, dates):
+        index.entity_as_of(source_api, entity, date)
+    entity = (time.perf_counter() - started) / queries
+
+    print(f"{source_api}: {len(built.rows)} versions of {len(built.timelines)} entities, built in {build * 1000:.1f} ms")
+    print(f"as_of full scan:   {scan * 1e3:8.3f} ms/query")
+    print(f"as_of tree:        {tree * 1e3:8.3f} ms/query (incl. materializing {len(result)} rows)")
+    print(f"entity_as_of:      {entity * 1e6:8.2f} us/query ({queries} queries)")
+
+
+def load_index(args) -> TemporalIndex:
+    index = TemporalIndex()
+    if args.dump:
+        for value in args.dump:
+            source_api, sep, path = value.partition("=")
+            if not sep or source_api not in TEMPORAL_FIELDS:
+                print(f"Invalid --dump {value!r}, expected <source_api>=<path> with one of {sorted(TEMPORAL_FIELDS)}")
+                sys.exit(1)
+            index.add_snapshot(source_api, load_dump(path), path)
+        return index
+
+    if args.sqlite:
+        from sqlite_store import SqliteClient
+        supabase = SqliteClient(args.sqlite)
+    else:
+        supabase = create_supabase_client()
+    for source_api in args.source_api or sorted(TEMPORAL_FIELDS):
+        # list_snapshots is newest first; merge oldest first so the newest wins
+        for snapshot in reversed(list_snapshots(supabase, source_api, count=args.snapshots)):
+            index.add_snapshot(source_api, snapshot.iter_items(supabase), snapshot.snapshot_id)
+    return index
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Point-in-time queries over the gov tax validity windows")
+    parser.add_argument("--dump", action="append", metavar="SOURCE=PATH",
+                        help="load a local JSON dump as a snapshot (repeatable, oldest first)")
+    parser.add_argument("--sqlite", metavar="PATH", help="read snapshots from a SQLite replay database")
+    parser.add_argument("--snapshots", type=int, default=1,
+                        help="how many stored snapshots per source to merge (default: %(default)s)")
+    parser.add_argument("--source-api", action="append", choices=sorted(TEMPORAL_FIELDS),
+                        help="source(s) to query (default: all loaded)")
+    parser.add_argument("--as-of", help="date to query, e.g. 2027-03-01")
+    parser.add_argument("--entity", action="append",
+                        help="NCM/NBS code, cClassTrib or codOperacao (with --as-of: versions in force; "
+                             "without: full timeline)")
+    parser.add_argument("--changes", nargs=2, metavar=("AFTER", "UNTIL"),
+                        help="list windows opening or closing in (AFTER, UNTIL]")
+    parser.add_argument("--bench", action="store_true", help="benchmark the tree against a full scan")
+    parser.add_argument("--queries", type=int, default=100000, help="queries for --bench (default: %(default)s)")
+    parser.add_argument("--versions", type=int, default=1,
+                        help="--bench on a synthetic history with this many yearly versions per record")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    index = load_index(args)
+    sources = args.source_api or [s for s in sorted(TEMPORAL_FIELDS) if s in index._records]
+
+    for source_api in sources:
+        if args.bench:
+            run_benchmark(index, source_api, args.queries, args.versions)
+            continue
+        if args.entity:
+            for entity in args.entity:
+                rows = (index.entity_as_of(source_api, entity, args.as_of) if args.as_of
+                        else index.timeline(source_api, entity))
+                print(f"{source_api} {entity}: {len(rows)} version(s)")
+                for row in rows:
+                    print(f"  {row}")
+        elif args.as_of:
+            rows = index.as_of(source_api, args.as_of)
+            print(f"{source_api}: {len(rows)} record(s) in force on {args.as_of}")
+        if args.changes:
+            events = index.changes_between(source_api, *args.changes)
+            entity_column = TEMPORAL_FIELDS[source_api][0]
+            print(f"{source_api}: {len(events)} window edge(s) in ({args.changes[0]}, {args.changes[1]}]")
+            for date, kind, row in events[:50]:
+                print(f"  {date} {kind:5} {row[entity_column]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Paridade entre o motor NumPy (motor_regimes) e o motor TS
+
+tests/fixtures/tax-engine-parity.json guarda perfis de referencia com as saidas
+de src/lib/tax-planning-engine.ts para cada regime (elegibilidade, imposto
+bruto, creditos, imposto liquido, carga efetiva), o melhor regime atual e as
+economias contra o regime_atual do perfil. O lado TS e conferido por
+tests/unit/tax-engine-parity.test.ts; este script calcula os mesmos perfis
+numa unica chamada do motor_regimes e aponta cada valor que diverge alem da
+tolerancia. Tambem confere o texto do relatorio sobre a reforma (texto_reforma)
+contra o sinal das economias esperadas: sem valores negativos e sem prometer
+reducao quando a reforma nao economiza. Divergencias saem com codigo 1.
+
+Execute:
+    python scripts/verificar_paridade_motor.py
+    python scripts/verificar_paridade_motor.py --tolerancia 0.5
+"""
+
+import os
+import sys
+import json
+import argparse
+
+from motor_regimes import REGIMES_ATUAIS, REPO_ROOT, PerfisEmpresas, comparar_regimes, resultados_relatorio
+
+CAMINHO_FIXTURE = os.path.join(REPO_ROOT, "tests", "fixtures", "tax-engine-parity.json")
+
+# cenario do fixture (nome no motor TS) -> atributo de ComparacaoRegimes
+CENARIOS = ("simples", "presumido", "real", "reforma_2027", "reforma_2033")
+# campo do TaxScenarioResult -> campo do ResultadoRegime
+CAMPOS = {
+    "imposto_bruto_anual": "imposto_bruto",
+    "creditos_aproveitados": "creditos",
+    "imposto_liquido_anual": "imposto_liquido",
+    "carga_efetiva_percentual": "carga_efetiva",
+}
+ECONOMIAS = ("economia_atual", "economia_reforma")
+
+
+def tipo_texto_reforma(esperado):
+    """Alerta que o texto sobre 2033 deve usar, pelas economias esperadas"""
+    if esperado["economia_reforma"] <= 0:
+        return "alerta"
+    return "info" if esperado["economia_reforma"] < esperado["economia_atual"] else "sucesso"
+
+
+def divergencias(fixture, tolerancia):
+    """(perfil, campo, esperado TS, calculado NumPy) de cada valor fora da tolerancia"""
+    casos = fixture["perfis"]
+    comparacao = comparar_regimes(PerfisEmpresas.de_dados([caso["perfil"] for caso in casos]))
+    saida = []
+    for i, caso in enumerate(casos):
+        esperado = caso["esperado"]
+        for cenario in CENARIOS:
+            regime = getattr(comparacao, cenario)
+            elegivel = bool(regime.elegivel[i])
+            if elegivel != esperado[cenario]["elegivel"]:
+                saida.append((caso["id"], f"{cenario}.elegivel", esperado[cenario]["elegivel"], elegivel))
+                continue
+            if not elegivel:
+                continue
+            for campo_ts, campo in CAMPOS.items():
+                valor = float(getattr(regime, campo)[i])
+                if abs(valor - esperado[cenario][campo_ts]) > tolerancia:
+                    saida.append((caso["id"], f"{cenario}.{campo_ts}", esperado[cenario][campo_ts], valor))
+        melhor = REGIMES_ATUAIS[comparacao.melhor_atual[i]]
+        if melhor != esperado["melhor_atual"]:
+            saida.append((caso["id"], "melhor_atual", esperado["melhor_atual"], melhor))
+        for campo in ECONOMIAS:
+            valor = float(getattr(comparacao, campo)[i])
+            if abs(valor - esperado[campo]) > tolerancia:
+                saida.append((caso["id"], campo, esperado[campo], valor))
+    return saida
+
+
+def divergencias_texto(fixture):
+    """(perfil, campo, esperado, obtido) do texto sobre a reforma no relatorio"""
+    # Importa fpdf: so e carregado para conferir o texto
+    from gerar_relatorio_tributario import texto_reforma
+
+    casos = fixture["perfis"]
+    resultados = resultados_relatorio(comparar_regimes(PerfisEmpresas.de_dados([caso["perfil"] for caso in casos])))
+    saida = []
+    for caso, resultado in zip(casos, resultados):
+        tipo, texto = texto_reforma(resultado)
+        if tipo != tipo_texto_reforma(caso["esperado"]):
+            saida.append((caso["id"], "texto_reforma.tipo", tipo_texto_reforma(caso["esperado"]), tipo))
+        if "R$ -" in texto:
+            saida.append((caso["id"], "texto_reforma.valor", "nao negativo", texto))
+    return saida
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Confere o motor_regimes contra as saidas do motor TS")
+    parser.add_argument("--fixture", default=CAMINHO_FIXTURE, help="JSON com perfis e saidas do motor TS")
+    parser.add_argument("--tolerancia", type=float, help="diferenca absoluta aceita (padrao: a do fixture)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.fixture, "r", encoding="utf-8") as f:
+        fixture = json.load(f)
+    tolerancia = args.tolerancia if args.tolerancia is not None else fixture.get("tolerancia", 0.01)
+
+    encontradas = divergencias(fixture, tolerancia) + divergencias_texto(fixture)
+    for perfil, campo, esperado, calculado in encontradas:
+        print(f"{perfil}: {campo} TS={esperado} NumPy={calculado}")
+    print(f"{len(fixture['perfis'])} perfis, {len(encontradas)} divergencia(s) (tolerancia {tolerancia})")
+    if encontradas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
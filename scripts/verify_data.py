@@ -3,6 +3,8 @@ import json
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from ncm_index import NcmAnnexIndex
+
 load_dotenv()
 
 url: str = os.environ.get("VITE_SUPABASE_URL")
@@ -41,6 +43,9 @@ else:
 print(f"Total Rules: {len(rules)}")
 print(f"Total Anexos (NCM entries): {len(anexos)}")
 
+# Index once instead of scanning the whole anexos list per lookup
+anexo_index = NcmAnnexIndex.from_items(anexos)
+
 # Check for Rules with Anexo ID
 linked_rules = [r for r in rules if r.get('Anexo') is not None]
 print(f"Rules with specific Anexo ID: {len(linked_rules)}")
@@ -50,10 +55,11 @@ if len(linked_rules) > 0:
     print(f"Sample Anexo ID from Rule: {sample_anexo_id}")
     
     # Check if this ID exists in Anexos
-    matching_ncm = [a for a in anexos if a.get('nroAnexo') == sample_anexo_id]
+    matching_ncm = anexo_index.codes_for_annex(sample_anexo_id)
     print(f"Matching NCMs for Anexo {sample_anexo_id}: {len(matching_ncm)}")
     if len(matching_ncm) > 0:
-        print(f"Sample Matching NCM: {matching_ncm[0]['codNcmNbs']}")
+        print(f"Sample Matching NCM: {matching_ncm[0]}")
+        print(f"Annexes for NCM {matching_ncm[0]}: {list(anexo_index.match(matching_ncm[0]))}")
 else:
     print("No rules found linked to specific Anexos (All Anexo=null).")
     # If all match null, then maybe the mapping is elsewhere.
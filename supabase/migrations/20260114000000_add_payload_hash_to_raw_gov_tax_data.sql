@@ -0,0 +1,35 @@
+-- Content hash for Bronze Layer payloads
+-- The ETL computes a SHA-256 over the canonical JSON of each payload and skips
+-- the insert (and the Silver Layer refresh) when it matches the last stored hash.
+
+alter table public.raw_gov_tax_data
+    add column if not exists payload_hash text;
+
+comment on column public.raw_gov_tax_data.payload_hash is
+    'SHA-256 (hex) of the canonical JSON payload (sorted keys, compact separators, UTF-8)';
+
+-- Fast "last snapshot for this source_api" lookup
+create index if not exists idx_raw_gov_tax_data_source_fetched
+    on public.raw_gov_tax_data (source_api, fetched_at desc);
+
+-- Refresh helpers, one per Silver Layer view, so the ETL only refreshes
+-- the views whose source actually changed.
+create or replace function public.refresh_tax_rules_gov()
+returns void
+language plpgsql
+security definer
+as $$
+begin
+  refresh materialized view public.tax_rules_gov;
+end;
+$$;
+
+create or replace function public.refresh_tax_ncms_gov()
+returns void
+language plpgsql
+security definer
+as $$
+begin
+  refresh materialized view public.tax_ncms_gov;
+end;
+$$;
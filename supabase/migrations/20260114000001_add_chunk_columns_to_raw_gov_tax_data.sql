@@ -0,0 +1,18 @@
+-- Chunked Bronze Layer snapshots
+-- In streaming mode the ETL splits large payloads into several rows that share
+-- one batch_id, fetched_at and payload_hash. Each row holds a slice of the
+-- original array, so jsonb_array_elements over all rows of a source_api still
+-- yields exactly the same items as the single-row form.
+
+alter table public.raw_gov_tax_data
+    add column if not exists batch_id uuid,
+    add column if not exists chunk_index integer;
+
+comment on column public.raw_gov_tax_data.batch_id is
+    'Groups the chunk rows of one streamed snapshot (null for single-row snapshots)';
+comment on column public.raw_gov_tax_data.chunk_index is
+    'Position of this slice within its batch, starting at 0';
+
+create index if not exists idx_raw_gov_tax_data_batch
+    on public.raw_gov_tax_data (batch_id, chunk_index)
+    where batch_id is not null;
@@ -0,0 +1,215 @@
+-- Typed staging tables for the Government Tax APIs
+-- The ETL flattens each payload itself and upserts rows on their natural key,
+-- so only rows that actually changed are written. The Silver Layer views below
+-- become plain views over these tables: no jsonb_array_elements on read and NCM
+-- lookups use regular B-tree indexes.
+
+-- 1. classTrib rules
+create table if not exists public.gov_class_trib (
+    id bigint generated by default as identity primary key,
+    c_class_trib text not null unique,
+    descricao text,
+    tipo_aliquota text,
+    anexo integer,
+    p_red_ibs numeric,
+    p_red_cbs numeric,
+    inicio_vigencia timestamp,
+    fim_vigencia timestamp,
+    publicacao timestamp,
+    link text,
+    ind_nfe boolean not null default false,
+    ind_nfce boolean not null default false,
+    ind_cte boolean not null default false,
+    ind_cteos boolean not null default false,
+    ind_nfse boolean not null default false,
+    ind_bpe boolean not null default false,
+    ind_bpeta boolean not null default false,
+    ind_bpetm boolean not null default false,
+    ind_nf3e boolean not null default false,
+    ind_nfag boolean not null default false,
+    ind_nfcom boolean not null default false,
+    ind_nfgas boolean not null default false,
+    ind_nfabi boolean not null default false,
+    ind_nfsvia boolean not null default false,
+    ind_dere boolean not null default false,
+    ind_estorno_cred boolean not null default false,
+    ind_trib_regular boolean not null default false,
+    ind_cred_pres_oper boolean not null default false,
+    monofasia_padrao boolean not null default false,
+    monofasia_retida_ant boolean not null default false,
+    monofasia_diferimento boolean not null default false,
+    monofasia_sujeita_retencao boolean not null default false,
+    row_hash text,
+    updated_at timestamptz default now() not null
+);
+
+create index if not exists idx_gov_class_trib_anexo on public.gov_class_trib (anexo);
+comment on table public.gov_class_trib is 'Staging: classTrib rules flattened by the ETL (natural key cClassTrib)';
+
+-- 2. anexos (NCM/NBS -> annex)
+create table if not exists public.gov_anexo_ncm (
+    id bigint generated by default as identity primary key,
+    nro_anexo integer not null,
+    cod_ncm_nbs text not null,
+    tipo_anexo text,
+    dth_ini_vig timestamp not null,
+    dth_fim_vig timestamp,
+    row_hash text,
+    updated_at timestamptz default now() not null,
+    unique (nro_anexo, cod_ncm_nbs, dth_ini_vig)
+);
+
+create index if not exists idx_gov_anexo_ncm_cod on public.gov_anexo_ncm (cod_ncm_nbs);
+comment on table public.gov_anexo_ncm is 'Staging: annex NCM/NBS entries (natural key nroAnexo, codNcmNbs, dthIniVig)';
+
+-- 3. indOper operations
+create table if not exists public.gov_ind_oper (
+    id bigint generated by default as identity primary key,
+    cod_operacao text not null unique,
+    nome_operacao text,
+    tex_disp_legal text,
+    tex_local_fornec text,
+    tex_caract_fornec text,
+    tex_local_operacao text,
+    dth_publicacao timestamp,
+    dth_ini_vig timestamp,
+    dth_fim_vig timestamp,
+    row_hash text,
+    updated_at timestamptz default now() not null
+);
+
+comment on table public.gov_ind_oper is 'Staging: indOper operation codes (natural key codOperacao)';
+
+-- 4. credPresumido (fields not mapped yet, full item kept in dados)
+create table if not exists public.gov_cred_presumido (
+    id bigint generated by default as identity primary key,
+    c_cred_pres text not null unique,
+    descricao text,
+    dados jsonb not null,
+    row_hash text,
+    updated_at timestamptz default now() not null
+);
+
+comment on table public.gov_cred_presumido is 'Staging: presumed credit codes (natural key cCredPres)';
+
+-- 5. Backfill from the latest Bronze snapshot of each source.
+-- row_hash stays null, so the next ETL run rewrites these rows once with its own hashes.
+with latest as (
+    select source_api, max(fetched_at) as fetched_at
+    from public.raw_gov_tax_data
+    group by source_api
+),
+items as (
+    select r.source_api, jsonb_array_elements(r.payload_json) as item
+    from public.raw_gov_tax_data r
+    join latest l on l.source_api = r.source_api and l.fetched_at = r.fetched_at
+    where jsonb_typeof(r.payload_json) = 'array'
+)
+insert into public.gov_anexo_ncm (nro_anexo, cod_ncm_nbs, tipo_anexo, dth_ini_vig, dth_fim_vig)
+select distinct on ((item ->> 'nroAnexo')::int, item ->> 'codNcmNbs', (item ->> 'dthIniVig')::timestamp)
+    (item ->> 'nroAnexo')::int,
+    item ->> 'codNcmNbs',
+    item ->> 'TipoAnexo',
+    (item ->> 'dthIniVig')::timestamp,
+    (item ->> 'dthFimVig')::timestamp
+from items
+where source_api = 'anexos'
+  and item ? 'nroAnexo' and item ? 'codNcmNbs' and item ? 'dthIniVig'
+on conflict do nothing;
+
+with latest as (
+    select max(fetched_at) as fetched_at
+    from public.raw_gov_tax_data
+    where source_api = 'indOper'
+),
+items as (
+    select jsonb_array_elements(r.payload_json) as item
+    from public.raw_gov_tax_data r
+    join latest l on l.fetched_at = r.fetched_at
+    where r.source_api = 'indOper' and jsonb_typeof(r.payload_json) = 'array'
+)
+insert into public.gov_ind_oper (cod_operacao, nome_operacao, tex_disp_legal, tex_local_fornec,
+                                 tex_caract_fornec, tex_local_operacao, dth_publicacao, dth_ini_vig, dth_fim_vig)
+select distinct on (item ->> 'codOperacao')
+    item ->> 'codOperacao',
+    item ->> 'nomeOperacao',
+    item ->> 'texDispLegal',
+    item ->> 'texLocalFornec',
+    item ->> 'texCaractFornec',
+    item ->> 'texLocalOperacao',
+    (item ->> 'dthPublicacao')::timestamp,
+    (item ->> 'dthIniVig')::timestamp,
+    (item ->> 'dthFimVig')::timestamp
+from items
+where item ? 'codOperacao'
+on conflict do nothing;
+
+with latest as (
+    select max(fetched_at) as fetched_at
+    from public.raw_gov_tax_data
+    where source_api = 'classTrib'
+),
+items as (
+    select jsonb_array_elements(r.payload_json) as item
+    from public.raw_gov_tax_data r
+    join latest l on l.fetched_at = r.fetched_at
+    where r.source_api = 'classTrib' and jsonb_typeof(r.payload_json) = 'array'
+),
+rules as (
+    -- API items nest the rules under classificacoesTributarias
+    select rule
+    from items
+    cross join lateral jsonb_array_elements(
+        case
+            when jsonb_typeof(item -> 'classificacoesTributarias') = 'array' then item -> 'classificacoesTributarias'
+            else jsonb_build_array(item)
+        end
+    ) as nested(rule)
+)
+insert into public.gov_class_trib (c_class_trib, descricao, tipo_aliquota, anexo, p_red_ibs, p_red_cbs,
+                                   inicio_vigencia, fim_vigencia, publicacao, link)
+select distinct on (rule ->> 'cClassTrib')
+    rule ->> 'cClassTrib',
+    rule ->> 'DescricaoClassTrib',
+    rule ->> 'TipoAliquota',
+    (rule ->> 'Anexo')::int,
+    (rule ->> 'pRedIBS')::numeric,
+    (rule ->> 'pRedCBS')::numeric,
+    (rule ->> 'InicioVigencia')::timestamp,
+    (rule ->> 'FimVigencia')::timestamp,
+    (rule ->> 'Publicacao')::timestamp,
+    rule ->> 'Link'
+from rules
+where rule ? 'cClassTrib'
+on conflict do nothing;
+
+-- 6. Silver Layer as plain views over the staging tables
+drop materialized view if exists public.tax_rules_gov cascade;
+drop materialized view if exists public.tax_ncms_gov cascade;
+drop function if exists public.refresh_tax_rules_gov();
+drop function if exists public.refresh_tax_ncms_gov();
+
+create view public.tax_rules_gov as
+select
+    c_class_trib as codigo,
+    descricao,
+    tipo_aliquota,
+    coalesce(anexo, 0) as anexo_id,
+    updated_at
+from
+    public.gov_class_trib;
+
+comment on view public.tax_rules_gov is 'Silver Layer: Tax Rule Definitions (classTrib), backed by gov_class_trib';
+
+create view public.tax_ncms_gov as
+select
+    cod_ncm_nbs as ncm,
+    nro_anexo as anexo_id,
+    tipo_anexo as tipo,
+    updated_at
+from
+    public.gov_anexo_ncm
+where
+    tipo_anexo = 'NCM';
+
+comment on view public.tax_ncms_gov is 'Silver Layer: Valid NCMs and Annex mappings, backed by gov_anexo_ncm';
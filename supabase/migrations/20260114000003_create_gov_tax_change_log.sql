@@ -0,0 +1,21 @@
+-- Change log between successive Government Tax API snapshots
+-- Written by scripts/diff_gov_snapshots.py --to-table. One row per item that
+-- was added, removed or modified, keyed by the item's natural key, so caches
+-- and downstream views can be invalidated incrementally.
+
+create table if not exists public.gov_tax_change_log (
+    id bigint generated by default as identity primary key,
+    source_api text not null,
+    change_type text not null check (change_type in ('added', 'removed', 'modified')),
+    natural_key jsonb not null,
+    changes jsonb,
+    old_snapshot text,
+    new_snapshot text,
+    detected_at timestamptz default now() not null
+);
+
+create index if not exists idx_gov_tax_change_log_source_detected
+    on public.gov_tax_change_log (source_api, detected_at desc);
+
+comment on table public.gov_tax_change_log is 'Item-level changes between gov tax data snapshots (added/removed/modified)';
+comment on column public.gov_tax_change_log.changes is 'Field-level {old, new} pairs for modified items, the full item otherwise';
@@ -0,0 +1,49 @@
+-- Debug View without the 5-row limit
+-- Expands only the latest classTrib snapshot (all chunk rows of a streamed
+-- batch share its fetched_at), so each rule appears once however many
+-- snapshots are stored. scripts/dump_tables.py pages through the view with
+-- .range(); the row position columns give those pages a stable order.
+drop view if exists public.debug_tax_rules;
+
+create view public.debug_tax_rules as
+with latest as (
+    select max(fetched_at) as fetched_at
+    from public.raw_gov_tax_data
+    where source_api = 'classTrib'
+),
+flat_data as (
+    select
+        r.id as raw_id,
+        items.item,
+        items.item_index
+    from
+        public.raw_gov_tax_data r
+        join latest l on l.fetched_at = r.fetched_at
+        cross join lateral jsonb_array_elements(r.payload_json) with ordinality as items(item, item_index)
+    where
+        r.source_api = 'classTrib'
+        and jsonb_typeof(r.payload_json) = 'array'
+),
+unnested_rules as (
+    select
+        flat_data.raw_id,
+        flat_data.item_index,
+        rules.rule,
+        rules.rule_index
+    from
+        flat_data
+        cross join lateral jsonb_array_elements(flat_data.item -> 'classificacoesTributarias')
+            with ordinality as rules(rule, rule_index)
+    where
+        jsonb_typeof(flat_data.item -> 'classificacoesTributarias') = 'array'
+)
+select
+    rule,
+    (rule ->> 'CodigoNcm') as extracted_ncm,
+    (rule -> 'CodigoNcm') as raw_ncm,
+    jsonb_typeof(rule) as rule_type,
+    raw_id,
+    item_index,
+    rule_index
+from
+    unnested_rules;
@@ -0,0 +1,46 @@
+import { describe, it, expect } from 'vitest';
+import {
+  calcularSimplesNacional,
+  calcularLucroPresumido,
+  calcularLucroReal,
+  calcularReforma,
+  compararTodosRegimes
+} from '@/lib/tax-planning-engine';
+import type { TaxProfile, TaxScenarioResult } from '@/types/tax-planning';
+import fixture from '../fixtures/tax-engine-parity.json';
+
+// Same fixture is checked against the NumPy engine by scripts/verificar_paridade_motor.py
+const CAMPOS = [
+  'imposto_bruto_anual',
+  'creditos_aproveitados',
+  'imposto_liquido_anual',
+  'carga_efetiva_percentual'
+] as const;
+
+type Esperado = { elegivel: boolean } & Partial<Record<(typeof CAMPOS)[number], number>>;
+type Cenario = 'simples' | 'presumido' | 'real' | 'reforma_2027' | 'reforma_2033';
+type EsperadoCaso = Record<Cenario, Esperado> & { melhor_atual: string };
+
+function conferir(resultado: TaxScenarioResult, esperado: Esperado) {
+  expect(resultado.elegivel).toBe(esperado.elegivel);
+  if (!esperado.elegivel) return;
+  for (const campo of CAMPOS) {
+    expect(Math.abs(resultado[campo] - (esperado[campo] as number))).toBeLessThanOrEqual(fixture.tolerancia);
+  }
+}
+
+describe('Tax engine parity fixture', () => {
+  for (const caso of fixture.perfis) {
+    it(`matches the recorded outputs for ${caso.id}`, () => {
+      const perfil = caso.perfil as unknown as TaxProfile;
+      const esperado = caso.esperado as unknown as EsperadoCaso;
+
+      conferir(calcularSimplesNacional(perfil), esperado.simples);
+      conferir(calcularLucroPresumido(perfil), esperado.presumido);
+      conferir(calcularLucroReal(perfil), esperado.real);
+      conferir(calcularReforma(perfil, 2027), esperado.reforma_2027);
+      conferir(calcularReforma(perfil, 2033), esperado.reforma_2033);
+      expect(compararTodosRegimes(perfil).melhor_atual).toBe(esperado.melhor_atual);
+    });
+  }
+});